@@ -1,38 +1,106 @@
 import streamlit as st
 import pandas as pd
+import os
+import threading
+from collections import OrderedDict
 from io import BytesIO
 from datetime import datetime, date, time
 
-from client_sla_analysis import run_analysis as client_analysis
-from cainiao_sla_analysis import run_analysis as cainiao_analysis
+from client_sla_analysis import POLICY as CLIENT_POLICY
+from cainiao_sla_analysis import POLICY as CAINIAO_POLICY
+from sla_core import StageCache, analyze, analyze_combined, normalize_frame
+from sla_chunked import analyze_chunked
+from sla_trend import TREND_FREQS, analyze_trend
+from sla_export import DETAIL_MAX_ROWS
+from zone_mapping import ZONE_FILE, file_signature, read_zone_index
+from ingest import CHUNK_ROWS, SUPPORTED_TYPES, read_uploads, upload_digest
+from run_info import NO_LOG, RunLog
+from history_store import HISTORY_FILE, HistoryStore, analyze_history
 
 st.set_page_config(page_title="客户SLA未达分析", layout="wide")
 
+# 明细超过行数上限时的导出方式
+DETAIL_MODE_LABELS = {
+    "分成多个明细工作表（明细_1、明细_2…）": "sheets",
+    "另存为 Parquet，与汇总Excel打包为zip": "parquet",
+    "另存为 CSV，与汇总Excel打包为zip": "csv",
+}
+MIME_TYPES = {
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".zip": "application/zip",
+}
+
+
+# 邮编映射只在 sla_zone.xlsx 变化时重新读取
+@st.cache_resource(show_spinner=False)
+def get_zone_index(path, signature):
+    return read_zone_index(path)
+
+
+# 整理好的上传数据按文件内容缓存（最近 4 组），只改参数重新分析时不再重复读取
+# 缓存的 DataFrame 只读，分析流程不会修改它
+NORMALIZED_ENTRIES = 4
+
+
+@st.cache_resource(show_spinner=False)
+def normalized_frames():
+    # 所有会话共用：(文件内容, 邮编映射) -> 整理好的数据，最近用过的在最后
+    return OrderedDict(), threading.Lock()
+
+
+def get_normalized_frame(data_key, files, progress=None, log=NO_LOG):
+    """
+    Normalized upload of data_key, read only on a cache miss. Kept outside
+    st.cache_resource: progress draws on page elements, which a cached call
+    would have to replay on every hit.
+    """
+    frames, lock = normalized_frames()
+    with lock:
+        norm_df = frames.get(data_key)
+        if norm_df is not None:
+            frames.move_to_end(data_key)
+            log.cached("读取并整理上传数据", norm_df)
+            return norm_df
+
+    df_all = log.track("读取文件（含时间解析）", lambda: read_uploads(files, progress=progress))
+    norm_df = normalize_frame(df_all, get_zone_index(ZONE_FILE, data_key[1]), log)
+    with lock:
+        frames[data_key] = norm_df
+        while len(frames) > NORMALIZED_ENTRIES:
+            frames.popitem(last=False)
+    return norm_df
+
+
+@st.cache_resource(show_spinner=False)
+def get_history_store(path):
+    return HistoryStore(path)
+
+
 st.title("📦 SLA未达分析工具")
 st.markdown("""
 ### **使用步骤：**
 1. 上传 1 个或多个 Excel 文件
-2. 选择SLA要求（中台/客户）
+2. 选择SLA要求（中台/客户/同时分析两种）
 3. 选择 SLA should date（时间段 / 单时间点）
 4. 设置 cut-off 时间
 5. 点击「开始分析」
-6. 下载分析结果 Excel
+6. 查看预览，点击「生成结果Excel」后下载
 """)
 st.caption("上传Excel → 设置 SLA should date / cut off → 生成结果Excel下载")
 
 uploaded_files = st.file_uploader(
-    "上传一个或多个Excel文件（会自动合并）",
-    type=["xlsx", "xls"],
+    "上传一个或多个Excel文件（会自动合并，也支持 CSV / Parquet / Arrow）",
+    type=SUPPORTED_TYPES,
     accept_multiple_files=True
 )
 
 col1, col2 = st.columns(2)
 
 with col1:
-    sla_type = st.radio("SLA要求", ["中台SLA", "客户SLA"], horizontal=True)
+    sla_type = st.radio("SLA要求", ["中台SLA", "客户SLA", "中台+客户SLA"], horizontal=True)
 
 with col2:
-    mode = st.radio("SLA should date 设置方式", ["时间段", "单个时间点"], horizontal=True)
+    mode = st.radio("SLA should date 设置方式", ["时间段", "单个时间点", "趋势（多个时间段）"], horizontal=True)
 
 sla_range = None
 
@@ -55,6 +123,11 @@ else:
         t2 = st.time_input("结束时间", value=time(23, 59, 59), key="t2").replace(hour=23, minute=59, second=59)
     sla_range = (datetime.combine(d1, t1), datetime.combine(d2, t2))
 
+# 趋势：整个时间段只算一次，按 SLA截止时间 分天/周统计
+trend = mode == "趋势（多个时间段）"
+if trend:
+    trend_freq = st.radio("趋势分桶", list(TREND_FREQS), horizontal=True)
+
 st.divider()
 
 c1, c2 = st.columns(2)
@@ -64,53 +137,224 @@ with c2:
     cut_t = st.time_input("cut_off（时间）", value=time(11, 50), key="cut_t")
 cut_off = datetime.combine(cut_d, cut_t)
 
+with st.expander("明细导出设置（数据量很大时）"):
+    detail_label = st.radio("明细超过行数上限时", list(DETAIL_MODE_LABELS))
+    detail_rows = st.number_input(
+        "明细行数上限（Excel 单个工作表最多 1,048,575 行数据）",
+        min_value=1000,
+        max_value=DETAIL_MAX_ROWS,
+        value=DETAIL_MAX_ROWS,
+        step=100000,
+    )
+    chunked = st.checkbox(
+        f"分块处理（每次 {CHUNK_ROWS:,} 行，数据超过内存时使用；不缓存读取结果）",
+        help="CSV / Parquet / Arrow 按块读取；Excel 文件仍整个读入后再分块分析",
+    )
+detail_mode = DETAIL_MODE_LABELS[detail_label]
+
+with st.expander("运行信息（排查慢的时候用）"):
+    run_info_sheet = st.checkbox("在结果Excel中加入「运行信息」工作表")
+    profile = st.checkbox("记录 cProfile 性能剖析（会变慢，仅排查时开启）")
+
+# 分析过的订单按 SLA类型 + 面单号 存到本地 SQLite，以后查历史时间段不用再上传
+# 历史库文件只在第一次写入时创建，没用过历史库时不打开
+with st.expander("本地历史库"):
+    save_history = st.checkbox("把本次分析的订单写入历史库（同一面单号以最新一次分析为准）")
+    history_overview = get_history_store(HISTORY_FILE).overview() if os.path.exists(HISTORY_FILE) else None
+    if history_overview is not None and len(history_overview):
+        st.dataframe(history_overview, use_container_width=True, hide_index=True)
+    else:
+        st.caption("历史库还是空的")
+    history_btn = st.button("按上面的SLA要求和时间段查询历史库（不用上传文件）", use_container_width=True)
+history = get_history_store(HISTORY_FILE) if save_history else None
+
 run_btn = st.button("开始分析", type="primary", use_container_width=True)
 
+if sla_type == "中台SLA":
+    policies = [CAINIAO_POLICY]
+elif sla_type == "客户SLA":
+    policies = [CLIENT_POLICY]
+else:
+    # 只读取、整理一次数据，两种SLA输出到同一个Excel
+    policies = [CAINIAO_POLICY, CLIENT_POLICY]
+
+
+def keep_result(result, log, params):
+    # 结果留在会话里：生成 / 下载 Excel 时页面重跑，预览和按钮仍然在
+    st.session_state["result"] = result
+    st.session_state["run_log"] = log
+    st.session_state["run_profile"] = profile
+    st.session_state["run_params"] = params
+
+
+if history_btn:
+    if trend:
+        st.error("历史库查询暂不支持趋势模式，请选择「时间段」。")
+        st.stop()
+    if history_overview is None:
+        st.error("历史库还是空的，请先勾选「写入历史库」并分析一次。")
+        st.stop()
+
+    log = RunLog(profile=profile)
+    with st.spinner("查询历史库..."), log.profiling():
+        keep_result(analyze_history(
+            get_history_store(HISTORY_FILE),
+            policies,
+            sla_should_date=sla_range,
+            detail_mode=detail_mode,
+            detail_rows=int(detail_rows),
+            log=log,
+            export=False,
+        ), log, f"历史库｜{sla_type}｜SLA should date：{sla_range[0]} ~ {sla_range[1]}")
+
 if run_btn:
     if not uploaded_files:
         st.error("请先上传至少一个Excel文件。")
         st.stop()
 
-    with st.spinner("读取并合并Excel..."):
-        dfs = []
-        for f in uploaded_files:
-            df = pd.read_excel(f)
-            dfs.append(df)
-        df_all = pd.concat(dfs, ignore_index=True) if len(dfs) > 1 else dfs[0]
+    log = RunLog(profile=profile)
+
+    if chunked and trend:
+        st.error("趋势模式暂不支持分块处理，请取消「分块处理」。")
+        st.stop()
+
+    if chunked:
+        progress_bar = st.progress(0.0, text="分块分析...")
 
-    st.success(f"已加载 {len(uploaded_files)} 个文件，合并后行数：{len(df_all):,}")
+        def show_chunk_progress(done, rows):
+            progress_bar.progress(min(done / (done + 1), 0.99), text=f"分块分析...（已处理 {done} 块，{rows:,} 行）")
 
-    with st.spinner("运行分析逻辑..."):
-        if sla_type == "中台SLA":
-            result = cainiao_analysis(
-                df_all,
-                sla_should_date=sla_range,
-                cut_off=cut_off,
-            )
-        else:
-            result = client_analysis(
-                df_all,
+        with log.profiling():
+            result = analyze_chunked(
+                uploaded_files,
+                policies,
                 sla_should_date=sla_range,
                 cut_off=cut_off,
+                zone_index=get_zone_index(ZONE_FILE, file_signature(ZONE_FILE)),
+                detail_mode=detail_mode,
+                detail_rows=int(detail_rows),
+                progress=show_chunk_progress,
+                log=log,
+                run_info_sheet=run_info_sheet,
+                export=False,
+                history=history,
             )
+        progress_bar.empty()
+        st.success(f"已分块分析 {len(uploaded_files)} 个文件，重复的面单号已去掉 {result['duplicates']:,} 行")
+    else:
+        progress_bar = st.progress(0.0, text="读取并合并Excel...")
+
+        def show_progress(done, total, name):
+            progress_bar.progress(done / total, text=f"读取并合并Excel...（{done}/{total}）{name}")
 
-    # result 约定返回：{"output_bytes": bytes, "filename": str, "preview": {...可选...}}
-    output_bytes = result["output_bytes"]
-    filename = result["filename"]
+        data_key = (upload_digest(uploaded_files), file_signature(ZONE_FILE))
+        with log.profiling():
+            norm_df = get_normalized_frame(data_key, uploaded_files, show_progress, log)
+        progress_bar.empty()
+
+        # 各步骤结果按会话缓存：只改 cut_off 时只重跑归因及之后的步骤，换了文件则全部重算
+        stage_cache = st.session_state.get("stage_cache")
+        if stage_cache is None or stage_cache.data_key != data_key:
+            stage_cache = st.session_state["stage_cache"] = StageCache(data_key)
+
+        st.success(
+            f"已加载 {len(uploaded_files)} 个文件，合并后行数：{len(norm_df):,}"
+            f"（重复的面单号已去掉 {norm_df.attrs['duplicates']:,} 行，保留节点最完整的一条）"
+        )
+
+        with st.spinner("运行分析逻辑..."), log.profiling():
+            if trend:
+                result = analyze_trend(
+                    norm_df,
+                    policies,
+                    sla_should_date=sla_range,
+                    freq=trend_freq,
+                    cut_off=cut_off,
+                    cache=stage_cache,
+                    log=log,
+                    export=False,
+                    history=history,
+                )
+            elif len(policies) == 1:
+                result = analyze(
+                    norm_df,
+                    policies[0],
+                    sla_should_date=sla_range,
+                    cut_off=cut_off,
+                    cache=stage_cache,
+                    detail_mode=detail_mode,
+                    detail_rows=int(detail_rows),
+                    log=log,
+                    run_info_sheet=run_info_sheet,
+                    export=False,
+                    history=history,
+                )
+            else:
+                result = analyze_combined(
+                    norm_df,
+                    policies,
+                    sla_should_date=sla_range,
+                    cut_off=cut_off,
+                    cache=stage_cache,
+                    detail_mode=detail_mode,
+                    detail_rows=int(detail_rows),
+                    log=log,
+                    run_info_sheet=run_info_sheet,
+                    export=False,
+                    history=history,
+                )
+
+    keep_result(result, log, (
+        f"{sla_type}{f'｜趋势（{trend_freq}）' if trend else ''}"
+        f"｜SLA should date：{sla_range[0]} ~ {sla_range[1]}｜cut_off：{cut_off}"
+    ))
+
+# result 约定返回：{"preview": {...}, "export": 生成Excel的函数}，生成后再有 "output_file": ReportFile, "filename": str
+result = st.session_state.get("result")
+if result:
+    log = st.session_state["run_log"]
 
     st.success("分析完成 ✅")
-    st.download_button(
-        label="下载结果Excel",
-        data=output_bytes,
-        file_name=filename,
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        use_container_width=True
-    )
+    st.caption(st.session_state["run_params"])
+
+    # Excel 等点击时才生成；写在临时文件里，直接交给下载按钮读取，不在内存里再留一份
+    if "output_file" not in result:
+        if st.button("生成结果Excel", use_container_width=True):
+            with st.spinner("生成Excel..."), log.profiling():
+                result.update(result["export"]())
+
+    if "output_file" in result:
+        filename = result["filename"]
+        with result["output_file"].open() as output_file:
+            st.download_button(
+                label="下载结果（汇总Excel + 明细）" if filename.endswith(".zip") else "下载结果Excel",
+                data=output_file,
+                file_name=filename,
+                mime=MIME_TYPES[result["output_file"].suffix],
+                use_container_width=True
+            )
+
+    # 各步骤耗时 / 行数 / 内存峰值
+    with st.expander(f"运行信息（共 {log.total_seconds():.1f} 秒）"):
+        st.dataframe(log.frame(), use_container_width=True, hide_index=True)
+        st.caption("内存峰值：该步骤中进程内存比步骤开始时多用的最大值（仅 Linux，与其他人的分析同时进行时不计）；缓存 = 沿用上次的结果")
+        if st.session_state["run_profile"]:
+            profile_text = log.profile_text()
+            st.download_button("下载 cProfile 结果", profile_text, file_name="sla_profile.txt", mime="text/plain")
+            st.code(profile_text)
+
+    # 趋势图
+    chart = result.get("chart")
+    if chart is not None:
+        st.subheader("未达标率趋势")
+        st.line_chart(chart)
 
-    # 可选：展示预览
+    # 预览：直接用分析得到的汇总表，不用打开Excel
     preview = result.get("preview")
     if preview:
         st.subheader("预览")
         for title, pdf in preview.items():
             st.markdown(f"**{title}**")
-            st.dataframe(pdf, use_container_width=True)
+            # 「值」等列数字和百分比文本混在一起，按文本显示
+            pdf = pdf.astype({col: "string" for col in pdf.columns if pdf[col].dtype == object})
+            st.dataframe(pdf, use_container_width=True, hide_index=True)
@@ -0,0 +1,285 @@
+"""
+Offline benchmarks.
+
+    python benchmark.py ingest --rows 20000
+    python benchmark.py memory --rows 1000000
+    python benchmark.py export --rows 500000
+    python benchmark.py chunked --rows 1000000
+    python benchmark.py stages --sizes 10k,100k,1M --sla both
+"""
+import argparse
+import contextlib
+import io
+import os
+import resource
+import tempfile
+import time
+from multiprocessing import get_context
+
+import pandas as pd
+
+from ingest import CHUNK_ROWS, INPUT_COLUMNS, TIME_COLS, has_calamine, prepare_frame, read_upload
+from zone_mapping import ZONE_FILE, ZONE_SHEET, load_zone_index, lookup_zone
+from sla_export import open_workbook, sheet, write_frame
+from run_info import proc_status_mb, reset_peak_rss
+from synthetic_data import make_waybills
+
+
+def make_export(n, seed=0, extra_cols=30):
+    """
+    synthetic_data.make_waybills as a raw system export: same data model,
+    plain string cols instead of categories, `extra_cols` unused cols.
+    """
+    df = make_waybills(n, seed=seed, extra_cols=extra_cols)
+    return df.astype({col: object for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)})
+
+
+def write_formats(df, folder):
+    paths = {
+        "xlsx": os.path.join(folder, "export.xlsx"),
+        "csv": os.path.join(folder, "export.csv"),
+        "parquet": os.path.join(folder, "export.parquet"),
+        "arrow": os.path.join(folder, "export.arrow"),
+    }
+    df.to_excel(paths["xlsx"], index=False, engine="xlsxwriter")
+    df.to_csv(paths["csv"], index=False)
+    df.to_parquet(paths["parquet"], index=False)
+    df.to_feather(paths["arrow"])
+    return paths
+
+
+def timed(func, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_ingest(rows, repeat):
+    df = make_export(rows)
+
+    with tempfile.TemporaryDirectory() as folder:
+        paths = write_formats(df, folder)
+
+        # 原方式：openpyxl 读取全部列，分析时再转换时间列
+        def read_excel_all():
+            raw = pd.read_excel(paths["xlsx"])
+            for col in TIME_COLS:
+                raw[col] = pd.to_datetime(raw[col], errors='coerce')
+
+        baseline = timed(read_excel_all, repeat)
+        print(f"rows={rows:,} cols={df.shape[1]} calamine={'yes' if has_calamine() else 'no'}")
+        print(f"{'format':<10}{'seconds':>10}{'speedup':>10}")
+        print(f"{'xlsx(旧)':<10}{baseline:>10.3f}{1:>10.1f}x")
+        for kind, path in paths.items():
+            seconds = timed(lambda: read_upload(path), repeat)
+            print(f"{kind:<10}{seconds:>10.3f}{baseline / seconds:>10.1f}x")
+
+
+def peak_rss_mb():
+    # VmHWM starts over in a spawned worker, ru_maxrss keeps the parent's peak across exec
+    peak = proc_status_mb("VmHWM")
+    if peak is not None:
+        return peak
+    # ru_maxrss is KB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def preprocess_memory(variant, rows):
+    """Run one pre-processing variant on a fresh raw export, in its own process."""
+    raw = make_export(rows, extra_cols=10)
+    raw_mb = peak_rss_mb()
+
+    if variant == "merge-then-prune":
+        # 原方式：整表先 merge 邮编映射，再筛列、转时间
+        sla_zone_df = pd.read_excel(ZONE_FILE, sheet_name=ZONE_SHEET)
+        df = raw.merge(sla_zone_df, on="收件人邮编", how="left")
+        df = df[[c for c in INPUT_COLUMNS + ["收件人邮编集"] if c in df.columns]]
+        for col in TIME_COLS:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    else:
+        df = prepare_frame(raw, INPUT_COLUMNS)
+        df["收件人邮编集"] = lookup_zone(df["收件人邮编"], load_zone_index())
+
+    frame_mb = df.memory_usage(deep=True).sum() / 2**20
+    return raw_mb, peak_rss_mb(), frame_mb
+
+
+def bench_memory(rows):
+    print(f"rows={rows:,}")
+    print(f"{'variant':<18}{'raw RSS MB':>12}{'peak RSS MB':>13}{'extra MB':>10}{'frame MB':>10}")
+    for variant in ["merge-then-prune", "prune-then-zone"]:
+        with get_context("spawn").Pool(1) as pool:
+            raw_mb, peak_mb, frame_mb = pool.apply(preprocess_memory, (variant, rows))
+        print(f"{variant:<18}{raw_mb:>12.0f}{peak_mb:>13.0f}{peak_mb - raw_mb:>10.0f}{frame_mb:>10.0f}")
+
+
+def export_memory(variant, rows):
+    """Write a 明细-like sheet of `rows` rows with one variant, in its own process."""
+    df = prepare_frame(make_export(rows, extra_cols=0), INPUT_COLUMNS)
+    for i, col in enumerate(TIME_COLS[1:8]):
+        df[f"耗时{i}"] = (df[col] - df[TIME_COLS[0]]).dt.total_seconds() / 3600
+    base_mb = peak_rss_mb()
+
+    t0 = time.perf_counter()
+    if variant == "pandas+BytesIO":
+        # 原方式：整个工作簿在内存里，再 getvalue() 复制一份
+        output = io.BytesIO()
+        with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
+            df.to_excel(writer, sheet_name="明细", index=False)
+        size = len(output.getvalue())
+    else:
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "report.xlsx")
+            with open_workbook(path) as (book, formats):
+                write_frame(sheet(book, "明细"), df, 0, formats)
+            size = os.path.getsize(path)
+    return base_mb, peak_rss_mb(), time.perf_counter() - t0, size / 2**20
+
+
+def bench_export(rows):
+    print(f"rows={rows:,}")
+    print(f"{'variant':<18}{'seconds':>10}{'base RSS MB':>13}{'peak RSS MB':>13}{'extra MB':>10}{'file MB':>9}")
+    for variant in ["pandas+BytesIO", "streaming"]:
+        with get_context("spawn").Pool(1) as pool:
+            base_mb, peak_mb, seconds, file_mb = pool.apply(export_memory, (variant, rows))
+        print(f"{variant:<18}{seconds:>10.1f}{base_mb:>13.0f}{peak_mb:>13.0f}{peak_mb - base_mb:>10.0f}{file_mb:>9.0f}")
+
+
+def analysis_memory(variant, path, window, chunk_rows):
+    """Analyze one parquet export, whole frame or chunked, in its own process."""
+    from cainiao_sla_analysis import POLICY
+    from sla_core import analyze, normalize_frame
+    from sla_chunked import analyze_chunked
+
+    base_mb = peak_rss_mb()
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if variant == "whole frame":
+            result = analyze(normalize_frame(read_upload(path)), POLICY, window)
+        else:
+            result = analyze_chunked([path], [POLICY], window, chunk_rows=chunk_rows)
+    size = os.path.getsize(result["output_file"].path)
+    return base_mb, peak_rss_mb(), time.perf_counter() - t0, size / 2**20
+
+
+def bench_chunked(rows, chunk_rows):
+    df = make_export(rows, extra_cols=10)
+    # 只分析两天的截止时间，明细不至于太大
+    window = (pd.Timestamp("2026-03-10"), pd.Timestamp("2026-03-11 23:59:59"))
+
+    print(f"rows={rows:,} chunk_rows={chunk_rows:,}")
+    print(f"{'variant':<14}{'seconds':>10}{'base RSS MB':>13}{'peak RSS MB':>13}{'extra MB':>10}{'file MB':>9}")
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "export.parquet")
+        df.to_parquet(path, index=False)
+        del df
+        for variant in ["whole frame", "chunked"]:
+            with get_context("spawn").Pool(1) as pool:
+                base_mb, peak_mb, seconds, file_mb = pool.apply(analysis_memory, (variant, path, window, chunk_rows))
+            print(f"{variant:<14}{seconds:>10.1f}{base_mb:>13.0f}{peak_mb:>13.0f}{peak_mb - base_mb:>10.0f}{file_mb:>9.1f}")
+
+
+def stage_timings(rows, sla, window, cut_off):
+    """Run every pipeline stage on a synthetic export of `rows` rows, in its own process."""
+    from cainiao_sla_analysis import POLICY as CAINIAO_POLICY
+    from client_sla_analysis import POLICY as CLIENT_POLICY
+    from sla_core import (
+        attribute, evaluate_frame, failed_orders, filter_window, merge_sorting_time,
+        normalize_frame, paired_details, summarize
+    )
+    from sla_export import OUTPUT_FILE, COMBINED_OUTPUT_FILE, report_file, write_report, write_combined_report
+
+    policies = {"cainiao": [CAINIAO_POLICY], "client": [CLIENT_POLICY], "both": [CAINIAO_POLICY, CLIENT_POLICY]}[sla]
+    timings = []
+
+    def stage(name, func):
+        per_stage = reset_peak_rss()
+        before = proc_status_mb("VmRSS") or peak_rss_mb()
+        t0 = time.perf_counter()
+        result = func()
+        seconds = time.perf_counter() - t0
+        # without clear_refs only the growth of the process peak is known
+        timings.append((name, seconds, max(peak_rss_mb() - before, 0) if per_stage else None))
+        return result
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "export.parquet")
+        stage("generate", lambda: make_waybills(rows).to_parquet(path, index=False))
+        raw = stage("read", lambda: read_upload(path))
+    norm_df = stage("normalize", lambda: normalize_frame(raw))
+    del raw
+
+    runs = []
+    for policy in policies:
+        prefix = f"{policy.name} " if len(policies) > 1 else ""
+        evaluated = stage(prefix + "evaluate", lambda: evaluate_frame(norm_df, policy))
+        df = stage(prefix + "window", lambda: merge_sorting_time(filter_window(evaluated, window)))
+        del evaluated
+        durations = stage(prefix + "durations", lambda: failed_orders(df))
+        fail_df = stage(prefix + "attribution", lambda: attribute(durations, policy, cut_off))
+        del durations
+        report = stage(prefix + "summaries", lambda: summarize(df, fail_df, policy))
+        runs.append((policy, df, fail_df, report))
+
+    if len(runs) == 1:
+        _, _, fail_df, report = runs[0]
+        output_file = stage("export", lambda: report_file(write_report, fail_df, report, name=OUTPUT_FILE))
+    else:
+        detail = stage("paired details", lambda: paired_details(norm_df, runs))
+        reports = {policy.name: report for policy, _, _, report in runs}
+        output_file = stage("export", lambda: report_file(write_combined_report, detail, reports, name=COMBINED_OUTPUT_FILE))
+
+    windowed = len(runs[0][1])
+    failed = len(runs[0][2])
+    return timings, windowed, failed, os.path.getsize(output_file.path) / 2**20, peak_rss_mb()
+
+
+def bench_stages(sizes, sla):
+    from synthetic_data import parse_rows
+
+    # 30 天的合成数据里分析一周
+    window = (pd.Timestamp("2026-03-10"), pd.Timestamp("2026-03-16 23:59:59"))
+    cut_off = pd.Timestamp("2026-04-05 11:50")
+
+    for size in sizes:
+        rows = parse_rows(size)
+        with get_context("spawn").Pool(1) as pool:
+            timings, windowed, failed, file_mb, peak_mb = pool.apply(stage_timings, (rows, sla, window, cut_off))
+
+        print(f"rows={rows:,} sla={sla} windowed={windowed:,} failed={failed:,} file={file_mb:.1f} MB peak RSS={peak_mb:.0f} MB")
+        print(f"{'stage':<22}{'seconds':>10}{'peak +MB':>10}")
+        for name, seconds, extra_mb in timings:
+            extra = f"{extra_mb:>10.0f}" if extra_mb is not None else f"{'-':>10}"
+            print(f"{name:<22}{seconds:>10.2f}{extra}")
+        analysis = sum(seconds for name, seconds, _ in timings if name not in ("generate", "read"))
+        print(f"{'analysis total':<22}{analysis:>10.2f}")
+        print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SLA analysis benchmarks")
+    parser.add_argument("suite", choices=["ingest", "memory", "export", "chunked", "stages"])
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--sizes", default="10k,100k", help="stages: comma separated sizes, e.g. 10k,100k,1M,5M")
+    parser.add_argument("--sla", choices=["cainiao", "client", "both"], default="cainiao")
+    args = parser.parse_args()
+
+    if args.suite == "ingest":
+        bench_ingest(args.rows, args.repeat)
+    elif args.suite == "memory":
+        bench_memory(args.rows)
+    elif args.suite == "export":
+        bench_export(args.rows)
+    elif args.suite == "chunked":
+        bench_chunked(args.rows, args.chunk_rows)
+    elif args.suite == "stages":
+        bench_stages(args.sizes.split(","), args.sla)
+
+
+if __name__ == "__main__":
+    main()
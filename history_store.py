@@ -0,0 +1,203 @@
+"""
+Local history of evaluated waybills (SQLite file next to the app).
+
+One row per (SLA类型, 面单号) with the SLA result, step durations and
+attribution; re-analyzing a waybill replaces its row. Rows are indexed by
+SLA类型 + 截止日期 (the SLA截止时间 date), so a window of past orders is read
+and summarized without the original exports.
+"""
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from sla_core import CUBE_KEYS, export_result, report_preview, summarize_counts
+from sla_durations import DURATION_COLS
+from sla_export import (
+    COMBINED_OUTPUT_FILE, DETAIL_MAX_ROWS, OUTPUT_FILE, report_file, write_combined_report, write_report
+)
+from run_info import NO_LOG
+
+HISTORY_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sla_history.sqlite")
+TABLE = "waybills"
+
+# (col, SQLite type); SLA截止时间 as int64 ns so windows compare exactly like filter_window
+COLUMNS = [
+    ("SLA类型", "TEXT NOT NULL"),
+    ("面单号", "TEXT NOT NULL"),
+    ("客户", "TEXT"),
+    ("集配站", "TEXT"),
+    ("配送站", "TEXT"),
+    ("收件人邮编集", "TEXT"),
+    ("SLA标准小时", "REAL"),
+    ("SLA截止时间", "INTEGER"),
+    ("截止日期", "TEXT"),
+    ("SLA实际小时", "REAL"),
+    ("SLA是否达标", "INTEGER"),
+] + [(col, "REAL") for col in DURATION_COLS] + [
+    ("链路问题归因", "TEXT"),
+    ("主要责任方", "TEXT"),
+    ("cut_off", "TEXT"),
+    ("更新时间", "TEXT"),
+]
+COLUMN_NAMES = [name for name, _ in COLUMNS]
+NUMBER_COLS = ["SLA标准小时", "SLA实际小时"] + DURATION_COLS
+
+UPSERT_BATCH = 50000
+
+
+def quoted(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def sql_values(values, kind=None):
+    """Python str / float / int values for sqlite3 (numpy scalars are not accepted), missing -> None."""
+    missing = values.isna()
+    if kind is not None:
+        values = values.astype(kind)
+    values = values.astype(object)
+    if kind is None:
+        values = values.map(str)
+    return values.where(~missing, None)
+
+
+def history_rows(policy_name, df, fail_df, cut_off=None):
+    """Rows to store for one policy run: every order of df, durations / attribution for the failed ones."""
+    rows = pd.DataFrame(index=df.index)
+    rows["SLA类型"] = policy_name
+    for col in ["面单号", "客户", "集配站", "配送站", "收件人邮编集"]:
+        rows[col] = sql_values(df[col])
+
+    due = df["SLA截止时间"]
+    due_ns = pd.Series(due.to_numpy(dtype="datetime64[ns]").view("i8"), index=df.index)
+    rows["SLA截止时间"] = sql_values(due_ns, "int64").where(due.notna(), None)
+    rows["截止日期"] = sql_values(due.dt.strftime("%Y-%m-%d"))
+    rows["SLA是否达标"] = sql_values(df["SLA是否达标"], "int64")
+
+    # 耗时只算了未达标的单，达标的单留空
+    for col in NUMBER_COLS:
+        source = df[col] if col in df.columns else fail_df[col].reindex(df.index)
+        rows[col] = sql_values(source, "float64")
+    for col in ["链路问题归因", "主要责任方"]:
+        rows[col] = sql_values(fail_df[col].reindex(df.index))
+
+    rows["cut_off"] = None if cut_off is None else str(pd.Timestamp(cut_off))
+    rows["更新时间"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return rows[COLUMN_NAMES]
+
+
+class HistoryStore:
+    """SQLite history of evaluated waybills, latest analysis of each (SLA类型, 面单号) wins."""
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        with closing(self.connect()) as conn, conn:
+            conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+                + ", ".join(f"{quoted(name)} {kind}" for name, kind in COLUMNS)
+                + ', PRIMARY KEY ("SLA类型", "面单号"))'
+            )
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {TABLE}_due ON {TABLE} ("SLA类型", "截止日期", "SLA截止时间")')
+
+    def connect(self):
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def upsert(self, policy_name, df, fail_df, cut_off=None):
+        """Insert or replace the orders of one policy run (df: windowed orders, fail_df: attributed failures)."""
+        rows = history_rows(policy_name, df, fail_df, cut_off)
+        # 没有面单号的单不入库；同一批里重复的面单号以最后一行为准
+        rows = rows[rows["面单号"].notna()]
+        rows = rows[~rows["面单号"].duplicated(keep="last")]
+
+        names = ", ".join(quoted(name) for name in COLUMN_NAMES)
+        updates = ", ".join(f"{quoted(name)}=excluded.{quoted(name)}" for name in COLUMN_NAMES[2:])
+        sql = (
+            f"INSERT INTO {TABLE} ({names}) VALUES ({', '.join('?' * len(COLUMN_NAMES))}) "
+            f'ON CONFLICT("SLA类型", "面单号") DO UPDATE SET {updates}'
+        )
+        with closing(self.connect()) as conn, conn:
+            for start in range(0, len(rows), UPSERT_BATCH):
+                batch = rows.iloc[start:start + UPSERT_BATCH]
+                conn.executemany(sql, batch.itertuples(index=False, name=None))
+        return len(rows)
+
+    def window_sql(self, policy_name, start, end):
+        """
+        WHERE clause of a window, due times compared like sla_core.filter_window.
+        Orders without due time belong to no window and are left out (as in the
+        trend mode): kept, they would pile up in every window as history grows.
+        """
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        where = '"SLA类型" = ? AND "截止日期" BETWEEN ? AND ? AND "SLA截止时间" BETWEEN ? AND ?'
+        params = [policy_name, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"), start.value, end.value]
+        return where, params
+
+    def query(self, sql, params=()):
+        with closing(self.connect()) as conn:
+            return pd.read_sql_query(sql, conn, params=params)
+
+    def counts(self, policy_name, start, end):
+        """Count cube (sla_core.summary_counts) of a past window, one GROUP BY in SQLite."""
+        where, params = self.window_sql(policy_name, start, end)
+        cols = ", ".join(quoted(k) for k in CUBE_KEYS)
+        table = self.query(f"SELECT {cols}, COUNT(*) AS n FROM {TABLE} WHERE {where} GROUP BY {cols}", params)
+        table["SLA是否达标"] = table["SLA是否达标"].astype(bool)
+        index = table[CUBE_KEYS].astype(object)
+        index = pd.MultiIndex.from_frame(index.where(index.notna(), np.nan))
+        return pd.Series(table["n"].to_numpy(dtype="int64"), index=index)
+
+    def summary(self, policy, start, end):
+        """Same summaries as a run of policy over (start, end), from the stored orders."""
+        return summarize_counts(self.counts(policy.name, start, end), policy)
+
+    def failed_orders(self, policy_name, start, end):
+        """Stored failed orders of a window, SLA截止时间 back as datetime."""
+        where, params = self.window_sql(policy_name, start, end)
+        fail_df = self.query(f'SELECT * FROM {TABLE} WHERE {where} AND "SLA是否达标" = 0 ORDER BY "SLA截止时间"', params)
+        fail_df["SLA截止时间"] = pd.to_datetime(fail_df["SLA截止时间"], unit="ns")
+        fail_df["SLA是否达标"] = fail_df["SLA是否达标"].astype(bool)
+        return fail_df
+
+    def overview(self):
+        """Stored orders per SLA类型: count and due date range (read from the 截止日期 index only)."""
+        return self.query(
+            f'SELECT "SLA类型", COUNT(*) AS "单量", MIN("截止日期") AS "最早截止日期", '
+            f'MAX("截止日期") AS "最晚截止日期" FROM {TABLE} GROUP BY "SLA类型"'
+        )
+
+
+def analyze_history(store, policies, sla_should_date, detail_mode="sheets", detail_rows=DETAIL_MAX_ROWS,
+                    log=NO_LOG, export=True):
+    """
+    Summaries of a past window from the store instead of uploads, result as in sla_core.analyze.
+    明细 holds the stored cols of the failed orders (one row per SLA类型 and order).
+    """
+    start, end = sla_should_date
+    reports, fails = {}, []
+    for policy in policies:
+        reports[policy.name] = log.track(f"{policy.name} 历史库汇总", lambda: store.summary(policy, start, end))
+        fails.append(log.track(f"{policy.name} 历史库明细", lambda: store.failed_orders(policy.name, start, end)))
+
+    if len(policies) == 1:
+        name, write_args = OUTPUT_FILE, (write_report, fails[0], reports[policies[0].name])
+    else:
+        # 没有未达标单的SLA类型不参与合并（空表会让 concat 推断列类型时告警），都没有时用空的明细
+        detail = [fail_df for fail_df in fails if len(fail_df)]
+        detail = pd.concat(detail, ignore_index=True) if detail else fails[0]
+        name, write_args = COMBINED_OUTPUT_FILE, (write_combined_report, detail, reports)
+
+    def write():
+        return log.track("写出Excel", lambda: report_file(
+            *write_args, name=name, detail_mode=detail_mode, max_rows=detail_rows
+        ))
+
+    result = {"preview": report_preview(reports), "export": export_result(name, write)}
+    if export:
+        result.update(result["export"]())
+    return result
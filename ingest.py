@@ -0,0 +1,444 @@
+import os
+import hashlib
+import importlib.util
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+
+# Cols read from the uploaded exports, everything else is skipped at load time
+INPUT_COLUMNS = [
+    '面单号',
+    '客户',
+    '原集配站',
+    '集配站名称',
+    '原配送站',
+    '配送站名称',
+    '段码',
+    '收件人邮编',
+    '分拨大包号',
+    '关配交接时间',
+    '首分拨首次入库时间',
+    '首分拨首次自动分拣时间',
+    '首分拨首次人工分拣时间',
+    '首分拨首次出库时间',
+    '配送站首次入库时间',
+    '司机首次领件时间',
+    '首次派送时间',
+    '派送司机',
+    '最新签收失败原因',
+    '异常释放时间',
+    '配送站归班时间',
+    '签收成功时间',
+    '末端异常提报时间',
+    '是否错分'
+]
+
+TIME_COLS = [
+    '关配交接时间',
+    '首分拨首次入库时间',
+    '首分拨首次自动分拣时间',
+    '首分拨首次人工分拣时间',
+    '首分拨首次出库时间',
+    '配送站首次入库时间',
+    '司机首次领件时间',
+    '首次派送时间',
+    '异常释放时间',
+    '配送站归班时间',
+    '签收成功时间',
+    '末端异常提报时间'
+]
+
+# Main chain of milestones, in order: the later one a row has reached, the more advanced it is
+# (see dedupe_waybills)
+PROGRESS_COLS = [
+    '关配交接时间',
+    '首分拨首次入库时间',
+    '首分拨首次出库时间',
+    '配送站首次入库时间',
+    '司机首次领件时间',
+    '首次派送时间',
+    '签收成功时间'
+]
+
+# Low-cardinality text cols kept as category in the analysis
+CATEGORY_COLS = [
+    '客户',
+    '集配站名称',
+    '配送站名称',
+    '段码',
+    '收件人邮编集',
+    '是否错分',
+    '最新签收失败原因'
+]
+
+# Text cols for formats without typed cells (csv)
+TEXT_DTYPES = {
+    '面单号': str,
+    '客户': str,
+    '原集配站': str,
+    '集配站名称': str,
+    '原配送站': str,
+    '配送站名称': str,
+    '段码': str,
+    '分拨大包号': str,
+    '派送司机': str,
+    '最新签收失败原因': str,
+    '是否错分': str
+}
+
+EXCEL_TYPES = ["xlsx", "xls"]
+CSV_TYPES = ["csv"]
+PARQUET_TYPES = ["parquet"]
+ARROW_TYPES = ["arrow", "feather", "ipc"]
+SUPPORTED_TYPES = EXCEL_TYPES + CSV_TYPES + PARQUET_TYPES + ARROW_TYPES
+
+# Upper bound of ingest worker processes
+MAX_WORKERS = 8
+
+# Rows per partition in chunked (out-of-core) mode
+CHUNK_ROWS = 200000
+
+
+def has_calamine() -> bool:
+    return importlib.util.find_spec("python_calamine") is not None
+
+
+def file_type(f) -> str:
+    name = getattr(f, "name", f)
+    return os.path.splitext(str(name))[1].lstrip(".").lower()
+
+
+def needed(col) -> bool:
+    return col in INPUT_COLUMNS
+
+
+def parse_time_col(values):
+    if values.dtype == object:
+        # csv 导出一般是 ISO 格式，整列解析；其他格式逐个推断
+        try:
+            return pd.to_datetime(values, format="ISO8601")
+        except (ValueError, TypeError):
+            pass
+    return pd.to_datetime(values, errors='coerce')
+
+
+def parse_time_cols(df):
+    for col in TIME_COLS:
+        if col in df.columns:
+            df[col] = parse_time_col(df[col])
+    return df
+
+
+def narrow_col(col, values):
+    if col in TIME_COLS:
+        return parse_time_col(values).astype("datetime64[ns]")
+    if col in CATEGORY_COLS:
+        return values.astype("category")
+    return values
+
+
+def prepare_frame(df, columns):
+    """
+    Pre-processing before any merge:
+    - prune to the given cols (in that order), others are dropped right away
+    - CATEGORY_COLS -> category, TIME_COLS -> datetime64[ns]
+    """
+    return pd.DataFrame({
+        col: narrow_col(col, df[col])
+        for col in columns if col in df.columns
+    }, index=df.index)
+
+
+def milestone_progress(df):
+    """
+    Sort keys of how advanced each row is, least significant first:
+    latest timestamp, filled TIME_COLS, furthest PROGRESS_COLS step reached.
+    """
+    times = [df[col].to_numpy(dtype="datetime64[ns]") for col in TIME_COLS if col in df.columns]
+    filled = np.zeros(len(df), dtype=np.int8)
+    latest = np.full(len(df), np.iinfo(np.int64).min)
+    for values in times:
+        filled += ~np.isnat(values)
+        latest = np.maximum(latest, values.view("i8"))  # NaT 是 int64 最小值，不影响最大值
+
+    step = np.zeros(len(df), dtype=np.int8)
+    for i, col in enumerate(PROGRESS_COLS, start=1):
+        if col in df.columns:
+            step[df[col].notna().to_numpy()] = i
+    return latest, filled, step
+
+
+def losing_rows(codes, rows, progress):
+    """
+    Positions of the repeated rows that are not kept: rows (positions) with their
+    面单号 codes and milestone_progress keys, the most advanced row of each 面单号
+    wins, the later position on a tie.
+    """
+    latest, filled, step = progress
+    # 按 面单号、进度排序，每组最后一行保留
+    order = np.lexsort((rows, latest, filled, step, codes[rows]))
+    sorted_codes = codes[rows][order]
+    last = np.append(sorted_codes[1:] != sorted_codes[:-1], True)
+    return rows[order[~last]]
+
+
+def repeated_rows(codes):
+    """Positions of the rows whose 面单号 code (-1 = missing) occurs more than once."""
+    valid = codes >= 0
+    repeated = np.zeros(len(codes), dtype=bool)
+    repeated[valid] = np.bincount(codes[valid])[codes[valid]] > 1
+    return np.flatnonzero(repeated)
+
+
+def dedupe_waybills(df):
+    """
+    One row per 面单号 (overlapping exports repeat orders), returns (df, rows dropped):
+    - 面单号 hashed into group codes once, only repeated ones are ranked
+    - the most advanced row is kept (see milestone_progress), the later upload on a tie
+    - rows without 面单号 are all kept, the row order is unchanged
+    """
+    codes, uniques = pd.factorize(df["面单号"])
+    if len(uniques) == (codes >= 0).sum():
+        return df, 0
+
+    rows = repeated_rows(codes)
+    drop = np.zeros(len(df), dtype=bool)
+    drop[losing_rows(codes, rows, milestone_progress(df.iloc[rows]))] = True
+    return df[~drop].reset_index(drop=True), int(drop.sum())
+
+
+def read_excel_file(f, engine=None):
+    if engine is None:
+        engine = "calamine" if has_calamine() else None
+    return pd.read_excel(f, usecols=needed, engine=engine)
+
+
+def read_csv_file(f):
+    try:
+        return pd.read_csv(f, usecols=needed, dtype=TEXT_DTYPES, encoding="utf-8-sig")
+    except UnicodeDecodeError:
+        # 国内系统导出的 csv 常见 GBK 编码
+        if hasattr(f, "seek"):
+            f.seek(0)
+        return pd.read_csv(f, usecols=needed, dtype=TEXT_DTYPES, encoding="gb18030")
+
+
+def read_parquet_file(f):
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(f)
+    columns = [c for c in parquet_file.schema_arrow.names if needed(c)]
+    return parquet_file.read(columns=columns).to_pandas()
+
+
+def read_arrow_file(f):
+    import pyarrow as pa
+
+    try:
+        table = pa.ipc.open_file(f).read_all()
+    except pa.ArrowInvalid:
+        # Arrow IPC stream format
+        if hasattr(f, "seek"):
+            f.seek(0)
+        table = pa.ipc.open_stream(f).read_all()
+    columns = [c for c in table.column_names if needed(c)]
+    return table.select(columns).to_pandas()
+
+
+def read_upload(f):
+    """
+    Read one uploaded export (xlsx / xls / csv / parquet / arrow):
+    - only INPUT_COLUMNS are loaded
+    - TIME_COLS are parsed to datetime (unparseable -> NaT)
+    """
+    kind = file_type(f)
+    if kind in EXCEL_TYPES:
+        df = read_excel_file(f)
+    elif kind in CSV_TYPES:
+        df = read_csv_file(f)
+    elif kind in PARQUET_TYPES:
+        df = read_parquet_file(f)
+    elif kind in ARROW_TYPES:
+        df = read_arrow_file(f)
+    else:
+        raise ValueError(f"不支持的文件格式: {getattr(f, 'name', f)}")
+    return parse_time_cols(df)
+
+
+def read_upload_bytes(name, data):
+    buffer = BytesIO(data)
+    buffer.name = name
+    return read_upload(buffer)
+
+
+def upload_payload(f):
+    # Paths go to the worker as is, uploaded file objects as (name, bytes)
+    if isinstance(f, (str, os.PathLike)):
+        return read_upload, (f,)
+    return read_upload_bytes, (getattr(f, "name", ""), f.getvalue())
+
+
+def csv_encoding(f, sample_size=1 << 20):
+    """utf-8-sig or gb18030, judged from the head of the file."""
+    if isinstance(f, (str, os.PathLike)):
+        with open(f, "rb") as fh:
+            sample = fh.read(sample_size)
+    else:
+        sample = f.read(sample_size)
+        f.seek(0)
+    # 只看到最后一个完整行，避免截断多字节字符
+    if len(sample) == sample_size and b"\n" in sample:
+        sample = sample[:sample.rindex(b"\n")]
+    try:
+        sample.decode("utf-8")
+        return "utf-8-sig"
+    except UnicodeDecodeError:
+        return "gb18030"
+
+
+def iter_csv_chunks(f, chunk_rows):
+    reader = pd.read_csv(
+        f, usecols=needed, dtype=TEXT_DTYPES, encoding=csv_encoding(f), chunksize=chunk_rows
+    )
+    with reader:
+        yield from reader
+
+
+def iter_parquet_chunks(f, chunk_rows):
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(f)
+    columns = [c for c in parquet_file.schema_arrow.names if needed(c)]
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows, columns=columns):
+        yield batch.to_pandas()
+
+
+def iter_arrow_chunks(f, chunk_rows):
+    import pyarrow as pa
+
+    try:
+        reader = pa.ipc.open_file(f)
+        batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    except pa.ArrowInvalid:
+        # Arrow IPC stream format
+        if hasattr(f, "seek"):
+            f.seek(0)
+        batches = pa.ipc.open_stream(f)
+
+    for batch in batches:
+        columns = [c for c in batch.schema.names if needed(c)]
+        for start in range(0, batch.num_rows, chunk_rows):
+            yield batch.select(columns).slice(start, chunk_rows).to_pandas()
+
+
+def iter_excel_chunks(f, chunk_rows):
+    # Excel 不能分块读取，整个文件读入后再切分
+    df = read_excel_file(f)
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows].copy()
+
+
+def iter_upload_chunks(files, chunk_rows=CHUNK_ROWS):
+    """
+    Read the uploads as partitions of at most chunk_rows rows, file by file in order,
+    same cols / time parsing as read_upload. Only csv / parquet / arrow are read
+    incrementally, an Excel file is loaded whole and then split.
+    """
+    for f in files:
+        if hasattr(f, "seek"):
+            # 上传的文件对象可能在上一次运行中已经读过
+            f.seek(0)
+        kind = file_type(f)
+        if kind in EXCEL_TYPES:
+            chunks = iter_excel_chunks(f, chunk_rows)
+        elif kind in CSV_TYPES:
+            chunks = iter_csv_chunks(f, chunk_rows)
+        elif kind in PARQUET_TYPES:
+            chunks = iter_parquet_chunks(f, chunk_rows)
+        elif kind in ARROW_TYPES:
+            chunks = iter_arrow_chunks(f, chunk_rows)
+        else:
+            raise ValueError(f"不支持的文件格式: {getattr(f, 'name', f)}")
+        for chunk in chunks:
+            yield parse_time_cols(chunk)
+
+
+def waybill_keep_mask(files, chunk_rows=CHUNK_ROWS):
+    """
+    First pass of the chunked mode: which rows dedupe_waybills would keep on the
+    whole upload, across partitions and files. Returns (bool per row in
+    iter_upload_chunks order, rows dropped); only a 64-bit hash of 面单号 and the
+    progress keys of each row are held, not the rows.
+    """
+    hashes, missing, latest, filled, step = [], [], [], [], []
+    for chunk in iter_upload_chunks(files, chunk_rows):
+        ids = chunk["面单号"].astype(object).to_numpy()
+        hashes.append(pd.util.hash_array(ids))
+        missing.append(pd.isna(ids))
+        for keys, values in zip((latest, filled, step), milestone_progress(chunk)):
+            keys.append(values)
+    if not hashes:
+        return np.zeros(0, dtype=bool), 0
+
+    codes = pd.factorize(np.concatenate(hashes))[0]
+    codes[np.concatenate(missing)] = -1
+    rows = repeated_rows(codes)
+    keep = np.ones(len(codes), dtype=bool)
+    if len(rows):
+        progress = [np.concatenate(keys)[rows] for keys in (latest, filled, step)]
+        keep[losing_rows(codes, rows, progress)] = False
+    return keep, int((~keep).sum())
+
+
+def upload_digest(files):
+    """Content hash of the uploads (names + bytes, in order), used as cache key."""
+    digest = hashlib.blake2b(digest_size=16)
+    for f in files:
+        digest.update(str(getattr(f, "name", f)).encode("utf-8"))
+        if isinstance(f, (str, os.PathLike)):
+            with open(f, "rb") as fh:
+                for chunk in iter(lambda: fh.read(1 << 20), b""):
+                    digest.update(chunk)
+        else:
+            digest.update(f.getvalue())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def read_uploads(files, max_workers=None, progress=None):
+    """
+    Read and concat several uploads, one worker process per file (bounded).
+    - progress(done, total, name) is called in the caller's thread after each file
+    - row order follows the files order
+    """
+    files = list(files)
+    total = len(files)
+    if not total:
+        raise ValueError("没有要读取的文件")
+    if max_workers is None:
+        max_workers = min(total, os.cpu_count() or 1, MAX_WORKERS)
+
+    frames = [None] * total
+    if max_workers <= 1:
+        for i, f in enumerate(files):
+            frames[i] = read_upload(f)
+            if progress:
+                progress(i + 1, total, getattr(f, "name", str(f)))
+    else:
+        # spawn: forking the threaded Streamlit server can deadlock the workers
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+            futures = {}
+            for i, f in enumerate(files):
+                func, args = upload_payload(f)
+                futures[pool.submit(func, *args)] = i
+            for done, future in enumerate(as_completed(futures), start=1):
+                i = futures.pop(future)
+                frames[i] = future.result()
+                if progress:
+                    progress(done, total, getattr(files[i], "name", str(files[i])))
+
+    return pd.concat(frames, ignore_index=True) if total > 1 else frames[0]
@@ -0,0 +1,176 @@
+"""
+Per-stage run information: wall time, row count and peak memory of each stage,
+plus an opt-in cProfile capture of the whole run.
+"""
+import cProfile
+import io
+import itertools
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+PROFILE_TOP = 40
+
+RUN_INFO_COLUMNS = ["步骤", "耗时(秒)", "行数", "内存峰值(MB)", "来源"]
+
+_run_ids = itertools.count(1)
+
+# VmHWM is per process: runs with an open stage, a stage's peak is only kept while its run is alone
+_active_runs = set()
+_active_lock = threading.Lock()
+
+
+def proc_status_mb(field):
+    """VmRSS / VmHWM ... of this process in MB (Linux only, else None)."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """Start VmHWM over from the current RSS (Linux), so each stage gets its own peak."""
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def stage_label(name, depth):
+    # 子步骤缩进显示在父步骤下面
+    return "　" * (depth - 1) + "└ " + name if depth else name
+
+
+def rows_of(value):
+    return len(value) if isinstance(value, (pd.DataFrame, pd.Series)) else None
+
+
+class RunLog:
+    """
+    Stages of one analysis run, in order:
+    - stage(name) as a context manager, track(name, compute) for a computed value
+    - cached(name, value) for a stage served from a cache (no time / memory)
+    - peak memory is the RSS peak above the stage's start (Linux only, nested
+      stages are included in their parent's peak). The peak is of the whole
+      process, so it is only measured while this run is the only one with an
+      open stage; a stage overlapping another run (e.g. a second Streamlit
+      session) gets None
+    - enabled=False records nothing (the default when no log is passed)
+    """
+
+    def __init__(self, enabled=True, profile=False):
+        self.enabled = enabled
+        self.run_id = next(_run_ids)
+        self.records = []
+        self.open_stages = []
+        self.profiler = cProfile.Profile() if enabled and profile else None
+
+    def peak_now(self):
+        peak = proc_status_mb("VmHWM")
+        if peak is None:
+            return
+        for frame in self.open_stages:
+            frame["peak"] = max(frame["peak"], peak)
+
+    def start_memory(self):
+        """Reset VmHWM for a new stage if no other run is active, else drop all overlapping peaks."""
+        with _active_lock:
+            _active_runs.add(self)
+            if len(_active_runs) > 1:
+                for run in _active_runs:
+                    for frame in run.open_stages:
+                        frame["memory"] = False
+                return False
+            if self.open_stages:
+                self.peak_now()
+            return reset_peak_rss()
+
+    def end_memory(self, frame):
+        with _active_lock:
+            if frame["memory"]:
+                self.peak_now()
+            self.open_stages.pop()
+            if not self.open_stages:
+                _active_runs.discard(self)
+
+    @contextmanager
+    def stage(self, name, rows=None):
+        if not self.enabled:
+            yield {}
+            return
+
+        memory = self.start_memory()
+        start_rss = proc_status_mb("VmRSS") if memory else None
+        frame = {"rows": rows, "peak": start_rss or 0, "memory": memory}
+        depth = len(self.open_stages)
+        record = {"步骤": stage_label(name, depth), "nested": depth > 0}
+        # 先占位，嵌套的子步骤排在父步骤之后
+        self.records.append(record)
+        self.open_stages.append(frame)
+        t0 = time.perf_counter()
+        try:
+            yield frame
+        finally:
+            seconds = time.perf_counter() - t0
+            self.end_memory(frame)
+            record.update({
+                "耗时(秒)": round(seconds, 3),
+                "行数": frame["rows"],
+                "内存峰值(MB)": round(max(frame["peak"] - start_rss, 0), 1) if frame["memory"] else None,
+                "来源": "计算",
+            })
+
+    def track(self, name, compute):
+        with self.stage(name) as frame:
+            value = compute()
+            frame["rows"] = rows_of(value)
+        return value
+
+    def cached(self, name, value):
+        if self.enabled:
+            depth = len(self.open_stages)
+            self.records.append({
+                "步骤": stage_label(name, depth), "nested": depth > 0,
+                "耗时(秒)": 0.0, "行数": rows_of(value), "内存峰值(MB)": None, "来源": "缓存",
+            })
+        return value
+
+    def frame(self):
+        # 还没结束的步骤（例如正在写出的 Excel）不算
+        df = pd.DataFrame([r for r in self.records if "来源" in r], columns=RUN_INFO_COLUMNS)
+        return df.astype({"行数": "Int64"})
+
+    def total_seconds(self):
+        # 只算最外层步骤，嵌套的子步骤已包含在父步骤里
+        return sum(r.get("耗时(秒)") or 0 for r in self.records if not r.get("nested"))
+
+    @contextmanager
+    def profiling(self):
+        """cProfile over the block when the log was created with profile=True."""
+        if self.profiler is None:
+            yield
+            return
+        self.profiler.enable()
+        try:
+            yield
+        finally:
+            self.profiler.disable()
+
+    def profile_text(self, top=PROFILE_TOP):
+        if self.profiler is None:
+            return ""
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats("cumulative").print_stats(top)
+        return out.getvalue()
+
+
+NO_LOG = RunLog(enabled=False)
@@ -0,0 +1,143 @@
+import pandas as pd
+import numpy as np
+
+from sla_engine import hours_between
+
+# (链路问题归因, 主要责任方), indexed by the codes below
+OUTCOMES = [
+    ("分拨未入库", "分拨"),
+    ("分拨入库过晚", "分拨"),
+    ("分拨未分拣", "分拨"),
+    ("分拨未及时出库", "分拨"),
+    ("仓配交接差异", "分拨"),
+    ("错分", "分拨"),
+    ("卡车迟到/分拨数据出库实物未装车/大包不准确或丢失/大包漏扫/错分未打标/系统bug（需确认）", "待确认"),
+    ("飘件/包裹在配送站丢失（须严查原因）", "配送"),
+    ("DSP严重压单（需警告）/飘件", "配送"),
+    ("DSP压单/飘件", "配送"),
+    ("DSP领件两日内未投递（需警告）", "配送"),
+    ("DSP领件未及时投递", "配送"),
+    ("DSP因某些原因未投递成功（需确认）", "配送"),
+    ("DSP达成投递要求但超时", "配送"),
+    ("DSP达成投递要求但略微超时，存在潜在问题（需确认）", "待确认"),
+]
+
+(
+    NOT_INBOUND, LATE_INBOUND, NOT_SORTED, LATE_OUTBOUND, HANDOVER_GAP,
+    MISSORT, MISSORT_UNCONFIRMED, LOST_AT_STATION, DSP_SEVERE_HOLD, DSP_HOLD,
+    DSP_NOT_DELIVERED_2D, DSP_LATE_DELIVERY, DSP_DELIVERY_FAILED, DSP_DELIVERED_LATE,
+    DSP_SLIGHTLY_LATE,
+) = range(len(OUTCOMES))
+
+
+def missort_or_not(fail_df):
+    return np.where(fail_df["是否错分"] == "是", MISSORT, MISSORT_UNCONFIRMED)
+
+
+def pickup_or_not(fail_df, cut_off, narrow_clients=()):
+    to_pickup = fail_df["耗时_配送站入库→司机领件"]
+    to_dispatch = fail_df["耗时_司机领件→首次派送"]
+    is_com = fail_df["集配站"] == "HUB_LAX_COM"
+    is_narrow = fail_df["客户"].isin(narrow_clients)
+
+    return np.select(
+        [
+            to_pickup.isna() & (hours_between(cut_off, fail_df["配送站首次入库时间"]) > 96),
+            to_pickup.isna(),
+            is_com & (to_pickup > 12) & (to_pickup > 36),
+            is_com & (to_pickup > 12),
+            to_pickup > 32,
+            to_pickup > 8,
+            to_dispatch.isna() & (hours_between(cut_off, fail_df["司机首次领件时间"]) > 48),
+            to_dispatch.isna(),
+            to_dispatch > 42,
+            to_dispatch > 16,
+            is_narrow & fail_df["签收成功时间"].isna(),
+            is_narrow & (fail_df["耗时_司机领件→签收成功"] > 16),
+        ],
+        [
+            LOST_AT_STATION,
+            DSP_SEVERE_HOLD,
+            DSP_SEVERE_HOLD,
+            DSP_HOLD,
+            DSP_SEVERE_HOLD,
+            DSP_HOLD,
+            DSP_NOT_DELIVERED_2D,
+            DSP_LATE_DELIVERY,
+            DSP_NOT_DELIVERED_2D,
+            DSP_LATE_DELIVERY,
+            DSP_DELIVERY_FAILED,
+            DSP_DELIVERED_LATE,
+        ],
+        default=DSP_SLIGHTLY_LATE
+    )
+
+
+def sort_or_not(fail_df, sla_days, cut_off, narrow_clients=()):
+    missort = missort_or_not(fail_df)
+    pickup = pickup_or_not(fail_df, cut_off, narrow_clients)
+
+    limit_hours = 12 + 24 * (sla_days - 2)
+    to_station = fail_df["耗时_分拨出库→配送站入库"]
+    to_exception = fail_df["耗时_分拨出库→异常登记"]
+    no_station = to_station.isna()
+    no_exception = fail_df["末端异常提报时间"].isna()
+    is_com = fail_df["集配站"] == "HUB_LAX_COM"
+
+    return np.select(
+        [
+            fail_df["首分拨首次分拣时间"].isna(),
+            fail_df["首分拨首次出库时间"].isna(),
+            fail_df["耗时_分拨入库→分拨出库"] > limit_hours,
+            no_station & no_exception & (hours_between(cut_off, fail_df["首分拨首次出库时间"]) > 96),
+            no_station & no_exception,
+            no_station & (to_exception > 15) & (to_exception > 96),
+            no_station & (to_exception > 15),
+            no_station,
+            (to_station > 0.25) & is_com,
+            (to_station > 0.25) & (to_station > 15),
+        ],
+        [
+            NOT_SORTED,
+            LATE_OUTBOUND,
+            LATE_OUTBOUND,
+            HANDOVER_GAP,
+            missort,
+            HANDOVER_GAP,
+            missort,
+            pickup,
+            missort,
+            missort,
+        ],
+        default=pickup
+    )
+
+
+def attribute_failures(fail_df, sla_days, cut_off, narrow_clients=()):
+    """
+    Failure reason decision tree for all failed rows at once.
+    - sla_days: SLA days of each row (aligned with fail_df)
+    - narrow_clients: clients whose on-time DSP parcels are checked against 签收成功时间
+    Returns the 链路问题归因 / 主要责任方 columns.
+    """
+    cut_off = pd.Timestamp(cut_off)
+    sla_days = pd.Series(sla_days, index=fail_df.index)
+
+    late_inbound = fail_df["客户"].isin(["AE", "SKA2"]) & (fail_df["耗时_关配→分拨入库"] > 24)
+    codes = np.select(
+        [
+            fail_df["首分拨首次入库时间"].isna(),
+            late_inbound,
+        ],
+        [
+            NOT_INBOUND,
+            LATE_INBOUND,
+        ],
+        default=sort_or_not(fail_df, sla_days, cut_off, narrow_clients)
+    )
+
+    reasons, duties = zip(*OUTCOMES)
+    return pd.DataFrame({
+        "链路问题归因": np.asarray(reasons, dtype=object)[codes],
+        "主要责任方": np.asarray(duties, dtype=object)[codes]
+    }, index=fail_df.index)
@@ -0,0 +1,192 @@
+"""
+Headless batch run for scheduled reports: the uploads are read once, then one
+workbook per SLA should date window is written to an output folder.
+
+    python sla_batch.py "exports/*.xlsx" --sla 中台 --last-days 7 --out reports
+    python sla_batch.py a.csv b.csv --sla 中台+客户 --window 2026-03-01 \\
+        --window "2026-03-02 00:00~2026-03-03 12:00" --cut-off "2026-03-09 11:50"
+"""
+import argparse
+import glob
+import os
+import time as timer
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, time, timedelta
+
+import pandas as pd
+
+from cainiao_sla_analysis import POLICY as CAINIAO_POLICY
+from client_sla_analysis import POLICY as CLIENT_POLICY
+from sla_core import STAGE_LABELS, StageCache, analyze, analyze_combined, evaluate_frame, normalize_frame
+from ingest import MAX_WORKERS, read_uploads
+from zone_mapping import load_zone_index
+
+SLA_TYPES = {
+    "中台": [CAINIAO_POLICY],
+    "客户": [CLIENT_POLICY],
+    "中台+客户": [CAINIAO_POLICY, CLIENT_POLICY],
+}
+
+# Same default cut_off time as the app
+CUT_OFF_TIME = time(11, 50)
+DAY_END = time(23, 59, 59)
+
+# Normalized frame and warmed StageCache of the run, set in every worker by init_worker
+_batch = {}
+
+
+def day_window(day):
+    return datetime.combine(day, time(0, 0)), datetime.combine(day, DAY_END)
+
+
+def parse_time(text, end=False):
+    value = pd.Timestamp(text.strip()).to_pydatetime()
+    # 结束只写日期时包含当天
+    if end and ":" not in text:
+        value = datetime.combine(value.date(), DAY_END)
+    return value
+
+
+def parse_window(text):
+    """"2026-03-01" (the whole day) or "start~end" (each a date or date time)."""
+    if "~" not in text:
+        return day_window(parse_time(text).date())
+    start, end = text.split("~", 1)
+    return parse_time(start), parse_time(end, end=True)
+
+
+def daily_windows(first, last):
+    days = pd.date_range(first, last, freq="D")
+    return [day_window(day.date()) for day in days]
+
+
+def window_tag(window):
+    """File name part of a window: 20260301 for a whole day, else start-end."""
+    start, end = window
+    if start.time() == time(0, 0) and end.time() == DAY_END:
+        if start.date() == end.date():
+            return f"{start:%Y%m%d}"
+        return f"{start:%Y%m%d}-{end:%Y%m%d}"
+    return f"{start:%Y%m%d%H%M}-{end:%Y%m%d%H%M}"
+
+
+def input_files(patterns):
+    files = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        files += [path for path in matches if path not in files]
+    missing = [path for path in files if not os.path.isfile(path)]
+    if missing or not files:
+        raise SystemExit(f"找不到输入文件: {', '.join(missing or patterns)}")
+    return files
+
+
+def warm_cache(norm_df, policies):
+    # SLA判定与时间段无关，在主进程算一次，各窗口（各进程）直接沿用
+    cache = StageCache()
+    for policy in policies:
+        cache.get(
+            (policy.name, "evaluate"), (policy,), lambda: evaluate_frame(norm_df, policy),
+            name=f"{policy.name} {STAGE_LABELS['evaluate']}"
+        )
+    return cache
+
+
+def init_worker(norm_df, cache, policies, cut_off, out_dir, detail_mode):
+    _batch.update(
+        norm_df=norm_df, cache=cache, policies=policies,
+        cut_off=cut_off, out_dir=out_dir, detail_mode=detail_mode
+    )
+
+
+def run_window(window):
+    """Write the report of one window into the output folder, returns (path, seconds, overall)."""
+    t0 = timer.perf_counter()
+    norm_df, cache, policies = _batch["norm_df"], _batch["cache"], _batch["policies"]
+    options = {"cut_off": _batch["cut_off"], "cache": cache, "detail_mode": _batch["detail_mode"]}
+    if len(policies) == 1:
+        result = analyze(norm_df, policies[0], window, **options)
+    else:
+        result = analyze_combined(norm_df, policies, window, **options)
+
+    stem, suffix = os.path.splitext(result["filename"])
+    path = os.path.join(_batch["out_dir"], f"{stem}_{window_tag(window)}{suffix}")
+    result["output_file"].move_to(path)
+    overall = next(iter(result["preview"].values()))
+    return path, timer.perf_counter() - t0, overall
+
+
+def run_batch(files, policies, windows, cut_off, out_dir, workers=None, detail_mode="sheets"):
+    """
+    Reports of several windows on the same uploads:
+    - the uploads are read, normalized and evaluated once
+    - windows run in a process pool of `workers` (1 = in this process); the
+      normalized frame and the evaluated cache are pickled once into every
+      worker on start-up (a copy per worker, but the uploads are not re-read)
+    - returns [(window, path, seconds, overall table)] in window order
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    norm_df = normalize_frame(read_uploads(files), load_zone_index())
+    cache = warm_cache(norm_df, policies)
+    init_args = (norm_df, cache, policies, cut_off, out_dir, detail_mode)
+
+    if workers is None:
+        workers = min(len(windows), os.cpu_count() or 1, MAX_WORKERS)
+    results = [None] * len(windows)
+    if workers <= 1:
+        init_worker(*init_args)
+        for i, window in enumerate(windows):
+            results[i] = (window,) + run_window(window)
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=init_args) as pool:
+            futures = {pool.submit(run_window, window): i for i, window in enumerate(windows)}
+            for future in as_completed(futures):
+                i = futures[future]
+                results[i] = (windows[i],) + future.result()
+    return norm_df, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SLA analysis reports without the web app")
+    parser.add_argument("files", nargs="+", help="export files or glob patterns (xlsx / csv / parquet / arrow)")
+    parser.add_argument("--sla", choices=list(SLA_TYPES), default="中台")
+    parser.add_argument("--window", action="append", default=[],
+                        help='SLA should date window, "2026-03-01" or "start~end"; repeatable')
+    parser.add_argument("--daily", nargs=2, metavar=("FIRST", "LAST"), help="one window per day from FIRST to LAST")
+    parser.add_argument("--last-days", type=int, help="one window per day for the N days before today")
+    parser.add_argument("--cut-off", help=f"default: today {CUT_OFF_TIME:%H:%M}")
+    parser.add_argument("--workers", type=int, help="worker processes across windows (1 = no pool)")
+    parser.add_argument("--detail-mode", choices=["sheets", "parquet", "csv"], default="sheets")
+    parser.add_argument("--out", default="reports", help="output folder")
+    args = parser.parse_args()
+
+    windows = [parse_window(text) for text in args.window]
+    if args.daily:
+        windows += daily_windows(*args.daily)
+    if args.last_days:
+        today = date.today()
+        windows += daily_windows(today - timedelta(days=args.last_days), today - timedelta(days=1))
+    # 重复的时间段只出一份报告
+    windows = list(dict.fromkeys(windows))
+    if not windows:
+        parser.error("至少需要一个时间段（--window / --daily / --last-days）")
+
+    if args.cut_off:
+        cut_off = pd.Timestamp(args.cut_off).to_pydatetime()
+    else:
+        cut_off = datetime.combine(date.today(), CUT_OFF_TIME)
+
+    t0 = timer.perf_counter()
+    norm_df, results = run_batch(
+        input_files(args.files), SLA_TYPES[args.sla], windows, cut_off, args.out,
+        workers=args.workers, detail_mode=args.detail_mode
+    )
+    print(f"{len(norm_df):,} 行（重复面单号去掉 {norm_df.attrs['duplicates']:,} 行），cut_off {cut_off}")
+    for (start, end), path, seconds, overall in results:
+        print(f"{start} ~ {end}: {path}（{seconds:.1f} 秒）")
+        print(overall.to_string(index=False))
+    print(f"共 {len(results)} 个报告，{timer.perf_counter() - t0:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Chunked (out-of-core) analysis for uploads larger than memory.
+
+The uploads are read partition by partition (ingest.iter_upload_chunks); each
+partition goes through the same stages as sla_core, then only its mergeable
+summary counts are kept in memory and its failed orders are spilled to disk.
+"""
+import os
+import shutil
+import tempfile
+import weakref
+
+import pandas as pd
+
+from ingest import CHUNK_ROWS, iter_upload_chunks, waybill_keep_mask
+from sla_core import (
+    attribute, evaluate_frame, export_result, failed_orders, filter_window, merge_counts,
+    merge_sorting_time, normalize_frame, paired_details, report_preview, summarize_counts, summary_counts,
+    STAGE_LABELS
+)
+from sla_export import (
+    OUTPUT_FILE, COMBINED_OUTPUT_FILE, DETAIL_MAX_ROWS,
+    report_file, write_report, write_combined_report
+)
+from zone_mapping import load_zone_index
+from run_info import NO_LOG
+
+
+class DetailSpill:
+    """Failed order detail kept on disk part by part (pickle keeps the exact dtypes)."""
+
+    def __init__(self):
+        self.folder = tempfile.mkdtemp(prefix="sla_detail_")
+        weakref.finalize(self, shutil.rmtree, self.folder, True)
+        self.paths = []
+        self.rows = 0
+        self.header = None
+
+    def append(self, df):
+        if self.header is None:
+            self.header = df.iloc[:0]
+        if len(df):
+            path = os.path.join(self.folder, f"part-{len(self.paths):05d}.pkl")
+            df.to_pickle(path)
+            self.paths.append(path)
+            self.rows += len(df)
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def columns(self):
+        return self.header.columns if self.header is not None else pd.Index([])
+
+    def parts(self):
+        if not self.paths:
+            yield self.header if self.header is not None else pd.DataFrame()
+        for path in self.paths:
+            yield pd.read_pickle(path)
+
+
+def analyze_chunked(
+    files,
+    policies,
+    sla_should_date=None,
+    cut_off=None,
+    zone_index=None,
+    chunk_rows=CHUNK_ROWS,
+    detail_mode="sheets",
+    detail_rows=DETAIL_MAX_ROWS,
+    progress=None,
+    log=NO_LOG,
+    run_info_sheet=False,
+    export=True,
+    history=None
+):
+    """
+    One or several policies on the uploads, chunk_rows rows at a time:
+    - the summaries are built from counts added up over the partitions
+    - the report is the same as analyze / analyze_combined on the whole upload
+    - progress(partitions done, rows done) is called after each partition
+    - log records the partition loop, the summaries and the Excel write as stages
+    - result / export as in sla_core.analyze (the spilled detail stays on disk until then)
+    - history: HistoryStore each partition's evaluated orders are upserted into
+    - repeated 面单号 are collapsed across partitions and files like in the whole
+      frame: a first pass over the uploads (面单号 and progress keys only) picks the
+      rows to keep, result["duplicates"] is the number dropped
+    """
+    if zone_index is None:
+        zone_index = load_zone_index()
+
+    with log.stage("面单号去重（全部分块）") as stage:
+        keep, duplicates = waybill_keep_mask(files, chunk_rows)
+        stage["rows"] = len(keep)
+
+    counts = {policy.name: None for policy in policies}
+    spill = DetailSpill()
+    rows = offset = 0
+
+    with log.stage("分块读取与分析") as stage:
+        for i, chunk in enumerate(iter_upload_chunks(files, chunk_rows), start=1):
+            kept = keep[offset:offset + len(chunk)]
+            offset += len(chunk)
+            if not kept.all():
+                chunk = chunk[kept].reset_index(drop=True)
+            norm_df = normalize_frame(chunk, zone_index)
+            del chunk
+
+            runs = []
+            for policy in policies:
+                df = merge_sorting_time(filter_window(evaluate_frame(norm_df, policy), sla_should_date))
+                fail_df = attribute(failed_orders(df), policy, cut_off)
+
+                part_counts = summary_counts(df, fail_df)
+                previous = counts[policy.name]
+                counts[policy.name] = part_counts if previous is None else merge_counts([previous, part_counts])
+                runs.append((policy, df, fail_df, None))
+                if history is not None:
+                    history.upsert(policy.name, df, fail_df, cut_off)
+
+            spill.append(runs[0][2] if len(policies) == 1 else paired_details(norm_df, runs))
+            rows += len(norm_df)
+            del runs, norm_df
+            if progress:
+                progress(i, rows)
+        stage["rows"] = rows
+
+    reports = {
+        policy.name: summarize_counts(counts[policy.name], policy, log)
+        for policy in policies
+    }
+
+    if len(policies) == 1:
+        name = OUTPUT_FILE
+        write_args = (write_report, spill, reports[policies[0].name])
+    else:
+        name = COMBINED_OUTPUT_FILE
+        write_args = (write_combined_report, spill, reports)
+
+    def write():
+        return log.track(STAGE_LABELS["export"], lambda: report_file(
+            *write_args,
+            name=name, detail_mode=detail_mode, max_rows=detail_rows,
+            run_info=log.frame() if run_info_sheet else None
+        ))
+
+    result = {"preview": report_preview(reports), "export": export_result(name, write), "duplicates": duplicates}
+    if export:
+        result.update(result["export"]())
+    return result
@@ -0,0 +1,656 @@
+"""
+SLA analysis pipeline shared by 中台SLA and 客户SLA.
+
+normalize_frame -> evaluate_frame -> filter_window -> merge_sorting_time
+-> failed_orders (stage durations) -> attribute -> summarize -> write_report
+
+Everything mode specific lives in an SlaPolicy; StageCache keeps the stage
+results between runs on the same upload.
+"""
+from dataclasses import dataclass
+from datetime import time
+from typing import Callable, Optional
+
+import pandas as pd
+import numpy as np
+
+from sla_engine import evaluate_sla
+from sla_attribution import attribute_failures
+from sla_durations import DURATION_COLS, stage_durations
+from run_info import NO_LOG
+from zone_mapping import load_zone_index, lookup_zone
+from ingest import INPUT_COLUMNS, dedupe_waybills, prepare_frame
+from sla_export import (
+    OUTPUT_FILE, COMBINED_OUTPUT_FILE, DETAIL_MAX_ROWS, compare_overall, compare_table,
+    report_file, report_name, write_report, write_combined_report
+)
+from sla_rules import match_sla_rules, sla_start_end, sla_targets
+
+# Names of the pipeline stages in the run information (see run_info.RunLog)
+STAGE_LABELS = {
+    "evaluate": "SLA判定",
+    "window": "时间段筛选",
+    "durations": "环节耗时",
+    "attribution": "问题归因",
+    "summaries": "汇总",
+    "history": "写入历史库",
+    "export": "写出Excel",
+}
+
+# Keys of the count cube every summary is derived from (see summary_counts)
+ORDER_KEYS = ["客户", "集配站", "配送站"]
+FAIL_KEYS = ORDER_KEYS + ["链路问题归因", "主要责任方"]
+CUBE_KEYS = FAIL_KEYS + ["SLA是否达标"]
+
+
+@dataclass(frozen=True)
+class SlaPolicy:
+    """
+    How one SLA mode is evaluated:
+    - load_rules / rule_keys: compiled rule table and the keys rows are matched on
+    - target_key: rule key the summary target rates are looked up by
+    - cut_time: end-of-day rules start one day later after this time
+    - narrow_clients: clients judged by 狭义妥投 in the attribution
+    - extra_columns(df): mode specific cols added before evaluation
+    - zone_after_postcode: 收件人邮编集 placed right after 收件人邮编 in 明细
+    """
+    name: str
+    load_rules: Callable
+    rule_keys: tuple
+    target_key: str
+    cut_time: Optional[time] = None
+    narrow_clients: tuple = ()
+    extra_columns: Optional[Callable] = None
+    zone_after_postcode: bool = False
+
+
+def normalize_frame(df, zone_index=None, log=NO_LOG):
+    """
+    Pruned, narrowed and renamed upload with zone info; the same for every policy.
+    Repeated 面单号 are collapsed first (see ingest.dedupe_waybills), the number of
+    rows dropped is kept in df.attrs["duplicates"].
+    """
+    with log.stage("筛列/类型转换", rows=len(df)):
+        df = prepare_frame(df, INPUT_COLUMNS).rename(columns={
+            '集配站名称': '集配站',
+            '配送站名称': '配送站'
+        })
+
+    with log.stage("面单号去重", rows=len(df)) as stage:
+        df, duplicates = dedupe_waybills(df)
+        stage["rows"] = len(df)
+    df.attrs["duplicates"] = duplicates
+
+    if zone_index is None:
+        zone_index = load_zone_index()
+    with log.stage("邮编→Zone", rows=len(df)):
+        df["收件人邮编集"] = lookup_zone(df["收件人邮编"], zone_index)
+    return df
+
+
+def calc_sla(df, policy, rules):
+    matched = match_sla_rules(df, rules, list(policy.rule_keys))
+    start_time, end_time = sla_start_end(df, matched)
+    return evaluate_sla(
+        start_time,
+        end_time,
+        matched["hours"],
+        matched["end_of_day"].eq(True),
+        cut_time=policy.cut_time
+    )
+
+
+def evaluate_frame(df, policy):
+    """Policy cols + SLA result on a new frame, the normalized frame is left untouched."""
+    parts = [df]
+    if policy.extra_columns is not None:
+        parts.append(policy.extra_columns(df))
+    df = pd.concat(parts, axis=1)
+
+    if policy.zone_after_postcode:
+        columns = [c for c in df.columns if c != '收件人邮编集']
+        columns.insert(columns.index('收件人邮编') + 1, '收件人邮编集')
+        df = df[columns]
+
+    sla_result = calc_sla(df, policy, policy.load_rules())
+    return pd.concat([df, sla_result], axis=1)
+
+
+def filter_window(df, sla_should_date=None):
+    """Only the orders for specified SLA period (orders without due time are kept)."""
+    if isinstance(sla_should_date, tuple):
+        sla_start, sla_end = sla_should_date # Time period
+    else:
+        sla_start, sla_end = None, sla_should_date # Single time
+
+    mask = pd.Series(True, index=df.index)
+
+    if sla_start is not None and sla_end is not None:
+        mask &= df["SLA截止时间"].isna() | df["SLA截止时间"].between(sla_start, sla_end, inclusive="both")
+
+    return df[mask].copy()
+
+
+def merge_sorting_time(df):
+    pos = df.columns.get_loc('首分拨首次自动分拣时间')
+    df['首分拨首次分拣时间'] = df[['首分拨首次人工分拣时间', '首分拨首次自动分拣时间']].max(axis=1)
+    df = df.drop(columns=[
+        '首分拨首次自动分拣时间',
+        '首分拨首次人工分拣时间'
+    ])
+    df.insert(pos, '首分拨首次分拣时间', df.pop('首分拨首次分拣时间'))
+    return df
+
+
+def print_client_rates(client_sla_summary, policy):
+    # 客户单量取自汇总结果，不再单独按客户分组
+    for client, info in client_sla_summary.items():
+        scope = "狭义" if client in policy.narrow_clients else "广义"
+        print(f"{client}: 总单量 {info['total']}，{scope}不达 {info['fail']} 单，不达率 {(1-info['success_rate'])*100:.2f}%")
+
+
+def failed_orders(df):
+    """Failed orders with the time consumed in each step (float32, failed rows only)."""
+    fail_df = df[(df["SLA是否达标"] == False)]
+    return pd.concat([fail_df, stage_durations(fail_df)], axis=1)
+
+
+def attribute(fail_df, policy, cut_off):
+    """Problem attribution of the failed orders, on a new frame."""
+    attribution = attribute_failures(
+        fail_df,
+        sla_days=match_sla_rules(fail_df, policy.load_rules(), list(policy.rule_keys))["days"],
+        cut_off=cut_off,
+        narrow_clients=list(policy.narrow_clients)
+    )
+    return pd.concat([fail_df, attribution], axis=1)
+
+
+def key_counts(df, keys):
+    """
+    Rows of df by every observed combination of keys (missing values kept), in one pass:
+    - each col factorized, the codes combined into one int64 key and counted with bincount
+    - index of plain values instead of categories, so counts of different partitions add up
+    """
+    codes, values = [], []
+    for key in keys:
+        code, uniques = pd.factorize(df[key])
+        codes.append(code + 1)  # 0 = missing
+        values.append(np.concatenate([[np.nan], np.asarray(uniques, dtype=object)]))
+    sizes = [len(v) for v in values]
+    cells = np.prod(sizes, dtype=float)
+    if cells >= 2**62:
+        # 组合太多时 int64 放不下，退回 groupby
+        counts = df.groupby(keys, dropna=False, observed=True).size()
+        counts.index = pd.MultiIndex.from_frame(counts.index.to_frame().astype(object))
+        return counts
+
+    combined = np.zeros(len(df), dtype=np.int64)
+    for code, size in zip(codes, sizes):
+        combined = combined * size + code
+    if cells <= max(len(df), 1 << 20):
+        counts = np.bincount(combined)
+        observed = np.flatnonzero(counts)
+        counts = counts[observed]
+    else:
+        observed, counts = np.unique(combined, return_counts=True)
+
+    arrays = []
+    for size, level_values in zip(reversed(sizes), reversed(values)):
+        arrays.append(level_values[observed % size])
+        observed = observed // size
+    index = pd.MultiIndex.from_arrays(arrays[::-1], names=keys)
+    return pd.Series(counts.astype(np.int64), index=index)
+
+
+def cube_frame(df, fail_df, keys=ORDER_KEYS):
+    """keys + SLA是否达标 of every order, with the attribution of the failed ones (empty when passed)."""
+    frame = df[keys + ["SLA是否达标"]].copy()
+    # 未达标订单在 df 中的位置只查一次，归因按 category 编码搬到全部订单上
+    positions = df.index.get_indexer(fail_df.index)
+    for col in ["链路问题归因", "主要责任方"]:
+        values = pd.Categorical(fail_df[col])
+        codes = np.full(len(df), -1, dtype=values.codes.dtype)
+        codes[positions] = values.codes
+        frame[col] = pd.Categorical.from_codes(codes, dtype=values.dtype)
+    return frame
+
+
+def summary_counts(df, fail_df):
+    """
+    Count cube behind every summary, in one grouped pass over the orders:
+    orders by 客户 × 集配站 × 配送站 × 链路问题归因 × 主要责任方 × SLA是否达标.
+    Cubes of several partitions add up (see merge_counts).
+    """
+    return key_counts(cube_frame(df, fail_df), CUBE_KEYS)
+
+
+def merge_counts(parts):
+    """Add up summary_counts of several partitions."""
+    return pd.concat(parts).groupby(level=CUBE_KEYS, dropna=False).sum()
+
+
+def cube_counts(cube):
+    """
+    Orders and failed orders of a cube, by its levels without the attribution:
+    - orders: by 客户 × 集配站 × 配送站 (and any leading level, e.g. a trend bucket)
+    - fails: failed orders, also by 链路问题归因 × 主要责任方
+    """
+    order_levels = [name for name in cube.index.names if name not in CUBE_KEYS[len(ORDER_KEYS):]]
+    passed = cube.index.get_level_values("SLA是否达标").astype(bool)
+    return {
+        "orders": cube.groupby(level=order_levels, dropna=False).sum(),
+        "fails": cube[~passed].droplevel("SLA是否达标"),
+    }
+
+
+def count_by(counts, keys, name, dropna=True):
+    return counts.groupby(level=keys, dropna=dropna).sum().reset_index(name=name)
+
+
+def station_summaries(orders, fails):
+    """
+    By 配送站 problem detail of every hub (配送站 empty kept), {hub: table}.
+    One grouped pass over all hubs, then sliced per hub.
+    """
+    station_total = count_by(orders, ["集配站", "配送站"], "配送站总单量")
+    
+    station_summary = count_by(
+        fails,
+        ["集配站", "配送站", "链路问题归因", "主要责任方"],
+        "问题单量",
+        dropna=False
+    )
+    
+    station_summary["配送站"] = station_summary["配送站"].astype("string").str.strip()
+    station_total["配送站"] = station_total["配送站"].astype("string").str.strip()
+    station_summary = station_summary.merge(station_total, on=["集配站", "配送站"], how="left")
+    station_summary["占比_numeric"] = station_summary["问题单量"] / station_summary["配送站总单量"].replace(0, np.nan)
+    station_summary = station_summary.sort_values(
+        ["集配站", "配送站", "占比_numeric"],
+        ascending=[True, True, False]
+    )
+    station_summary["占配送站总单量比"] = (
+        station_summary["占比_numeric"] * 100
+    ).round(2).fillna(0).astype(str) + "%"
+    station_summary = station_summary.drop(columns=["占比_numeric"])
+
+    # 让同一集配站内相邻重复的“配送站”显示为空（只保留第一行）
+    hub = station_summary["集配站"]
+    station = station_summary["配送站"]
+    same_hub = hub.eq(hub.shift())
+    same_as_prev = station.eq(station.shift())
+    
+    # 处理 NaN：如果当前和上一行都是空，也算重复
+    same_nan_as_prev = station.isna() & station.shift().isna()
+    
+    station_summary.loc[same_hub & (same_as_prev | same_nan_as_prev), "配送站"] = ""
+
+    return {
+        hub: part.drop(columns=["集配站"])
+        for hub, part in station_summary.groupby("集配站", observed=True, sort=False)
+    }
+
+
+def summarize(df, fail_df, policy, log=NO_LOG):
+    """Overall / by client / by hub / by station summaries used by the report."""
+    cube = log.track("汇总计数", lambda: summary_counts(df, fail_df))
+    return summarize_counts(cube, policy, log)
+
+
+def summarize_counts(cube, policy, log=NO_LOG):
+    """
+    Every summary table and per client / hub slice from one (merged) count
+    cube (see summary_counts); log times each summary.
+    """
+    sla_config = sla_targets(policy.load_rules(), policy.target_key)
+    counts = cube_counts(cube)
+    orders = counts["orders"]
+    fails = counts["fails"]
+
+    # ===== 1. Summary for all orders together =====
+    with log.stage("整体汇总"):
+        total_orders = int(orders.sum())
+        total_fail = int(fails.sum())
+        overall_fail_rate = total_fail / total_orders if total_orders > 0 else np.nan
+    
+        summary_all = count_by(fails, ["链路问题归因", "主要责任方"], "问题单量")
+    
+        summary_all["占比_numeric"] = summary_all["问题单量"] / total_orders
+        summary_all = summary_all.sort_values("占比_numeric", ascending=False)  # Sort from high to low
+        summary_all["占整体总单量比"] = (summary_all["占比_numeric"] * 100).round(2).astype(str) + "%"
+        summary_all = summary_all.drop(columns=["占比_numeric"])
+    
+        overall_info = pd.DataFrame([
+            ["总单量", total_orders],
+            ["未达标单量", total_fail],
+            ["未达标率", f"{overall_fail_rate*100:.2f}%" if total_orders > 0 else ""]
+        ], columns=["指标", "值"])
+    
+    # ===== 2. Summary by client =====
+    with log.stage("按客户汇总"):
+        client_total = count_by(orders, "客户", "客户总单量")
+    
+        summary_by_client = count_by(fails, ["客户", "链路问题归因", "主要责任方"], "问题单量")
+    
+        summary_by_client = summary_by_client.merge(client_total, on="客户", how="left")
+        summary_by_client["占比_numeric"] = summary_by_client["问题单量"] / summary_by_client["客户总单量"]
+        summary_by_client = summary_by_client.sort_values(
+            ["客户", "占比_numeric"],
+            ascending=[True, False]
+        )
+        summary_by_client["占客户总单量比"] = (
+            summary_by_client["占比_numeric"] * 100
+        ).round(2).astype(str) + "%"
+        summary_by_client = summary_by_client.drop(columns=["占比_numeric"])
+        client_details = {
+            client: part.drop(columns=["客户"])
+            for client, part in summary_by_client.groupby("客户", sort=False)
+        }
+    
+        client_sla_summary = {}
+        client_fail = fails.groupby(level="客户").sum()
+    
+        for client, total_c in orders.groupby(level="客户").sum().items():
+            total_c = int(total_c)
+            fail_c  = client_fail.get(client, 0)
+            ok_c    = total_c - fail_c
+    
+            success_rate = ok_c / total_c if total_c > 0 else np.nan
+    
+            cfg = sla_config.get(client, {})
+            target = cfg.get("target_rate", np.nan)
+    
+            meet = (not np.isnan(target)) and (success_rate >= target)
+    
+            client_sla_summary[client] = {
+                "total": total_c,
+                "fail": fail_c,
+                "ok": ok_c,
+                "success_rate": success_rate,
+                "fail_rate": fail_c / total_c if total_c > 0 else np.nan,
+                "target": target,
+                "meet_target": meet,
+            }
+    
+    # ===== 3. Summary by hub =====
+    with log.stage("按集配站汇总"):
+        hub_total = count_by(orders, "集配站", "站点总单量")
+    
+        summary_by_hub = count_by(fails, ["集配站", "链路问题归因", "主要责任方"], "问题单量")
+    
+        summary_by_hub = summary_by_hub.merge(hub_total, on="集配站", how="left")
+        summary_by_hub["占比_numeric"] = summary_by_hub["问题单量"] / summary_by_hub["站点总单量"]
+        summary_by_hub = summary_by_hub.sort_values(
+            ["集配站", "占比_numeric"],
+            ascending=[True, False]
+        )
+        summary_by_hub["占总单量比"] = (
+            summary_by_hub["占比_numeric"] * 100
+        ).round(2).astype(str) + "%"
+        summary_by_hub = summary_by_hub.drop(columns=["占比_numeric"])
+        hub_details = {
+            hub: part.drop(columns=["集配站"])
+            for hub, part in summary_by_hub.groupby("集配站", sort=False)
+        }
+    
+        # === 汇总到 集配站 级别（消除 duplicate） ===
+        hub_overall = (
+            summary_by_hub
+            .groupby("集配站", as_index=False, observed=True)
+            .agg(
+                站点总单量=("站点总单量", "first"),   
+                问题单量=("问题单量", "sum")      
+            )
+        )
+    
+        hub_overall["占集配站总单量比"] = (
+            hub_overall["问题单量"] / hub_overall["站点总单量"] * 100
+        ).round(2).astype(str) + "%"
+    
+        hub_sla_summary = {}
+        hub_fail = fails.groupby(level="集配站").sum()
+    
+        for hub, total_h in orders.groupby(level="集配站").sum().items():
+            total_h = int(total_h)
+            fail_h  = hub_fail.get(hub, 0)
+            ok_h    = total_h - fail_h
+    
+            success_rate = ok_h / total_h if total_h > 0 else np.nan
+    
+            cfg = sla_config.get(hub, {})
+            target = cfg.get("target_rate", np.nan)
+    
+            hub_sla_summary[hub] = {
+                "total": total_h,
+                "fail": fail_h,
+                "ok": ok_h,
+                "success_rate": success_rate,
+                "fail_rate": fail_h / total_h if total_h > 0 else np.nan,
+            }
+
+    with log.stage("按配送站汇总"):
+        hub_sta_summary = station_summaries(orders, fails)
+
+    return {
+        "overall_info": overall_info,
+        "summary_all": summary_all,
+        "summary_by_client": summary_by_client,
+        "client_details": client_details,
+        "client_sla_summary": client_sla_summary,
+        "summary_by_hub": summary_by_hub,
+        "hub_details": hub_details,
+        "hub_overall": hub_overall,
+        "hub_sla_summary": hub_sla_summary,
+        "hub_sta_summary": hub_sta_summary,
+        "clients": sorted(orders.index.get_level_values("客户").unique()),
+        "hubs": sorted(orders.index.get_level_values("集配站").dropna().astype(str).unique()),
+    }
+
+
+class StageCache:
+    """
+    Last result of every pipeline stage, bound to one normalized frame (data_key).
+    Each stage key carries the keys of the stages before it, so a changed
+    sla_should_date re-runs the window filter and after, a changed cut_off
+    only attribution, summaries and export.
+    Cached frames are shared between runs and never modified.
+    """
+
+    def __init__(self, data_key=None):
+        self.data_key = data_key
+        self.entries = {}
+
+    def get(self, stage, key, compute, log=NO_LOG, name=None):
+        """Cached value of stage for key, else compute(); log records it under name."""
+        name = name or " ".join(map(str, stage))
+        entry = self.entries.get(stage)
+        if entry is not None and entry[0] == key:
+            return log.cached(name, entry[1])
+        value = log.track(name, compute)
+        self.entries[stage] = (key, value)
+        return value
+
+
+def run_policy(norm_df, policy, sla_should_date=None, cut_off=None, cache=None, log=NO_LOG, history=None):
+    """
+    (windowed orders, failed orders, summaries) of one policy on a normalized frame.
+    history: HistoryStore (see history_store) the evaluated orders are upserted into.
+    """
+    if cache is None:
+        cache = StageCache()
+
+    def stage(name, key, compute):
+        return cache.get((policy.name, name), key, compute, log, f"{policy.name} {STAGE_LABELS[name]}")
+
+    def window():
+        return merge_sorting_time(filter_window(evaluated, sla_should_date))
+
+    key = (policy,)
+    evaluated = stage("evaluate", key, lambda: evaluate_frame(norm_df, policy))
+    key += (sla_should_date,)
+    df = stage("window", key, window)
+    durations = stage("durations", key, lambda: failed_orders(df))
+    key += (cut_off,)
+    fail_df = stage("attribution", key, lambda: attribute(durations, policy, cut_off))
+    report = stage("summaries", key, lambda: summarize(df, fail_df, policy, log))
+    if history is not None:
+        with log.stage(f"{policy.name} {STAGE_LABELS['history']}", rows=len(df)):
+            history.upsert(policy.name, df, fail_df, cut_off)
+    return df, fail_df, report
+
+
+def report_preview(reports):
+    """
+    Small frames of the headline numbers for the app, taken from the summaries
+    (policy name -> summarize result), no workbook needed.
+    """
+    if len(reports) == 1:
+        report = next(iter(reports.values()))
+        return {
+            "整体": report["overall_info"],
+            "整体问题归因": report["summary_all"],
+            "按集配站": report["hub_overall"],
+            # 只有一种SLA时列名不加前缀
+            "按客户": compare_table({"": report}, "客户", "client_sla_summary"),
+        }
+
+    preview = {
+        "SLA对比（整体）": compare_overall(reports),
+        "SLA对比（按客户）": compare_table(reports, "客户", "client_sla_summary"),
+        "SLA对比（按集配站）": compare_table(reports, "集配站", "hub_sla_summary"),
+    }
+    for name, report in reports.items():
+        preview[f"{name} 整体问题归因"] = report["summary_all"]
+    return preview
+
+
+def export_result(name, export):
+    """export() (writes the report file) wrapped to give the "filename" / "output_file" of a result."""
+    def run_export():
+        output_file = export()
+        return {"filename": report_name(name, output_file), "output_file": output_file}
+    return run_export
+
+
+def analyze(norm_df, policy, sla_should_date=None, cut_off=None, cache=None,
+            detail_mode="sheets", detail_rows=DETAIL_MAX_ROWS, log=NO_LOG, run_info_sheet=False,
+            export=True, history=None):
+    """
+    Run one policy on a normalized frame (see normalize_frame).
+    detail_mode / detail_rows: how a long 明细 is exported (see sla_export.report_file).
+    log: RunLog of the run; run_info_sheet adds its stages as a 运行信息 sheet.
+    history: HistoryStore the evaluated orders are also saved to.
+    Returns {"preview", "export"} plus, with export=True, the report ("filename", "output_file");
+    with export=False the report is only written when result["export"]() is called.
+    """
+    if cache is None:
+        cache = StageCache()
+    df, fail_df, report = run_policy(norm_df, policy, sla_should_date, cut_off, cache, log, history)
+
+    def write():
+        return cache.get(
+            (policy.name, "export"),
+            # 带运行信息的报告每次都不同，不复用上次的文件
+            (policy, sla_should_date, cut_off, detail_mode, detail_rows, run_info_sheet and log.run_id),
+            lambda: report_file(
+                write_report, fail_df, report,
+                name=OUTPUT_FILE, detail_mode=detail_mode, max_rows=detail_rows,
+                run_info=log.frame() if run_info_sheet else None
+            ),
+            log, STAGE_LABELS["export"]
+        )
+
+    result = {"preview": report_preview({policy.name: report}), "export": export_result(OUTPUT_FILE, write)}
+    if export:
+        result.update(result["export"]())
+    return result
+
+
+def paired_details(norm_df, runs):
+    """
+    明细 of the combined mode, one row per order failing under any policy:
+    - shared cols and step durations once
+    - each policy's own cols (SLA result, attribution ...) prefixed with its name,
+      empty when the order is outside that policy's SLA period
+    """
+    index = runs[0][2].index
+    for _, _, fail_df, _ in runs[1:]:
+        index = index.union(fail_df.index)
+
+    # step durations only depend on the milestones, reuse the ones of the failed orders
+    durations = pd.concat([fail_df[DURATION_COLS] for _, _, fail_df, _ in runs])
+    durations = durations[~durations.index.duplicated()].reindex(index)
+    detail = pd.concat([merge_sorting_time(norm_df.loc[index].copy()), durations], axis=1)
+
+    parts = [detail]
+    for policy, df, fail_df, _ in runs:
+        own_cols = [c for c in fail_df.columns if c not in detail.columns]
+        parts.append(pd.DataFrame({
+            f"{policy.name}_{col}": (df[col] if col in df.columns else fail_df[col]).reindex(index)
+            for col in own_cols
+        }, index=index))
+    return pd.concat(parts, axis=1)
+
+
+def analyze_combined(norm_df, policies, sla_should_date=None, cut_off=None, cache=None,
+                     detail_mode="sheets", detail_rows=DETAIL_MAX_ROWS, log=NO_LOG, run_info_sheet=False,
+                     export=True, history=None):
+    """Several policies on one normalized frame, in one workbook (options and result as in analyze)."""
+    if cache is None:
+        cache = StageCache()
+    runs = [
+        (policy,) + run_policy(norm_df, policy, sla_should_date, cut_off, cache, log, history)
+        for policy in policies
+    ]
+    reports = {policy.name: report for policy, _, _, report in runs}
+
+    def write_file():
+        detail = log.track("合并明细", lambda: paired_details(norm_df, runs))
+        return report_file(
+            write_combined_report, detail, reports,
+            name=COMBINED_OUTPUT_FILE, detail_mode=detail_mode, max_rows=detail_rows,
+            run_info=log.frame() if run_info_sheet else None
+        )
+
+    def write():
+        return cache.get(
+            ("combined", "export"),
+            (tuple(policies), sla_should_date, cut_off, detail_mode, detail_rows, run_info_sheet and log.run_id),
+            write_file,
+            log, STAGE_LABELS["export"]
+        )
+
+    result = {"preview": report_preview(reports), "export": export_result(COMBINED_OUTPUT_FILE, write)}
+    if export:
+        result.update(result["export"]())
+    return result
+
+
+def with_bytes(result):
+    # run_analysis callers get the workbook as bytes
+    return {
+        "filename": result["filename"],
+        "output_bytes": result["output_file"].read_bytes()
+    }
+
+
+def printed_rates(norm_df, policies, sla_should_date, cut_off):
+    # 只有交互调用才打印各客户不达率；分析本身复用这里算好的阶段
+    cache = StageCache()
+    for policy in policies:
+        _, _, report = run_policy(norm_df, policy, sla_should_date, cut_off, cache)
+        print_client_rates(report["client_sla_summary"], policy)
+    return cache
+
+
+def run_analysis(df, policy, sla_should_date=None, cut_off=None, zone_index=None):
+    norm_df = normalize_frame(df, zone_index)
+    cache = printed_rates(norm_df, [policy], sla_should_date, cut_off)
+    return with_bytes(analyze(norm_df, policy, sla_should_date, cut_off, cache))
+
+
+def run_combined_analysis(df, policies, sla_should_date=None, cut_off=None, zone_index=None):
+    norm_df = normalize_frame(df, zone_index)
+    cache = printed_rates(norm_df, policies, sla_should_date, cut_off)
+    return with_bytes(analyze_combined(norm_df, policies, sla_should_date, cut_off, cache))
@@ -0,0 +1,50 @@
+import pandas as pd
+import numpy as np
+
+NS_PER_HOUR = 3600 * 10**9
+NAT = np.iinfo(np.int64).min
+
+# (col, end milestone, start milestone) of the time consumed in each step
+STAGE_DURATIONS = [
+    ("耗时_关配→分拨入库", "首分拨首次入库时间", "关配交接时间"),
+    ("耗时_分拨入库→分拨出库", "首分拨首次出库时间", "首分拨首次入库时间"),
+    ("耗时_分拨出库→配送站入库", "配送站首次入库时间", "首分拨首次出库时间"),
+    ("耗时_分拨出库→异常登记", "末端异常提报时间", "首分拨首次出库时间"),
+    ("耗时_配送站入库→司机领件", "司机首次领件时间", "配送站首次入库时间"),
+    ("耗时_司机领件→首次派送", "首次派送时间", "司机首次领件时间"),
+    ("耗时_司机领件→签收成功", "签收成功时间", "司机首次领件时间"),
+]
+DURATION_COLS = [name for name, _, _ in STAGE_DURATIONS]
+
+
+def milestone_ns(df, col):
+    return df[col].to_numpy(dtype="datetime64[ns]").view("i8")
+
+
+def stage_duration_matrix(df, stages=STAGE_DURATIONS):
+    """
+    Hours consumed in each step for the rows of df, as one float32 matrix (rows x steps):
+    - int64 nanosecond differences, each milestone col converted once
+    - NaT on either side -> NaN
+    """
+    milestones = {}
+    for _, end_col, start_col in stages:
+        for col in (end_col, start_col):
+            if col not in milestones:
+                milestones[col] = milestone_ns(df, col)
+
+    matrix = np.empty((len(df), len(stages)), dtype=np.float32, order="F")
+    for j, (_, end_col, start_col) in enumerate(stages):
+        end, start = milestones[end_col], milestones[start_col]
+        matrix[:, j] = (end - start) / NS_PER_HOUR
+        matrix[(end == NAT) | (start == NAT), j] = np.nan
+    return matrix
+
+
+def stage_durations(df, stages=STAGE_DURATIONS):
+    """The duration matrix as 耗时_* cols on df's index (no copy of the matrix)."""
+    return pd.DataFrame(
+        stage_duration_matrix(df, stages),
+        index=df.index,
+        columns=[name for name, _, _ in stages]
+    )
@@ -0,0 +1,71 @@
+import pandas as pd
+import numpy as np
+
+US_PER_SECOND = 10**6
+US_PER_DAY = 86400 * US_PER_SECOND
+END_OF_DAY = pd.Timedelta(hours=23, minutes=59, seconds=59)
+
+
+def hours_between(end_time, start_time):
+    """
+    Column version of (end_time - start_time).total_seconds() / 3600.
+    - works on datetime Series (or a scalar cut_off against a Series)
+    - truncates to microseconds like Timedelta.total_seconds()
+    - NaT -> NaN
+    """
+    delta = pd.Series(end_time - start_time)
+    if not pd.api.types.is_timedelta64_dtype(delta):
+        delta = pd.to_timedelta(delta, errors="coerce")
+    values = delta.to_numpy(dtype="timedelta64[ns]").view("i8")
+
+    days, rem = np.divmod(values // 1000, US_PER_DAY)
+    seconds, micro = np.divmod(rem, US_PER_SECOND)
+    hours = (days * 86400 + seconds + micro / US_PER_SECOND) / 3600
+
+    return pd.Series(np.where(delta.isna(), np.nan, hours), index=delta.index)
+
+
+def calc_due_time(start_time, sla_hours, end_of_day, cut_time=None):
+    """
+    SLA due time for every row:
+    - start_time + sla_hours
+    - end_of_day rows are pushed to 23:59:59 of that day
+    - with cut_time, end_of_day rows starting after cut_time get one more day
+    - missing start_time or sla_hours -> NaT
+    """
+    start_time = pd.to_datetime(start_time, errors="coerce")
+    sla_hours = pd.to_numeric(sla_hours, errors="coerce")
+    end_of_day = pd.Series(end_of_day, index=start_time.index).astype(bool)
+
+    due_time = start_time + pd.to_timedelta(sla_hours, unit="h")
+    due_time = due_time.mask(end_of_day, due_time.dt.normalize() + END_OF_DAY)
+
+    if cut_time is not None:
+        # Timestamp.time() keeps microseconds only
+        time_of_day = (start_time - start_time.dt.normalize()).dt.floor("us")
+        cut = pd.Timedelta(hours=cut_time.hour, minutes=cut_time.minute, seconds=cut_time.second)
+        after_cut = end_of_day & (time_of_day > cut)
+        due_time = due_time.mask(after_cut, due_time + pd.Timedelta(days=1))
+
+    return due_time.where(start_time.notna() & sla_hours.notna())
+
+
+def evaluate_sla(start_time, end_time, sla_hours, end_of_day, cut_time=None):
+    """
+    Evaluate SLA for all rows at once.
+    Returns the SLA标准小时 / SLA截止时间 / SLA实际小时 / SLA是否达标 columns.
+    """
+    start_time = pd.to_datetime(start_time, errors="coerce")
+    end_time = pd.to_datetime(end_time, errors="coerce")
+    due_time = calc_due_time(start_time, sla_hours, end_of_day, cut_time)
+
+    has_both = start_time.notna() & end_time.notna()
+    duration_hours = hours_between(end_time, start_time).where(has_both)
+    is_ok = has_both & (end_time <= due_time)
+
+    return pd.DataFrame({
+        "SLA标准小时": sla_hours,
+        "SLA截止时间": due_time,
+        "SLA实际小时": duration_hours,
+        "SLA是否达标": is_ok
+    }, index=start_time.index)
@@ -0,0 +1,585 @@
+import os
+import re
+import shutil
+import tempfile
+import weakref
+import zipfile
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+OUTPUT_FILE = "SLA_分析完成.xlsx"
+COMBINED_OUTPUT_FILE = "SLA_分析完成_中台+客户.xlsx"
+TREND_OUTPUT_FILE = "SLA_趋势.xlsx"
+RUN_INFO_SHEET = "运行信息"
+
+# 明细 export: an Excel sheet holds EXCEL_MAX_ROWS rows including the header
+EXCEL_MAX_ROWS = 1048576
+DETAIL_MAX_ROWS = EXCEL_MAX_ROWS - 1
+DETAIL_MODES = ["sheets", "parquet", "csv"]
+SIDECAR_MODES = ["parquet", "csv"]
+
+# Same look as pandas to_excel
+HEADER_FORMAT = {"bold": True, "border": 1, "align": "center", "valign": "top"}
+DATETIME_FORMAT = "yyyy-mm-dd hh:mm:ss"
+
+# Rows converted to python values at a time
+CHUNK_ROWS = 20000
+
+EXCEL_EPOCH = np.datetime64("1899-12-31", "ns")
+NS_PER_SECOND = 10**9
+NS_PER_DAY = 86400 * NS_PER_SECOND
+
+
+class ReportFile:
+    """Finished report in a temp file, removed once the object is gone."""
+
+    def __init__(self, suffix=".xlsx"):
+        self.suffix = suffix
+        fd, self.path = tempfile.mkstemp(prefix="sla_report_", suffix=suffix)
+        os.close(fd)
+        weakref.finalize(self, remove_file, self.path)
+
+    def open(self):
+        return open(self.path, "rb")
+
+    def read_bytes(self):
+        with self.open() as f:
+            return f.read()
+
+    def move_to(self, path):
+        """
+        Keep the report at path (it is no longer removed with the object), with
+        the mode of a newly created file: mkstemp leaves it readable by the owner only.
+        """
+        shutil.move(self.path, path)
+        # 只能通过设置来读取 umask
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(path, 0o666 & ~umask)
+        self.path = path
+        return path
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def report_file(write, detail, *args, name=OUTPUT_FILE, detail_mode="sheets", max_rows=DETAIL_MAX_ROWS,
+                run_info=None):
+    """
+    Run write(detail, *args, path, ...) into a new ReportFile:
+    - detail within max_rows, or detail_mode "sheets": one xlsx
+      (明细 split into 明细_1, 明细_2 ... when needed)
+    - otherwise ("parquet" / "csv"): zip of the xlsx without 明细 plus 明细.parquet / 明细.csv
+    - run_info: optional 运行信息 sheet (run_info.RunLog.frame())
+    """
+    if not 0 < max_rows <= DETAIL_MAX_ROWS:
+        raise ValueError(f"明细行数上限须在 1 ~ {DETAIL_MAX_ROWS}: {max_rows}")
+
+    if detail_mode == "sheets" or len(detail) <= max_rows:
+        report = ReportFile(".xlsx")
+        write(detail, *args, report.path, max_rows=max_rows, run_info=run_info)
+        return report
+
+    if detail_mode not in SIDECAR_MODES:
+        raise ValueError(f"不支持的明细导出方式: {detail_mode}")
+
+    report = ReportFile(".zip")
+    with tempfile.TemporaryDirectory() as folder:
+        workbook_path = os.path.join(folder, name)
+        write(detail, *args, workbook_path, max_rows=max_rows, include_detail=False, run_info=run_info)
+        sidecar_files = write_sidecar(detail, folder, detail_mode)
+
+        with zipfile.ZipFile(report.path, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.write(workbook_path, arcname=name)
+            for path, arcname in sidecar_files:
+                zf.write(path, arcname=arcname)
+    return report
+
+
+def report_name(name, report):
+    """Download name of a report file, e.g. SLA_分析完成.zip for a zipped report."""
+    return os.path.splitext(name)[0] + report.suffix
+
+
+def detail_parts(detail):
+    """A detail frame, or anything with parts() (e.g. sla_chunked.DetailSpill), as frames."""
+    return detail.parts() if hasattr(detail, "parts") else [detail]
+
+
+def parquet_frame(df):
+    # parquet 一列只能有一种类型，混合类型的文本列转成字符串
+    columns = {}
+    for col in df.columns:
+        values = df[col]
+        if values.dtype == object and pd.api.types.infer_dtype(values, skipna=True) in ("mixed", "mixed-integer"):
+            values = values.map(lambda v: v if pd.isna(v) else str(v))
+        columns[col] = values
+    return pd.DataFrame(columns, index=df.index)
+
+
+def write_sidecar(detail, folder, detail_mode):
+    """明细 as csv / parquet files in folder, returns [(path, name in zip)]."""
+    if detail_mode == "csv":
+        path = os.path.join(folder, "明细.csv")
+        for i, part in enumerate(detail_parts(detail)):
+            # utf-8-sig: Excel 打开中文不乱码（BOM 只写一次）
+            part.to_csv(
+                path,
+                index=False,
+                mode="w" if i == 0 else "a",
+                header=i == 0,
+                encoding="utf-8-sig" if i == 0 else "utf-8"
+            )
+        return [(path, "明细.csv")]
+
+    files = []
+    for i, part in enumerate(detail_parts(detail), start=1):
+        path = os.path.join(folder, f"明细_{i:05d}.parquet")
+        parquet_frame(part).to_parquet(path, index=False)
+        files.append(path)
+    if len(files) == 1:
+        return [(files[0], "明细.parquet")]
+    # 分块结果：明细/ 目录下多个 parquet 文件，可整体读取
+    return [(path, f"明细/part-{i:05d}.parquet") for i, path in enumerate(files, start=1)]
+
+
+def write_detail(book, detail, formats, max_rows=DETAIL_MAX_ROWS, include_detail=True):
+    """
+    明细 sheet, or 明细_1, 明细_2 ... of at most max_rows rows each when detail is longer
+    (Excel sheets hold EXCEL_MAX_ROWS rows including the header). Returns the sheets.
+    """
+    if not include_detail:
+        return []
+    single = len(detail) <= max_rows
+
+    sheets = []
+    ws, rows = None, 0
+    for part in detail_parts(detail):
+        start = 0
+        while start < len(part) or ws is None:
+            if ws is None or rows == max_rows:
+                ws = sheet(book, "明细" if single else f"明细_{len(sheets) + 1}")
+                sheets.append(ws)
+                rows = 0
+                write_frame(ws, part.iloc[:0], 0, formats)
+            piece = part.iloc[start:start + max_rows - rows]
+            write_frame(ws, piece, rows, formats, header=False)
+            rows += len(piece)
+            start += len(piece)
+    return sheets
+
+
+@contextmanager
+def open_workbook(output):
+    """
+    xlsxwriter workbook in constant_memory mode:
+    - every sheet must be written top down (see write_frame)
+    - rows are flushed to disk as soon as the next row starts
+    """
+    book = xlsxwriter.Workbook(output, {"constant_memory": True})
+    formats = {
+        "header": book.add_format(HEADER_FORMAT),
+        "datetime": book.add_format({"num_format": DATETIME_FORMAT}),
+        "percent": book.add_format({"num_format": "0.00%"}),
+    }
+    try:
+        yield book, formats
+    finally:
+        book.close()
+
+
+def sheet(book, name):
+    return book.get_worksheet_by_name(name) or book.add_worksheet(name)
+
+
+def excel_serial(values):
+    """datetime64 -> Excel serial date numbers (same arithmetic as xlsxwriter), NaT -> NaN."""
+    values = values.to_numpy(dtype="datetime64[ns]")
+    delta = (values - EXCEL_EPOCH).astype(np.int64)
+    days = delta // NS_PER_DAY
+    rest = delta % NS_PER_DAY
+    seconds = rest // NS_PER_SECOND
+    micros = rest % NS_PER_SECOND // 1000
+    serial = days + (seconds + micros / 1e6) / 86400
+    # Excel treats 1900 as a leap year
+    serial = np.where(serial > 59, serial + 1, serial)
+    return np.where(np.isnat(values), np.nan, serial)
+
+
+def numbers_or_none(values):
+    return [None if v != v else v for v in pd.Series(values).tolist()]
+
+
+def python_value(value):
+    """Cell value as pandas to_excel would write it; None = empty cell."""
+    if value is None or value is pd.NA or value is pd.NaT:
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        if np.isnan(value):
+            return None
+        return float(value) if np.isfinite(value) else str(value)
+    if isinstance(value, datetime):
+        return value
+    value = str(value)
+    return value if value else None
+
+
+def column_writer(ws, col, formats):
+    """(write method, python values, format) of one column chunk."""
+    dtype = col.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        pass
+    elif pd.api.types.is_datetime64_dtype(dtype):
+        return ws.write_number, numbers_or_none(excel_serial(col)), formats["datetime"]
+    elif pd.api.types.is_bool_dtype(dtype) and not col.hasnans:
+        return ws.write_boolean, col.tolist(), None
+    elif pd.api.types.is_numeric_dtype(dtype):
+        values = col.to_numpy(dtype=float, na_value=np.nan)
+        if not np.isinf(values).any():
+            return ws.write_number, numbers_or_none(values) if col.hasnans else col.tolist(), None
+
+    def write_any(row, col, value, fmt):
+        ws.write(row, col, value, formats["datetime"] if isinstance(value, datetime) else None)
+
+    return write_any, [python_value(v) for v in col.astype(object).tolist()], None
+
+
+def write_frame(ws, df, startrow, formats, header=True, col_formats=None):
+    """
+    Header (at startrow) + rows of df (from startrow + 1), top down and row by row
+    (works in constant_memory mode):
+    - datetime cols as Excel dates with DATETIME_FORMAT
+    - numbers / bools typed, NaN / NaT / empty -> no cell
+    - col_formats: {col name: format} for number cols (e.g. formats["percent"])
+    """
+    col_formats = col_formats or {}
+    if header:
+        for col, name in enumerate(df.columns):
+            ws.write(startrow, col, str(name), formats["header"])
+
+    for start in range(0, len(df), CHUNK_ROWS):
+        chunk = df.iloc[start:start + CHUNK_ROWS]
+        writers = [column_writer(ws, chunk.iloc[:, i], formats) for i in range(chunk.shape[1])]
+        writers = [
+            (write, values, col_formats.get(name, fmt))
+            for name, (write, values, fmt) in zip(df.columns, writers)
+        ]
+        first_row = startrow + 1 + start
+        for offset in range(len(chunk)):
+            row = first_row + offset
+            for col, (write, values, fmt) in enumerate(writers):
+                value = values[offset]
+                if value is not None:
+                    write(row, col, value, fmt)
+
+
+def make_excel_sheet_name(raw_name, used_names: set, max_len: int = 31) -> str:
+    """
+    Excel sheet name rules:
+    - length <= 31
+    - cannot contain: : \ / ? * [ ]
+    - cannot be empty
+    - must be unique within workbook
+    """
+    name = "" if raw_name is None else str(raw_name)
+
+    # 把 nan 这种也兜住
+    if name.strip().lower() in {"", "nan", "none"}:
+        name = "未知客户"
+
+    # 替换非法字符
+    name = re.sub(r"[:\\/?*\[\]]", "_", name).strip()
+
+    # Excel 也不喜欢最后是单引号
+    name = name.strip("'").strip()
+    if not name:
+        name = "未知客户"
+
+    base = name[:max_len]
+
+    # 去重：如果已存在，就加 _2/_3...
+    candidate = base
+    i = 2
+    while candidate in used_names:
+        suffix = f"_{i}"
+        candidate = base[: max_len - len(suffix)] + suffix
+        i += 1
+
+    used_names.add(candidate)
+    return candidate
+
+
+def write_report(fail_df, report, output, max_rows=DETAIL_MAX_ROWS, include_detail=True, run_info=None):
+    """
+    Excel report of one analysis run:
+    - 明细: failed orders with durations and attribution (see write_detail)
+    - 整体问题归因统计, one sheet per client, one sheet per hub
+    - 运行信息 when run_info is given
+    """
+    overall_info = report["overall_info"]
+    summary_all = report["summary_all"]
+    client_details = report["client_details"]
+    client_sla_summary = report["client_sla_summary"]
+    hub_details = report["hub_details"]
+    hub_overall = report["hub_overall"]
+    hub_sla_summary = report["hub_sla_summary"]
+    hub_sta_summary = report["hub_sta_summary"]
+    clients = report["clients"]
+    hubs = report["hubs"]
+
+    with open_workbook(output) as (book, formats):
+        # 明细表
+        for ws in write_detail(book, fail_df, formats, max_rows, include_detail):
+            ws.set_column(0, len(fail_df.columns)-1, 18)
+            ws.set_column("AJ:AJ", 35)
+        
+        # 整体问题归因统计表
+        write_frame(sheet(book, "整体问题归因统计"), overall_info, 0, formats)
+        start_row = len(overall_info) + 2
+        write_frame(sheet(book, "整体问题归因统计"), summary_all, start_row, formats)
+        start_row = start_row + len(summary_all) + 2
+        write_frame(sheet(book, "整体问题归因统计"), hub_overall, start_row, formats)
+    
+        ws = book.get_worksheet_by_name("整体问题归因统计")
+        ws.set_column(0, max(summary_all.shape[1], overall_info.shape[1]) - 1, 18)
+        ws.set_column("A:A", 35)
+    
+        # By客户问题归因表
+        used_sheet_names = set(book.sheetnames)
+        
+        for client in clients:
+            sub = client_details.get(client)
+    
+            # No Fail Order
+            if sub is None:
+                sla_info = client_sla_summary.get(client, None)
+                info_rows = [
+                    ["客户", client],
+                    ["总单量", sla_info["total"] if sla_info else 0],
+                    ["未达标单量", 0],
+                    ["未达标率", "0.00%"],
+                    ["目标达成率", f"{sla_info['target']*100:.0f}%" if sla_info and not np.isnan(sla_info["target"]) else "未配置"],
+                    ["是否达标", "达标 ✔" if sla_info and sla_info["meet_target"] else "未达标 ❌"]
+                ]
+                
+                sheet_name = make_excel_sheet_name(client, used_sheet_names)
+                
+                info_df = pd.DataFrame(info_rows, columns=["指标", "值"])
+                write_frame(sheet(book, sheet_name), info_df, 0, formats)
+                ws = book.get_worksheet_by_name(sheet_name)
+                ws.set_column(0, info_df.shape[1]-1, 18)
+                continue
+    
+            # Have Fail Order
+            sla_info = client_sla_summary[client]
+    
+            info_rows = [
+                ["客户", client],
+                ["总单量", sla_info["total"]],
+                ["未达标单量", sla_info["fail"]],
+                ["未达标率", f"{sla_info['fail_rate']*100:.2f}%"],
+                ["目标达成率", f"{sla_info['target']*100:.0f}%"],
+                ["是否达标", "达标 ✔" if sla_info["meet_target"] else "未达标 ❌"]
+            ]
+            info_df = pd.DataFrame(info_rows, columns=["指标", "值"])
+    
+            sheet_name = make_excel_sheet_name(client, used_sheet_names)
+            
+            write_frame(sheet(book, sheet_name), info_df, 0, formats)
+            start_row = len(info_df) + 2   # 空一行
+            write_frame(sheet(book, sheet_name), sub, start_row, formats)
+    
+            ws = book.get_worksheet_by_name(sheet_name)
+            ws.set_column(0, max(info_df.shape[1], sub.shape[1]) - 1, 18)
+            ws.set_column("A:A", 35)
+    
+        # By hub问题归因表
+        for hub in hubs:
+            sub = hub_details.get(hub)
+    
+            # No Fail Order
+            if sub is None:
+                sla_info = hub_sla_summary.get(hub, None)
+                info_rows = [
+                    ["集配站", hub],
+                    ["总单量", sla_info["total"] if sla_info else 0],
+                    ["未达标单量", 0],
+                    ["未达标率", "0.00%"]
+                ]
+                info_df = pd.DataFrame(info_rows, columns=["指标", "值"])
+                write_frame(sheet(book, hub), info_df, 0, formats)
+                ws = book.get_worksheet_by_name(hub)
+                ws.set_column(0, info_df.shape[1] - 1, 18)
+                continue
+    
+            # Have Fail Order
+            sla_info = hub_sla_summary[hub]
+    
+            info_rows = [
+                ["集配站", hub],
+                ["总单量", sla_info["total"]],
+                ["未达标单量", sla_info["fail"]],
+                ["未达标率", f"{sla_info['fail_rate']*100:.2f}%"],
+            ]
+            info_df = pd.DataFrame(info_rows, columns=["指标", "值"])
+    
+            sheet_name = hub
+            write_frame(sheet(book, sheet_name), info_df, 0, formats)
+            start_row = len(info_df) + 2   # 空一行
+            write_frame(sheet(book, sheet_name), sub, start_row, formats)
+            start_row = start_row + len(sub) + 2
+            write_frame(sheet(book, sheet_name), hub_sta_summary[hub], start_row, formats)
+    
+            ws = book.get_worksheet_by_name(sheet_name)
+            ws.set_column(0, max(info_df.shape[1], sub.shape[1]), 18)
+            ws.set_column("A:A", 35)
+
+        write_run_info(book, run_info, formats)
+
+
+def write_run_info(book, run_info, formats):
+    """运行信息 sheet: time / rows / peak memory of each stage before the Excel write."""
+    if run_info is None:
+        return
+    ws = sheet(book, RUN_INFO_SHEET)
+    write_frame(ws, run_info, 0, formats)
+    ws.set_column(0, run_info.shape[1] - 1, 14)
+    ws.set_column("A:A", 30)
+
+
+def write_trend_report(trends, output):
+    """
+    Trend workbook, one <policy>趋势 sheet per policy (see sla_trend.trend_tables):
+    overall trend with a 未达标率 line chart, 未达标率 by client and by hub, failed orders by reason.
+    """
+    with open_workbook(output) as (book, formats):
+        for name, tables in trends.items():
+            sheet_name = f"{name}趋势"
+            ws = sheet(book, sheet_name)
+            percent = formats["percent"]
+            blocks = [
+                ("整体趋势", tables["overall"], {"未达标率": percent}),
+                ("按客户未达标率", tables["by_client"], {c: percent for c in tables["by_client"].columns[1:]}),
+                ("按集配站未达标率", tables["by_hub"], {c: percent for c in tables["by_hub"].columns[1:]}),
+                ("问题归因单量", tables["reasons"], {}),
+            ]
+            start_row = 0
+            positions = {}
+            for title, block, col_formats in blocks:
+                ws.write(start_row, 0, title, formats["header"])
+                write_frame(ws, block, start_row + 1, formats, col_formats=col_formats)
+                positions[title] = (start_row + 1, len(block))
+                start_row = start_row + len(block) + 3
+            ws.set_column(0, max(b.shape[1] for _, b, _ in blocks) - 1, 14)
+            ws.set_column("A:A", 16)
+
+            buckets = len(tables["overall"])
+            if buckets:
+                header_row, _ = positions["整体趋势"]
+                chart = book.add_chart({"type": "line"})
+                chart.add_series({
+                    "name": f"{name} 未达标率",
+                    "categories": [sheet_name, header_row + 1, 0, header_row + buckets, 0],
+                    "values": [sheet_name, header_row + 1, 3, header_row + buckets, 3],
+                    "marker": {"type": "circle"},
+                })
+                header_row, _ = positions["按集配站未达标率"]
+                for col, hub in enumerate(tables["by_hub"].columns[1:], start=1):
+                    chart.add_series({
+                        "name": str(hub),
+                        "categories": [sheet_name, header_row + 1, 0, header_row + buckets, 0],
+                        "values": [sheet_name, header_row + 1, col, header_row + buckets, col],
+                    })
+                chart.set_title({"name": f"{name} 未达标率趋势"})
+                chart.set_y_axis({"num_format": "0%"})
+                chart.set_size({"width": 720, "height": 360})
+                ws.insert_chart(0, max(b.shape[1] for _, b, _ in blocks) + 1, chart)
+
+
+def compare_overall(reports):
+    """整体 指标 of every policy side by side."""
+    return pd.concat([
+        report["overall_info"].set_index("指标")["值"].rename(name)
+        for name, report in reports.items()
+    ], axis=1).rename_axis("指标").reset_index()
+
+
+def compare_table(reports, key, summary_key):
+    """Per client / hub counts of every policy side by side (empty = no order in that policy's period)."""
+    parts = []
+    for name, report in reports.items():
+        summary = report[summary_key]
+        has_target = any("target" in v and not np.isnan(v["target"]) for v in summary.values())
+        rows = {}
+        for k, v in summary.items():
+            row = {
+                f"{name}总单量": v["total"],
+                f"{name}未达标单量": v["fail"],
+                f"{name}未达标率": f"{v['fail_rate']*100:.2f}%",
+            }
+            if has_target:
+                row[f"{name}目标达成率"] = f"{v['target']*100:.0f}%" if not np.isnan(v["target"]) else "未配置"
+                row[f"{name}是否达标"] = "达标 ✔" if v["meet_target"] else "未达标 ❌"
+            rows[k] = row
+        parts.append(pd.DataFrame.from_dict(rows, orient="index"))
+
+    table = pd.concat(parts, axis=1)
+    return table.rename_axis(key).sort_index().reset_index()
+
+
+def write_combined_report(detail, reports, output, max_rows=DETAIL_MAX_ROWS, include_detail=True, run_info=None):
+    """
+    Excel report of several policies on the same orders:
+    - 明细: paired cols per policy (see sla_core.paired_details)
+    - SLA对比: overall / by client / by hub side by side
+    - <policy>问题归因: overall, by hub and by client attribution of each policy
+    - 运行信息 when run_info is given
+    """
+    with open_workbook(output) as (book, formats):
+        # 明细表
+        for ws in write_detail(book, detail, formats, max_rows, include_detail):
+            ws.set_column(0, len(detail.columns) - 1, 18)
+
+        # 对比表
+        tables = [
+            compare_overall(reports),
+            compare_table(reports, "客户", "client_sla_summary"),
+            compare_table(reports, "集配站", "hub_sla_summary"),
+        ]
+        start_row = 0
+        for table in tables:
+            write_frame(sheet(book, "SLA对比"), table, start_row, formats)
+            start_row = start_row + len(table) + 2
+        ws = book.get_worksheet_by_name("SLA对比")
+        ws.set_column(0, max(t.shape[1] for t in tables) - 1, 18)
+
+        # 各SLA问题归因表
+        for name, report in reports.items():
+            sheet_name = f"{name}问题归因"
+            blocks = [
+                report["overall_info"],
+                report["summary_all"],
+                report["hub_overall"],
+                report["summary_by_client"],
+            ]
+            start_row = 0
+            for block in blocks:
+                write_frame(sheet(book, sheet_name), block, start_row, formats)
+                start_row = start_row + len(block) + 2
+            ws = book.get_worksheet_by_name(sheet_name)
+            ws.set_column(0, max(b.shape[1] for b in blocks) - 1, 18)
+            ws.set_column("A:A", 35)
+
+        write_run_info(book, run_info, formats)
@@ -0,0 +1,201 @@
+import pandas as pd
+import numpy as np
+from functools import lru_cache
+from itertools import product
+
+ZONES = ["Zone1", "Zone2", "Zone3", "Zone4", "Zone5"]
+OTHER_ZONE = "其他"
+NON_CA_HUBS = ["HUB_LAX_LAS", "HUB_LAX_PHX"]
+
+SLA_TIME_COLS = [
+    "关配交接时间",
+    "SLA关配交接时间",
+    "首分拨首次入库时间",
+    "首次派送时间",
+    "签收成功时间"
+]
+RULE_FIELDS = ["start_col", "end_col", "hours", "days", "target_rate", "mode", "end_of_day"]
+
+# Rule table keys
+ZONE_RULE_KEYS = ["Zone"]
+CLIENT_RULE_KEYS = ["客户", "Zone", "CA"]
+
+# Zone SLA requirements (中台SLA)
+# start_col: the earliest available time of the listed cols
+ZONE_SLA_RULES = [
+    {"zone": "Zone1", "start_col": ["关配交接时间", "首分拨首次入库时间"], "end_col": "首次派送时间",
+     "hours": 48, "days": 2, "target_rate": 0.95, "mode": "broad", "end_of_day": True},
+    {"zone": "Zone2", "start_col": ["关配交接时间", "首分拨首次入库时间"], "end_col": "首次派送时间",
+     "hours": 48, "days": 2, "target_rate": 0.95, "mode": "broad", "end_of_day": True},
+    {"zone": "Zone3", "start_col": ["关配交接时间", "首分拨首次入库时间"], "end_col": "首次派送时间",
+     "hours": 72, "days": 3, "target_rate": 0.95, "mode": "broad", "end_of_day": True},
+    {"zone": "Zone4", "start_col": ["关配交接时间", "首分拨首次入库时间"], "end_col": "首次派送时间",
+     "hours": 96, "days": 4, "target_rate": 0.95, "mode": "broad", "end_of_day": True},
+]
+
+# Client side SLA requirements (客户SLA)
+# Rules are matched top down, first match wins:
+# - "ca": True for CA orders, False for HUB_LAX_LAS / HUB_LAX_PHX, missing = any
+# - "zones": list of zones, missing = any zone (unknown zone included)
+# - "end_of_day": due time is pushed to 23:59:59 of the due day
+# - mode: broad 广义妥投 / narrow 狭义妥投
+# CKY / EZG Zone5 use their 192h / 8d tier; before the rule table Zone5 fell
+# through to the Zone3/4 tier (see README, tests/test_sla_rules.py)
+CLIENT_SLA_RULES = [
+    {"client": "AE", "ca": True, "start_col": ["SLA关配交接时间"], "end_col": "首次派送时间",
+     "hours": 48, "days": 2, "target_rate": 0.95, "mode": "broad", "end_of_day": True},
+    {"client": "AE", "ca": False, "start_col": ["SLA关配交接时间"], "end_col": "首次派送时间",
+     "hours": 96, "days": 4, "target_rate": 0.95, "mode": "broad", "end_of_day": True},
+    {"client": "CBO", "ca": True, "start_col": ["首分拨首次入库时间"], "end_col": "首次派送时间",
+     "hours": 72, "days": 3, "target_rate": 0.95, "mode": "broad", "end_of_day": False},
+    {"client": "CBO", "ca": False, "start_col": ["首分拨首次入库时间"], "end_col": "首次派送时间",
+     "hours": 96, "days": 4, "target_rate": 0.95, "mode": "broad", "end_of_day": False},
+    {"client": "FBT", "start_col": ["首分拨首次入库时间"], "end_col": "签收成功时间",
+     "hours": 48, "days": 2, "target_rate": 0.95, "mode": "narrow", "end_of_day": True},
+    {"client": "CBT", "start_col": ["首分拨首次入库时间"], "end_col": "首次派送时间",
+     "hours": 72, "days": 3, "target_rate": 0.95, "mode": "narrow", "end_of_day": True},
+    {"client": "SKA2", "start_col": ["SLA关配交接时间"], "end_col": "签收成功时间",
+     "hours": 120, "days": 5, "target_rate": 0.98, "mode": "narrow", "end_of_day": False},
+    {"client": "TE", "zones": ["Zone1", "Zone2"], "start_col": ["首分拨首次入库时间"], "end_col": "签收成功时间",
+     "hours": 72, "days": 3, "target_rate": 0.95, "mode": "narrow", "end_of_day": False},
+    {"client": "TE", "start_col": ["首分拨首次入库时间"], "end_col": "签收成功时间",
+     "hours": 120, "days": 5, "target_rate": 0.95, "mode": "narrow", "end_of_day": False},
+    {"client": "YW", "start_col": ["首分拨首次入库时间"], "end_col": "签收成功时间",
+     "hours": 84, "days": 3, "target_rate": 0.95, "mode": "narrow", "end_of_day": False},
+    {"client": "HTE", "ca": True, "start_col": ["首分拨首次入库时间"], "end_col": "首次派送时间",
+     "hours": 72, "days": 3, "target_rate": 0.95, "mode": "broad", "end_of_day": True},
+    {"client": "HTE", "ca": False, "start_col": ["首分拨首次入库时间"], "end_col": "首次派送时间",
+     "hours": 120, "days": 5, "target_rate": 0.95, "mode": "broad", "end_of_day": True},
+    {"client": "WH", "start_col": ["首分拨首次入库时间"], "end_col": "签收成功时间",
+     "hours": 120, "days": 5, "target_rate": 0.96, "mode": "narrow", "end_of_day": False},
+    {"client": "WHUS", "start_col": ["首分拨首次入库时间"], "end_col": "签收成功时间",
+     "hours": 120, "days": 5, "target_rate": 0.96, "mode": "narrow", "end_of_day": True},
+    {"client": "WHUS-4PX", "start_col": ["首分拨首次入库时间"], "end_col": "签收成功时间",
+     "hours": 120, "days": 5, "target_rate": 0.96, "mode": "narrow", "end_of_day": True},
+    {"client": "CKY", "zones": ["Zone1", "Zone2"], "start_col": ["首分拨首次入库时间"], "end_col": "签收成功时间",
+     "hours": 72, "days": 3, "target_rate": 0.95, "mode": "narrow", "end_of_day": True},
+    {"client": "CKY", "zones": ["Zone5"], "start_col": ["首分拨首次入库时间"], "end_col": "签收成功时间",
+     "hours": 192, "days": 8, "target_rate": 0.95, "mode": "narrow", "end_of_day": True},
+    {"client": "CKY", "start_col": ["首分拨首次入库时间"], "end_col": "签收成功时间",
+     "hours": 96, "days": 4, "target_rate": 0.95, "mode": "narrow", "end_of_day": True},
+    {"client": "EZG", "zones": ["Zone1", "Zone2"], "start_col": ["首分拨首次入库时间"], "end_col": "签收成功时间",
+     "hours": 120, "days": 5, "target_rate": 0.90, "mode": "narrow", "end_of_day": False},
+    {"client": "EZG", "zones": ["Zone5"], "start_col": ["首分拨首次入库时间"], "end_col": "签收成功时间",
+     "hours": 192, "days": 8, "target_rate": 0.90, "mode": "narrow", "end_of_day": False},
+    {"client": "EZG", "start_col": ["首分拨首次入库时间"], "end_col": "签收成功时间",
+     "hours": 144, "days": 6, "target_rate": 0.90, "mode": "narrow", "end_of_day": False},
+]
+
+
+def validate_rule(rule):
+    missing = [f for f in RULE_FIELDS if f not in rule]
+    if missing:
+        raise ValueError(f"SLA规则缺少字段 {missing}: {rule}")
+
+    cols = list(rule["start_col"]) + [rule["end_col"]]
+    unknown = [c for c in cols if c not in SLA_TIME_COLS]
+    if unknown:
+        raise ValueError(f"SLA规则时间列不存在 {unknown}: {rule}")
+
+    if not (rule["hours"] > 0 and rule["days"] > 0):
+        raise ValueError(f"SLA规则时效必须大于0: {rule}")
+    if not 0 < rule["target_rate"] <= 1:
+        raise ValueError(f"SLA规则目标达成率须在(0, 1]: {rule}")
+    if rule["mode"] not in ("broad", "narrow"):
+        raise ValueError(f"SLA规则mode须为broad/narrow: {rule}")
+
+
+def rule_matches(rule, zone, ca):
+    return (
+        ("zones" not in rule or zone in rule["zones"])
+        and ("ca" not in rule or rule["ca"] == ca)
+    )
+
+
+def compile_rules(rules, keys):
+    """
+    Expand the declarative rules into one lookup row per key combination.
+    Rule ids follow the rule order.
+    """
+    for rule in rules:
+        validate_rule(rule)
+
+    rows = []
+    if keys == ZONE_RULE_KEYS:
+        for rule_id, rule in enumerate(rules):
+            rows.append([rule["zone"], rule_id])
+    else:
+        clients = list(dict.fromkeys(rule["client"] for rule in rules))
+        for client, zone, ca in product(clients, ZONES + [OTHER_ZONE], [True, False]):
+            candidates = [
+                rule_id for rule_id, rule in enumerate(rules)
+                if rule["client"] == client and rule_matches(rule, zone, ca)
+            ]
+            if not candidates:
+                raise ValueError(f"SLA规则未覆盖: 客户={client}, Zone={zone}, CA={ca}")
+            rows.append([client, zone, ca, candidates[0]])
+
+    lookup = pd.DataFrame(rows, columns=keys + ["rule_id"])
+    if lookup.duplicated(keys).any():
+        raise ValueError(f"SLA规则重复: {lookup[lookup.duplicated(keys)].to_dict('records')}")
+
+    fields = pd.DataFrame([{f: rule[f] for f in RULE_FIELDS} for rule in rules])
+    fields["start_col"] = fields["start_col"].map(tuple)
+    return lookup.join(fields, on="rule_id")
+
+
+@lru_cache(maxsize=None)
+def load_zone_rules():
+    return compile_rules(ZONE_SLA_RULES, ZONE_RULE_KEYS)
+
+
+@lru_cache(maxsize=None)
+def load_client_rules():
+    return compile_rules(CLIENT_SLA_RULES, CLIENT_RULE_KEYS)
+
+
+def sla_targets(rules, key):
+    """{key: {"target_rate", "mode"}} view of a compiled rule table (a new dict each call)."""
+    return (
+        rules
+        .drop_duplicates(key)
+        .set_index(key)[["target_rate", "mode"]]
+        .to_dict("index")
+    )
+
+
+def rule_keys(df, keys):
+    zone = df["收件人邮编集"]
+    key_df = pd.DataFrame({
+        "Zone": np.where(zone.isin(ZONES), zone.astype(object), OTHER_ZONE)
+    }, index=df.index)
+    if "客户" in keys:
+        key_df["客户"] = df["客户"].astype(object)
+    if "CA" in keys:
+        key_df["CA"] = ~df["集配站"].isin(NON_CA_HUBS)
+    return key_df[keys]
+
+
+def match_sla_rules(df, rules, keys):
+    """Join every row with its SLA rule in one merge; rows without a rule get NaN."""
+    matched = rule_keys(df, keys).merge(rules, on=keys, how="left")
+    matched.index = df.index
+    return matched
+
+
+def sla_start_end(df, matched):
+    """SLA start (earliest of the rule's start cols) and end time of every row."""
+    start_time = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+    end_time = pd.Series(pd.NaT, index=df.index, dtype="datetime64[ns]")
+
+    has_rule = matched["rule_id"].notna()
+    groups = matched[has_rule].groupby(["start_col", "end_col"], sort=False).groups
+    for (start_cols, end_col), idx in groups.items():
+        # col by col: min(axis=1) goes through float64 when a row has NaT and loses the ns
+        earliest = df.loc[idx, start_cols[0]]
+        for col in start_cols[1:]:
+            other = df.loc[idx, col]
+            earliest = earliest.mask(earliest.isna() | (other < earliest), other)
+        start_time[idx] = earliest
+        end_time[idx] = df.loc[idx, end_col]
+    return start_time, end_time
@@ -0,0 +1,404 @@
+"""
+Local HTTP service around the analysis, for other teams' tooling:
+
+    python sla_service.py --port 8600 --workers 2 --input-dir /data/exports
+
+- POST /jobs                 submit, returns the job (202; 200 when already done)
+    JSON body: {"files": [paths in the input folder], "sla": "中台", "window": ["start", "end"],
+                "cut_off": "2026-03-09 11:50", "detail_mode": "sheets"}
+    files are relative to --input-dir (default service_data/inputs), nothing outside it is read
+    or the export itself as the body: POST /jobs?filename=a.csv&sla=客户&window=2026-03-01~2026-03-07
+    (streamed to service_data/uploads, not held in memory)
+- GET  /jobs                 all jobs of this run
+- GET  /jobs/<id>            status: queued / running / done / failed, headline numbers when done
+- GET  /jobs/<id>/result     the report file
+
+Jobs wait in an asyncio queue and run in a bounded process pool. Results are
+kept on disk by job id (a hash of the file contents and parameters), so the
+same request is answered from disk, also after a restart.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import tempfile
+import time as timer
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime
+from urllib.parse import parse_qs, quote, urlsplit
+
+from sla_batch import CUT_OFF_TIME, SLA_TYPES, parse_time, parse_window
+from sla_core import analyze, analyze_combined, normalize_frame
+from sla_export import DETAIL_MODES
+from ingest import SUPPORTED_TYPES, file_type, read_uploads, upload_digest
+from zone_mapping import ZONE_FILE, file_signature
+
+SERVICE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "service_data")
+
+# Jobs waiting beyond this are refused (503) instead of queued
+MAX_QUEUED = 100
+# Uploads are streamed to disk, JSON bodies are read into memory
+MAX_UPLOAD_BYTES = 2 << 30
+MAX_JSON_BYTES = 1 << 20
+BLOCK_SIZE = 1 << 20
+
+MIME_TYPES = {
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".zip": "application/zip",
+}
+STATUS_TEXT = {200: "OK", 202: "Accepted", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+               405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error",
+               503: "Service Unavailable"}
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def run_job(files, sla, window, cut_off, detail_mode, result_base):
+    """In a worker process: analysis of one job, report moved to result_base + suffix."""
+    t0 = timer.perf_counter()
+    policies = SLA_TYPES[sla]
+    norm_df = normalize_frame(read_uploads(files, max_workers=1))
+    options = {"cut_off": cut_off, "detail_mode": detail_mode}
+    if len(policies) == 1:
+        result = analyze(norm_df, policies[0], window, **options)
+    else:
+        result = analyze_combined(norm_df, policies, window, **options)
+
+    path = result_base + result["output_file"].suffix
+    result["output_file"].move_to(path)
+    overall = next(iter(result["preview"].values()))
+    return {
+        "filename": result["filename"],
+        "result_path": path,
+        "rows": len(norm_df),
+        "duplicates": norm_df.attrs["duplicates"],
+        "overall": json.loads(overall.to_json(orient="records", force_ascii=False)),
+        "seconds": round(timer.perf_counter() - t0, 3),
+    }
+
+
+def text_param(params, name, default=None):
+    """A string parameter (query or JSON), default when missing or empty."""
+    value = params.get(name)
+    if value is None or value == "":
+        return default
+    if not isinstance(value, str):
+        raise RequestError(400, f"{name} 须为字符串: {value!r}")
+    return value
+
+
+def job_spec(params):
+    """Checked job parameters (files already local paths)."""
+    sla = text_param(params, "sla", "中台")
+    if sla not in SLA_TYPES:
+        raise RequestError(400, f"sla 须为 {' / '.join(SLA_TYPES)}: {sla}")
+    detail_mode = text_param(params, "detail_mode", "sheets")
+    if detail_mode not in DETAIL_MODES:
+        raise RequestError(400, f"detail_mode 须为 {' / '.join(DETAIL_MODES)}: {detail_mode}")
+    window = params.get("window")
+    if window and not isinstance(window, str) and not (
+        isinstance(window, list) and len(window) == 2 and all(isinstance(t, str) and t.strip() for t in window)
+    ):
+        raise RequestError(400, f'window 须为 "start~end" 或 ["start", "end"]: {window!r}')
+    cut_off = text_param(params, "cut_off")
+
+    try:
+        if isinstance(window, str):
+            window = parse_window(window)
+        elif window:
+            window = (parse_time(window[0]), parse_time(window[1], end=True))
+        cut_off = parse_time(cut_off) if cut_off else datetime.combine(date.today(), CUT_OFF_TIME)
+    except ValueError as e:
+        raise RequestError(400, f"时间格式错误: {e}")
+    return {"files": params["files"], "sla": sla, "window": window, "cut_off": cut_off, "detail_mode": detail_mode}
+
+
+def job_id(spec):
+    """Same files (by content), parameters and zone mapping -> same id, i.e. the same cached result."""
+    digest = hashlib.blake2b(digest_size=12)
+    digest.update(upload_digest(spec["files"]).encode())
+    for value in (spec["sla"], spec["window"], spec["cut_off"], spec["detail_mode"], file_signature(ZONE_FILE)):
+        digest.update(repr(value).encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+class AnalysisService:
+    """
+    Job queue of the service:
+    - jobs: id -> status dict (what GET /jobs/<id> returns)
+    - `workers` consumer tasks take ids off an asyncio queue and run them in
+      a process pool of the same size, so at most `workers` analyses at a time
+    - a finished job's status is written next to its report in results/
+    - JSON jobs only read files inside input_dir (default service_dir/inputs)
+    """
+
+    def __init__(self, workers=1, service_dir=SERVICE_DIR, input_dir=None):
+        self.workers = workers
+        self.results_dir = os.path.join(service_dir, "results")
+        self.upload_dir = os.path.join(service_dir, "uploads")
+        self.input_dir = os.path.realpath(input_dir or os.path.join(service_dir, "inputs"))
+        for folder in (self.results_dir, self.upload_dir, self.input_dir):
+            os.makedirs(folder, exist_ok=True)
+        self.jobs = {}
+        self.specs = {}
+        self.queue = None
+        self.pool = None
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=MAX_QUEUED)
+        # spawn: forked workers would inherit the listening socket and keep the port after a stop
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self.tasks = [asyncio.create_task(self.consume()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+    def meta_path(self, id_):
+        return os.path.join(self.results_dir, id_ + ".json")
+
+    def cached_job(self, id_):
+        # 重启前完成的任务：状态和报告都在磁盘上
+        try:
+            with open(self.meta_path(id_), encoding="utf-8") as f:
+                job = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return job if os.path.exists(job.get("result_path", "")) else None
+
+    async def submit(self, params):
+        loop = asyncio.get_running_loop()
+        spec = job_spec(params)
+        missing = [path for path in spec["files"] if not os.path.isfile(path)]
+        if not spec["files"] or missing:
+            raise RequestError(400, f"找不到输入文件: {', '.join(missing) or '未提供'}")
+        # 按文件内容算 id，大文件放到线程里算，不卡住其他请求
+        id_ = await loop.run_in_executor(None, job_id, spec)
+
+        job = self.jobs.get(id_)
+        if job and job["status"] != "failed":
+            return job
+        job = self.cached_job(id_)
+        if job:
+            job["cached"] = True
+            self.jobs[id_] = job
+            return job
+
+        if self.queue.full():
+            raise RequestError(503, f"排队任务已满（{MAX_QUEUED}），请稍后再提交")
+        job = self.jobs[id_] = {
+            "id": id_, "status": "queued", "sla": spec["sla"],
+            "window": [str(t) for t in spec["window"]] if spec["window"] else None,
+            "cut_off": str(spec["cut_off"]), "submitted_at": now_text(),
+        }
+        self.specs[id_] = spec
+        self.queue.put_nowait(id_)
+        return job
+
+    async def consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            id_ = await self.queue.get()
+            job, spec = self.jobs[id_], self.specs.pop(id_)
+            job.update(status="running", started_at=now_text())
+            try:
+                done = await loop.run_in_executor(
+                    self.pool, run_job, spec["files"], spec["sla"], spec["window"], spec["cut_off"],
+                    spec["detail_mode"], os.path.join(self.results_dir, id_)
+                )
+            except Exception as e:
+                job.update(status="failed", error=f"{type(e).__name__}: {e}", finished_at=now_text())
+            else:
+                job.update(done, status="done", finished_at=now_text(), result_url=f"/jobs/{id_}/result")
+                with open(self.meta_path(id_), "w", encoding="utf-8") as f:
+                    json.dump(job, f, ensure_ascii=False)
+            finally:
+                self.queue.task_done()
+
+    def job(self, id_):
+        job = self.jobs.get(id_) or self.cached_job(id_)
+        if job is None:
+            raise RequestError(404, f"没有这个任务: {id_}")
+        return job
+
+    def input_path(self, name):
+        """A JSON files entry as a path inside input_dir (relative ones are taken from there)."""
+        path = os.path.realpath(os.path.join(self.input_dir, name))
+        if os.path.commonpath([path, self.input_dir]) != self.input_dir:
+            raise RequestError(403, f"只能读取输入目录下的文件: {name}")
+        if file_type(path) not in SUPPORTED_TYPES:
+            raise RequestError(400, f"不支持的文件格式: {name}")
+        return path
+
+    async def save_upload(self, reader, name, length):
+        """Stream the request body to uploads/ block by block, named by its content hash."""
+        if length > MAX_UPLOAD_BYTES:
+            raise RequestError(413, f"文件超过 {MAX_UPLOAD_BYTES >> 20} MB")
+        if not length:
+            raise RequestError(400, "请求体为空：请上传导出文件，或用 JSON 给出 files")
+        kind = file_type(name)
+        if kind not in SUPPORTED_TYPES:
+            # 读完请求体再回复，否则客户端收到的是连接被重置
+            await discard(reader, length)
+            raise RequestError(400, f"不支持的文件格式: {name}")
+
+        digest = hashlib.blake2b(digest_size=16)
+        fd, part_path = tempfile.mkstemp(dir=self.upload_dir, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while length:
+                    block = await reader.readexactly(min(length, BLOCK_SIZE))
+                    digest.update(block)
+                    f.write(block)
+                    length -= len(block)
+            path = os.path.join(self.upload_dir, digest.hexdigest() + "." + kind)
+            os.replace(part_path, path)
+        except BaseException:
+            os.remove(part_path)
+            raise
+        return path
+
+    async def route(self, method, target, headers, reader):
+        """(status, json) or (200, {"file": ...}) of one request; only POST /jobs reads the body."""
+        url = urlsplit(target)
+        parts = [p for p in url.path.split("/") if p]
+        if parts == ["jobs"] and method == "POST":
+            try:
+                length = int(headers.get("content-length") or 0)
+            except ValueError:
+                raise RequestError(400, f"Content-Length 错误: {headers.get('content-length')}")
+            if headers.get("content-type", "").startswith("application/json"):
+                if length > MAX_JSON_BYTES:
+                    raise RequestError(413, f"JSON 超过 {MAX_JSON_BYTES >> 10} KB")
+                try:
+                    params = json.loads(await reader.readexactly(length) if length else b"{}")
+                except ValueError:
+                    raise RequestError(400, "JSON 格式错误")
+                if not isinstance(params, dict):
+                    raise RequestError(400, "JSON 须为对象: {\"files\": [...], ...}")
+                files = params.get("files") or []
+                if not isinstance(files, list) or not all(isinstance(name, str) for name in files):
+                    raise RequestError(400, "files 须为文件路径列表")
+                params["files"] = [self.input_path(name) for name in files]
+            else:
+                params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+                params["files"] = [await self.save_upload(reader, params.get("filename", "upload.xlsx"), length)]
+            job = await self.submit(params)
+            return (200 if job["status"] == "done" else 202), job
+        if parts == ["jobs"] and method == "GET":
+            return 200, list(self.jobs.values())
+        if len(parts) == 2 and parts[0] == "jobs" and method == "GET":
+            return 200, self.job(parts[1])
+        if len(parts) == 3 and parts[0] == "jobs" and parts[2] == "result" and method == "GET":
+            job = self.job(parts[1])
+            if job["status"] != "done":
+                raise RequestError(409, f"任务未完成: {job['status']}")
+            return 200, {"file": job["result_path"], "filename": job["filename"]}
+        if parts and parts[0] == "jobs":
+            raise RequestError(405, f"不支持 {method} {url.path}")
+        raise RequestError(404, f"没有这个地址: {url.path}")
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode("latin-1").split()
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1").strip()
+                if not line:
+                    break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+            if len(request_line) < 2:
+                return
+            method, target = request_line[0].upper(), request_line[1]
+            try:
+                status, payload = await self.route(method, target, headers, reader)
+            except RequestError as e:
+                status, payload = e.status, {"error": str(e)}
+            except Exception as e:
+                status, payload = 500, {"error": f"{type(e).__name__}: {e}"}
+
+            if isinstance(payload, dict) and "file" in payload:
+                await send_file(writer, payload["file"], payload["filename"])
+            else:
+                await send_json(writer, status, payload)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+async def discard(reader, length):
+    while length:
+        length -= len(await reader.readexactly(min(length, BLOCK_SIZE)))
+
+
+def now_text():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+async def send_head(writer, status, content_type, length, extra=""):
+    writer.write((
+        f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+        f"Content-Type: {content_type}\r\nContent-Length: {length}\r\n{extra}Connection: close\r\n\r\n"
+    ).encode("latin-1"))
+
+
+async def send_json(writer, status, payload):
+    data = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+    await send_head(writer, status, "application/json; charset=utf-8", len(data))
+    writer.write(data)
+    await writer.drain()
+
+
+async def send_file(writer, path, filename):
+    suffix = os.path.splitext(path)[1]
+    disposition = f"Content-Disposition: attachment; filename*=UTF-8''{quote(filename)}\r\n"
+    await send_head(writer, 200, MIME_TYPES.get(suffix, "application/octet-stream"), os.path.getsize(path), disposition)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(BLOCK_SIZE), b""):
+            writer.write(chunk)
+            await writer.drain()
+
+
+async def serve(host, port, workers, service_dir=SERVICE_DIR, input_dir=None):
+    service = AnalysisService(workers, service_dir, input_dir)
+    await service.start()
+    server = await asyncio.start_server(service.handle, host, port)
+    stopped = asyncio.Event()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopped.set)
+    except NotImplementedError:
+        pass  # Windows: Ctrl+C only
+    print(f"SLA service on http://{host}:{port}（{workers} 个分析进程）")
+    try:
+        async with server:
+            await stopped.wait()
+    finally:
+        await service.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SLA analysis HTTP service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8600)
+    parser.add_argument("--workers", type=int, default=min(os.cpu_count() or 1, 4), help="analyses run at a time")
+    parser.add_argument("--dir", default=SERVICE_DIR, help="results / uploads folder")
+    parser.add_argument("--input-dir", help="folder JSON jobs may read files from (default: <dir>/inputs)")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.dir, args.input_dir))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
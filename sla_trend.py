@@ -0,0 +1,138 @@
+"""
+Trend mode: one SLA evaluation over a long period, orders bucketed by
+SLA截止时间 (day / week), fail rates and attribution counts per bucket.
+
+Same stages (and StageCache entries) as sla_core.run_policy over the whole
+period, then one grouped count per policy instead of one run per window.
+"""
+import numpy as np
+import pandas as pd
+
+from sla_core import CUBE_KEYS, StageCache, cube_counts, cube_frame, export_result, key_counts, run_policy
+from sla_export import TREND_OUTPUT_FILE, ReportFile, write_trend_report
+from run_info import NO_LOG
+
+# 分桶方式 -> (pandas freq, 分桶列名)
+TREND_FREQS = {
+    "按天": ("D", "截止日期"),
+    "按周": ("W", "截止周（周一）"),
+}
+
+
+def bucket_edges(start, end, freq):
+    """Start of every bucket from the one holding start to the one holding end (weeks start on Monday)."""
+    first = pd.Timestamp(start).normalize()
+    if freq == "W":
+        first -= pd.Timedelta(days=first.weekday())
+    step = pd.Timedelta(days=7 if freq == "W" else 1)
+    return pd.date_range(first, pd.Timestamp(end), freq=step)
+
+
+def due_buckets(due_time, edges):
+    """Bucket number of every SLA截止时间 by binary search on the sorted edges (-1 = no due time / before)."""
+    values = due_time.to_numpy(dtype="datetime64[ns]")
+    codes = np.searchsorted(edges.to_numpy(dtype="datetime64[ns]"), values, side="right") - 1
+    codes[np.isnat(values)] = -1
+    return codes
+
+
+def bucket_labels(edges):
+    return [edge.strftime("%Y-%m-%d") for edge in edges]
+
+
+def trend_counts(df, fail_df, edges, bucket_col):
+    """
+    Orders / failed orders by bucket × 客户 × 集配站 (× 归因 for fails), from one
+    count cube with the bucket as first level; orders without due time left out.
+    """
+    labels = pd.Categorical.from_codes(due_buckets(df["SLA截止时间"], edges), categories=bucket_labels(edges))
+    frame = cube_frame(df, fail_df).assign(**{bucket_col: labels})
+    return cube_counts(key_counts(frame[frame[bucket_col].notna()], [bucket_col] + CUBE_KEYS))
+
+
+def as_percent(df, cols):
+    """Rates as "12.34%" text for display (empty where there is no order)."""
+    return df.assign(**{
+        col: df[col].map(lambda v: "" if pd.isna(v) else f"{v * 100:.2f}%")
+        for col in cols
+    })
+
+
+def rate_table(orders, fails, keys, labels):
+    """未达标率 of every bucket (rows) × key value (cols), NaN where there is no order."""
+    total = orders.groupby(level=keys).sum()
+    fail = fails.groupby(level=keys).sum().reindex(total.index, fill_value=0)
+    rate = (fail / total).unstack()
+    return rate.reindex(labels)
+
+
+def trend_tables(counts, edges, bucket_col):
+    """
+    Trend tables of one policy:
+    - overall: 总单量 / 未达标单量 / 未达标率 per bucket
+    - by_client / by_hub: 未达标率 per bucket × client / hub
+    - reasons: failed orders per bucket × 链路问题归因 (most frequent first)
+    """
+    labels = bucket_labels(edges)
+    orders, fails = counts["orders"], counts["fails"]
+
+    total = orders.groupby(level=bucket_col).sum().reindex(labels, fill_value=0)
+    fail = fails.groupby(level=bucket_col).sum().reindex(labels, fill_value=0)
+    overall = pd.DataFrame({
+        bucket_col: labels,
+        "总单量": total.to_numpy(),
+        "未达标单量": fail.to_numpy(),
+        "未达标率": (fail / total.where(total > 0)).to_numpy(),
+    })
+
+    reasons = fails.groupby(level=[bucket_col, "链路问题归因"]).sum().unstack(fill_value=0).reindex(labels, fill_value=0)
+    reasons = reasons[reasons.sum().sort_values(ascending=False).index]
+
+    return {
+        "overall": overall,
+        "by_client": rate_table(orders, fails, [bucket_col, "客户"], labels).rename_axis(bucket_col).reset_index(),
+        "by_hub": rate_table(orders, fails, [bucket_col, "集配站"], labels).rename_axis(bucket_col).reset_index(),
+        "reasons": reasons.rename_axis(bucket_col).reset_index().rename_axis(None, axis=1),
+    }
+
+
+def analyze_trend(norm_df, policies, sla_should_date, freq="按天", cut_off=None, cache=None,
+                  log=NO_LOG, export=True, history=None):
+    """
+    Trend of one or several policies over sla_should_date = (start, end), bucketed by TREND_FREQS[freq].
+    Result as in sla_core.analyze: "preview", "export", plus "chart" (未达标率 per bucket and policy).
+    history: HistoryStore the evaluated orders are also saved to.
+    """
+    if cache is None:
+        cache = StageCache()
+    start, end = sla_should_date
+    pandas_freq, bucket_col = TREND_FREQS[freq]
+    edges = bucket_edges(start, end, pandas_freq)
+
+    trends = {}
+    for policy in policies:
+        df, fail_df, _ = run_policy(norm_df, policy, (start, end), cut_off, cache, log, history)
+        counts = log.track(f"{policy.name} 分桶计数", lambda: trend_counts(df, fail_df, edges, bucket_col))
+        trends[policy.name] = log.track(f"{policy.name} 趋势表", lambda: trend_tables(counts, edges, bucket_col))
+
+    def write():
+        def write_file():
+            report = ReportFile(".xlsx")
+            write_trend_report(trends, report.path)
+            return report
+        return log.track("写出趋势Excel", write_file)
+
+    chart = pd.DataFrame({
+        name: tables["overall"].set_index(bucket_col)["未达标率"]
+        for name, tables in trends.items()
+    })
+    preview = {}
+    for name, tables in trends.items():
+        prefix = f"{name} " if len(trends) > 1 else ""
+        preview[f"{prefix}整体趋势"] = as_percent(tables["overall"], ["未达标率"])
+        preview[f"{prefix}按集配站未达标率"] = as_percent(tables["by_hub"], tables["by_hub"].columns[1:])
+
+    result = {"preview": preview, "chart": chart, "export": export_result(TREND_OUTPUT_FILE, write)}
+    if export:
+        result.update(result["export"]())
+    return result
@@ -0,0 +1,142 @@
+"""
+Synthetic waybill exports for benchmarks and offline tries, same cols as the
+system export (every col in ingest.INPUT_COLUMNS plus unused ones).
+
+    python synthetic_data.py --rows 1M --out waybills_1M.parquet
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from ingest import INPUT_COLUMNS
+from sla_rules import load_client_rules
+from zone_mapping import ZONE_FILE, ZONE_SHEET
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1M": 1_000_000, "5M": 5_000_000}
+
+HUBS = {"HUB_LAX_COM": 0.4, "HUB_LAX_ONT": 0.25, "HUB_LAX_LAS": 0.2, "HUB_LAX_PHX": 0.15}
+STATIONS_PER_HUB = 8
+
+# Share of unmapped postcodes (-> 收件人邮编集 其他)
+UNKNOWN_POSTCODE_RATE = 0.03
+
+# (col, previous milestone, min hours, max hours, missing rate)
+# a missing previous milestone leaves the later ones missing too
+MILESTONES = [
+    ("首分拨首次入库时间", "关配交接时间", -2, 30, 0.02),
+    ("首分拨首次自动分拣时间", "首分拨首次入库时间", 0, 6, 0.25),
+    ("首分拨首次人工分拣时间", "首分拨首次入库时间", 0, 12, 0.85),
+    ("首分拨首次出库时间", "首分拨首次入库时间", 1, 30, 0.03),
+    ("配送站首次入库时间", "首分拨首次出库时间", 0, 18, 0.04),
+    ("司机首次领件时间", "配送站首次入库时间", 0, 30, 0.05),
+    ("首次派送时间", "司机首次领件时间", 0, 20, 0.03),
+    ("签收成功时间", "首次派送时间", 0, 12, 0.08),
+    ("末端异常提报时间", "首分拨首次出库时间", 2, 96, 0.95),
+    ("异常释放时间", "末端异常提报时间", 1, 48, 0.5),
+    ("配送站归班时间", "首次派送时间", 4, 14, 0.6),
+]
+
+FAIL_REASONS = ["地址错误", "无人签收", "拒收", "地址无法进入"]
+
+
+def categories(rng, values, rows, weights=None):
+    """rng.choice as a category col (codes only, cheap at millions of rows)."""
+    codes = rng.choice(len(values), rows, p=weights)
+    return pd.Categorical.from_codes(codes, categories=values)
+
+
+def client_weights(clients):
+    # 少数大客户占大部分单量
+    weights = 1 / np.arange(1, len(clients) + 1)
+    return weights / weights.sum()
+
+
+def make_waybills(rows, seed=0, start="2026-03-01", days=30, extra_cols=10):
+    """
+    Synthetic export of `rows` waybills:
+    - clients of the client SLA rules (AE, CBO, FBT, ... EZG), a few large ones
+    - HUB_LAX_COM / ONT / LAS / PHX hubs with their own stations
+    - postcodes of sla_zone.xlsx, a few unmapped ones
+    - 关配交接时间 spread over `days` days, later milestones follow with
+      MILESTONES delays and missing rates
+    """
+    rng = np.random.default_rng(seed)
+
+    clients = list(load_client_rules()["客户"].unique())
+    hubs = list(HUBS)
+    postcodes = pd.read_excel(ZONE_FILE, sheet_name=ZONE_SHEET)["收件人邮编"].to_numpy()
+
+    hub_codes = rng.choice(len(hubs), rows, p=list(HUBS.values()))
+    station_codes = hub_codes * STATIONS_PER_HUB + rng.integers(0, STATIONS_PER_HUB, rows)
+    stations = [f"DS_{hub.removeprefix('HUB_LAX_')}_{i:02d}" for hub in hubs for i in range(1, STATIONS_PER_HUB + 1)]
+
+    df = pd.DataFrame({
+        "面单号": pd.Series(np.arange(rows) + 10**11).astype(str).radd("WB"),
+        "客户": categories(rng, clients, rows, client_weights(clients)),
+        "原集配站": pd.Categorical.from_codes(hub_codes, categories=hubs),
+        "集配站名称": pd.Categorical.from_codes(hub_codes, categories=hubs),
+        "原配送站": pd.Categorical.from_codes(station_codes, categories=stations),
+        "配送站名称": pd.Categorical.from_codes(station_codes, categories=stations),
+        "段码": categories(rng, [f"{c}{i}" for c in "ABCD" for i in range(1, 4)], rows),
+        "收件人邮编": np.where(
+            rng.random(rows) < UNKNOWN_POSTCODE_RATE,
+            rng.integers(1000, 99999, rows),
+            rng.choice(postcodes, rows)
+        ),
+        "分拨大包号": pd.Series(rng.integers(0, max(rows // 50, 1), rows) + 10**7).astype(str).radd("BAG"),
+    })
+
+    times = {"关配交接时间": pd.Series(
+        pd.Timestamp(start) + pd.to_timedelta(rng.uniform(0, 24 * days, rows), unit="h")
+    ).dt.floor("s").where(rng.random(rows) > 0.01)}
+    for col, previous, low, high, missing in MILESTONES:
+        delay = pd.to_timedelta(rng.uniform(low, high, rows), unit="h")
+        times[col] = (times[previous] + delay).dt.floor("s").where(rng.random(rows) > missing)
+    for col, values in times.items():
+        df[col] = values
+
+    df["派送司机"] = categories(rng, [f"DRV{i:04d}" for i in range(500)], rows)
+    df["最新签收失败原因"] = pd.Series(categories(rng, FAIL_REASONS, rows)).where(rng.random(rows) < 0.05)
+    df["是否错分"] = np.where(rng.random(rows) < 0.02, "是", "否")
+
+    # 系统导出里分析用不到的列
+    for i in range(extra_cols):
+        df[f"其他字段{i}"] = categories(rng, ["x", "y", "z"], rows)
+
+    return df[INPUT_COLUMNS + [c for c in df.columns if c not in INPUT_COLUMNS]]
+
+
+def parse_rows(value):
+    return SIZES.get(value) or int(value)
+
+
+def write_export(df, path):
+    kind = os.path.splitext(path)[1].lstrip(".").lower()
+    if kind == "xlsx":
+        df.to_excel(path, index=False, engine="xlsxwriter")
+    elif kind == "csv":
+        df.to_csv(path, index=False, encoding="utf-8-sig")
+    elif kind == "parquet":
+        df.to_parquet(path, index=False)
+    elif kind in ("arrow", "feather"):
+        df.to_feather(path)
+    else:
+        raise ValueError(f"不支持的文件格式: {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write a synthetic waybill export")
+    parser.add_argument("--rows", type=parse_rows, default="100k", help="row count or " + " / ".join(SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--out", default="synthetic_waybills.parquet")
+    args = parser.parse_args()
+
+    write_export(make_waybills(args.rows, args.seed, days=args.days), args.out)
+    print(f"{args.rows:,} rows -> {args.out}")
+
+
+if __name__ == "__main__":
+    main()
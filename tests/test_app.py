@@ -0,0 +1,54 @@
+import io
+import os
+from unittest import mock
+
+import pytest
+import streamlit as st
+from streamlit.testing.v1 import AppTest
+
+import history_store
+from synthetic_data import make_waybills
+
+APP_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+@pytest.fixture
+def app(tmp_path):
+    data = make_waybills(2000).to_csv(index=False).encode("utf-8-sig")
+
+    def uploads(*args, **kwargs):
+        # AppTest has no file uploader; every rerun gets fresh file objects, like Streamlit's
+        f = io.BytesIO(data)
+        f.name = "waybills.csv"
+        return [f]
+
+    st.cache_resource.clear()
+    with mock.patch.object(st, "file_uploader", side_effect=uploads), \
+            mock.patch.object(history_store, "HISTORY_FILE", str(tmp_path / "sla_history.sqlite")):
+        yield AppTest.from_file(APP_FILE, default_timeout=120).run()
+
+
+def click(at, label):
+    next(b for b in at.button if b.label == label).click().run()
+    assert not at.exception, [e.message for e in at.exception]
+
+
+def test_second_run_reuses_the_normalized_upload(app):
+    click(app, "开始分析")
+    assert app.session_state["run_log"].frame()["来源"].iloc[0] != "缓存"
+
+    click(app, "开始分析")
+    steps = app.session_state["run_log"].frame()
+    assert steps["步骤"].iloc[0] == "读取并整理上传数据"
+    assert steps["来源"].iloc[0] == "缓存"
+
+
+def test_history_file_is_created_only_when_used(app):
+    click(app, "开始分析")
+    click(app, "按上面的SLA要求和时间段查询历史库（不用上传文件）")
+    assert app.error[0].value.startswith("历史库还是空的")
+    assert not os.path.exists(history_store.HISTORY_FILE)
+
+    next(c for c in app.checkbox if c.label.startswith("把本次分析的订单写入历史库")).check().run()
+    click(app, "开始分析")
+    assert os.path.exists(history_store.HISTORY_FILE)
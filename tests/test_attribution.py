@@ -0,0 +1,263 @@
+"""
+Parity of sla_attribution.attribute_failures with the per-row decision tree
+it replaced (pickup_or_not / missort_or_not / sort_or_not + the iterrows loop).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from sla_attribution import OUTCOMES, attribute_failures
+
+CUT_OFF = pd.Timestamp("2026-03-09 11:50")
+NARROW_CLIENTS = ["FBT", "SKA2", "YW", "TE", "WHUS", "WHUS-4PX"]
+SLIGHTLY_LATE = OUTCOMES[-1]
+
+
+def hours_diff_values(end_time, start_time):
+    return (end_time - start_time).total_seconds() / 3600
+
+
+def reference_attribution(row, cut_off, narrow_clients, cainiao=False):
+    """The previous row-wise tree; cainiao=True keeps 中台SLA's commented-out last pickup branch (-> None)."""
+    def pickup_or_not(row):
+        if pd.isna(row["耗时_配送站入库→司机领件"]):
+            if hours_diff_values(cut_off, row["配送站首次入库时间"]) > 96:
+                return ("飘件/包裹在配送站丢失（须严查原因）", "配送")
+            else:
+                return ("DSP严重压单（需警告）/飘件", "配送")
+        elif row["集配站"] == "HUB_LAX_COM" and row["耗时_配送站入库→司机领件"] > 12:
+            if row["耗时_配送站入库→司机领件"] > 36:
+                return ("DSP严重压单（需警告）/飘件", "配送")
+            else:
+                return ("DSP压单/飘件", "配送")
+        elif row["耗时_配送站入库→司机领件"] > 8:
+            if row["耗时_配送站入库→司机领件"] > 32:
+                return ("DSP严重压单（需警告）/飘件", "配送")
+            else:
+                return ("DSP压单/飘件", "配送")
+        else:
+            if pd.isna(row["耗时_司机领件→首次派送"]):
+                if hours_diff_values(cut_off, row["司机首次领件时间"]) > 48:
+                    return ("DSP领件两日内未投递（需警告）", "配送")
+                else:
+                    return ("DSP领件未及时投递", "配送")
+            elif row["耗时_司机领件→首次派送"] > 16:
+                if row["耗时_司机领件→首次派送"] > 42:
+                    return ("DSP领件两日内未投递（需警告）", "配送")
+                else:
+                    return ("DSP领件未及时投递", "配送")
+            elif cainiao:
+                return None
+            else:
+                if row["客户"] in narrow_clients:
+                    if pd.isna(row["签收成功时间"]):
+                        return ("DSP因某些原因未投递成功（需确认）", "配送")
+                    elif row["耗时_司机领件→签收成功"] > 16:
+                        return ("DSP达成投递要求但超时", "配送")
+                    else:
+                        return ("DSP达成投递要求但略微超时，存在潜在问题（需确认）", "待确认")
+                else:
+                    return ("DSP达成投递要求但略微超时，存在潜在问题（需确认）", "待确认")
+
+    def missort_or_not(row):
+        if row["是否错分"] == "是":
+            return ("错分", "分拨")
+        else:
+            return ("卡车迟到/分拨数据出库实物未装车/大包不准确或丢失/大包漏扫/错分未打标/系统bug（需确认）", "待确认")
+
+    def sort_or_not(row):
+        if pd.isna(row["首分拨首次分拣时间"]):
+            return ("分拨未分拣", "分拨")
+        if pd.isna(row["首分拨首次出库时间"]):
+            return ("分拨未及时出库", "分拨")
+        limit_hours = 12 + 24 * (row["sla_days"] - 2)
+        if row["耗时_分拨入库→分拨出库"] > limit_hours:
+            return ("分拨未及时出库", "分拨")
+        if pd.isna(row["耗时_分拨出库→配送站入库"]):
+            if pd.isna(row["末端异常提报时间"]):
+                if hours_diff_values(cut_off, row["首分拨首次出库时间"]) > 96:
+                    return ("仓配交接差异", "分拨")
+                else:
+                    return missort_or_not(row)
+            else:
+                if row["耗时_分拨出库→异常登记"] > 15:
+                    if row["耗时_分拨出库→异常登记"] > 96:
+                        return ("仓配交接差异", "分拨")
+                    else:
+                        return missort_or_not(row)
+                else:
+                    return pickup_or_not(row)
+        elif row["耗时_分拨出库→配送站入库"] > 0.25:
+            if row["集配站"] == "HUB_LAX_COM":
+                return missort_or_not(row)
+            else:
+                if row["耗时_分拨出库→配送站入库"] > 15:
+                    return missort_or_not(row)
+                else:
+                    return pickup_or_not(row)
+        else:
+            return pickup_or_not(row)
+
+    if pd.isna(row["首分拨首次入库时间"]):
+        return ("分拨未入库", "分拨")
+    if row["客户"] in ["AE", "SKA2"] and row["耗时_关配→分拨入库"] > 24:
+        return ("分拨入库过晚", "分拨")
+    return sort_or_not(row)
+
+
+# Values right at, just above and just below every threshold of the tree
+HOUR_EDGES = [
+    np.nan, 0, 0.25, 0.26, 8, 8.01, 12, 12.01, 15, 15.01, 16, 16.01, 24, 24.01,
+    32, 32.01, 36, 36.01, 42, 42.01, 60, 60.01, 84, 84.01, 96, 96.01
+]
+# Timestamps relative to cut_off at the 48h / 96h "since" checks
+AGE_EDGES = [None, 1, 48, 48.01, 96, 96.01, 200]
+
+
+def edge_frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+
+    def hours(name):
+        return rng.choice(HOUR_EDGES, n)
+
+    def stamps():
+        ages = rng.choice(np.array(AGE_EDGES, dtype=object), n)
+        return pd.Series([pd.NaT if age is None else CUT_OFF - pd.Timedelta(hours=age) for age in ages],
+                         dtype="datetime64[ns]")
+
+    df = pd.DataFrame({
+        "客户": rng.choice(["AE", "SKA2", "FBT", "CBO", "TE", "YW"], n),
+        "集配站": rng.choice(["HUB_LAX_COM", "HUB_LAX_LAS", "HUB_LAX_PHX"], n),
+        "是否错分": rng.choice(["是", "否", None], n),
+        "sla_days": rng.choice([2, 3, 4, 5], n),
+    })
+    for col in ["首分拨首次入库时间", "首分拨首次分拣时间", "首分拨首次出库时间", "末端异常提报时间",
+                "配送站首次入库时间", "司机首次领件时间", "签收成功时间"]:
+        df[col] = stamps()
+    for col in ["耗时_关配→分拨入库", "耗时_分拨入库→分拨出库", "耗时_分拨出库→配送站入库", "耗时_分拨出库→异常登记",
+                "耗时_配送站入库→司机领件", "耗时_司机领件→首次派送", "耗时_司机领件→签收成功"]:
+        df[col] = hours(col)
+    return df
+
+
+def vectorized(df, narrow_clients):
+    result = attribute_failures(df, sla_days=df["sla_days"], cut_off=CUT_OFF, narrow_clients=narrow_clients)
+    return list(zip(result["链路问题归因"], result["主要责任方"]))
+
+
+def reference(df, narrow_clients, cainiao=False):
+    return [reference_attribution(row, CUT_OFF, narrow_clients, cainiao) for _, row in df.iterrows()]
+
+
+@pytest.fixture(scope="module")
+def frame():
+    return edge_frame(20000)
+
+
+def test_client_tree_matches_reference(frame):
+    assert vectorized(frame, NARROW_CLIENTS) == reference(frame, NARROW_CLIENTS)
+
+
+def test_cainiao_tree_matches_reference(frame):
+    expected = reference(frame, [], cainiao=True)
+    # 中台SLA's on-time DSP parcels returned None before; they now get the generic 待确认 outcome
+    assert None in expected
+    expected = [SLIGHTLY_LATE if outcome is None else outcome for outcome in expected]
+    assert vectorized(frame, []) == expected
+
+
+def test_every_outcome_is_reached(frame):
+    assert set(vectorized(frame, NARROW_CLIENTS)) == set(OUTCOMES)
+
+
+def one_row(**values):
+    # A parcel that reaches pickup_or_not with nothing late, then the given values
+    base = {
+        "客户": "CBO", "集配站": "HUB_LAX_LAS", "是否错分": "否", "sla_days": 3,
+        "首分拨首次入库时间": CUT_OFF, "首分拨首次分拣时间": CUT_OFF, "首分拨首次出库时间": CUT_OFF,
+        "末端异常提报时间": pd.NaT, "配送站首次入库时间": CUT_OFF, "司机首次领件时间": CUT_OFF,
+        "签收成功时间": CUT_OFF, "耗时_关配→分拨入库": 1.0, "耗时_分拨入库→分拨出库": 1.0,
+        "耗时_分拨出库→配送站入库": 0.25, "耗时_分拨出库→异常登记": np.nan, "耗时_配送站入库→司机领件": 1.0,
+        "耗时_司机领件→首次派送": 1.0, "耗时_司机领件→签收成功": 1.0,
+    }
+    row = pd.DataFrame({col: [value] for col, value in {**base, **values}.items()})
+    for col in row.columns[row.columns.str.endswith("时间")]:
+        row[col] = row[col].astype("datetime64[ns]")
+    return row
+
+
+@pytest.mark.parametrize("hub, hours, reason", [
+    ("HUB_LAX_COM", 8, "DSP达成投递要求但略微超时，存在潜在问题（需确认）"),
+    # not past COM's 12h, but past the general 8h
+    ("HUB_LAX_COM", 12, "DSP压单/飘件"),
+    ("HUB_LAX_COM", 12.01, "DSP压单/飘件"),
+    ("HUB_LAX_COM", 36, "DSP压单/飘件"),
+    ("HUB_LAX_COM", 36.01, "DSP严重压单（需警告）/飘件"),
+    ("HUB_LAX_LAS", 8, "DSP达成投递要求但略微超时，存在潜在问题（需确认）"),
+    ("HUB_LAX_LAS", 8.01, "DSP压单/飘件"),
+    ("HUB_LAX_LAS", 32, "DSP压单/飘件"),
+    ("HUB_LAX_LAS", 32.01, "DSP严重压单（需警告）/飘件"),
+])
+def test_pickup_thresholds_by_hub(hub, hours, reason):
+    row = one_row(集配站=hub, **{"耗时_配送站入库→司机领件": hours})
+    assert vectorized(row, NARROW_CLIENTS)[0][0] == reason
+    assert reference(row, NARROW_CLIENTS) == vectorized(row, NARROW_CLIENTS)
+
+
+@pytest.mark.parametrize("hub, hours, reason", [
+    ("HUB_LAX_COM", 0.25, "DSP达成投递要求但略微超时，存在潜在问题（需确认）"),
+    ("HUB_LAX_COM", 0.26, "卡车迟到/分拨数据出库实物未装车/大包不准确或丢失/大包漏扫/错分未打标/系统bug（需确认）"),
+    ("HUB_LAX_PHX", 15, "DSP达成投递要求但略微超时，存在潜在问题（需确认）"),
+    ("HUB_LAX_PHX", 15.01, "卡车迟到/分拨数据出库实物未装车/大包不准确或丢失/大包漏扫/错分未打标/系统bug（需确认）"),
+])
+def test_station_inbound_thresholds_by_hub(hub, hours, reason):
+    row = one_row(集配站=hub, **{"耗时_分拨出库→配送站入库": hours})
+    assert vectorized(row, NARROW_CLIENTS)[0][0] == reason
+    assert reference(row, NARROW_CLIENTS) == vectorized(row, NARROW_CLIENTS)
+
+
+@pytest.mark.parametrize("client, hours, reason", [
+    ("AE", 24, "DSP达成投递要求但略微超时，存在潜在问题（需确认）"),
+    ("AE", 24.01, "分拨入库过晚"),
+    ("SKA2", 24.01, "分拨入库过晚"),
+    ("CBO", 24.01, "DSP达成投递要求但略微超时，存在潜在问题（需确认）"),
+    ("AE", np.nan, "DSP达成投递要求但略微超时，存在潜在问题（需确认）"),
+])
+def test_late_inbound_only_for_ae_and_ska2(client, hours, reason):
+    row = one_row(客户=client, **{"耗时_关配→分拨入库": hours})
+    assert vectorized(row, [])[0][0] == reason
+    assert reference(row, []) == vectorized(row, [])
+
+
+def test_missing_timestamps():
+    assert vectorized(one_row(首分拨首次入库时间=pd.NaT, 客户="AE", **{"耗时_关配→分拨入库": 30.0}), [])[0][0] == "分拨未入库"
+    assert vectorized(one_row(首分拨首次分拣时间=pd.NaT), [])[0][0] == "分拨未分拣"
+    assert vectorized(one_row(首分拨首次出库时间=pd.NaT), [])[0][0] == "分拨未及时出库"
+    # No station inbound, no exception: NaT outbound age (NaN > 96 is False) -> missort check
+    row = one_row(**{"耗时_分拨出库→配送站入库": np.nan})
+    assert reference(row, []) == vectorized(row, [])
+    # No pickup and no station inbound time: the 96h age check is False -> 压单
+    row = one_row(配送站首次入库时间=pd.NaT, **{"耗时_配送站入库→司机领件": np.nan})
+    assert vectorized(row, [])[0][0] == "DSP严重压单（需警告）/飘件"
+    assert reference(row, []) == vectorized(row, [])
+
+
+@pytest.mark.parametrize("client, values, reason", [
+    ("FBT", {"签收成功时间": pd.NaT, "耗时_司机领件→签收成功": np.nan}, "DSP因某些原因未投递成功（需确认）"),
+    ("FBT", {"耗时_司机领件→签收成功": 16.01}, "DSP达成投递要求但超时"),
+    ("FBT", {"耗时_司机领件→签收成功": 16}, "DSP达成投递要求但略微超时，存在潜在问题（需确认）"),
+    ("CBO", {"签收成功时间": pd.NaT, "耗时_司机领件→签收成功": np.nan}, "DSP达成投递要求但略微超时，存在潜在问题（需确认）"),
+])
+def test_on_time_dsp_parcels(client, values, reason):
+    row = one_row(客户=client, **values)
+    assert vectorized(row, NARROW_CLIENTS)[0][0] == reason
+    assert reference(row, NARROW_CLIENTS) == vectorized(row, NARROW_CLIENTS)
+    # 中台SLA (no narrow clients): the old tree returned None here
+    assert reference(row, [], cainiao=True) == [None]
+    assert vectorized(row, []) == [SLIGHTLY_LATE]
+
+
+def test_empty_frame():
+    result = attribute_failures(edge_frame(0), sla_days=[], cut_off=CUT_OFF)
+    assert list(result.columns) == ["链路问题归因", "主要责任方"]
+    assert result.empty
@@ -0,0 +1,33 @@
+import contextlib
+import io
+import os
+import stat
+from datetime import datetime
+
+import pytest
+
+from cainiao_sla_analysis import POLICY as CAINIAO_POLICY
+from sla_batch import daily_windows, run_batch
+from synthetic_data import make_waybills, write_export
+
+
+@pytest.fixture
+def umask():
+    previous = os.umask(0o022)
+    yield 0o022
+    os.umask(previous)
+
+
+def test_reports_get_the_mode_of_new_files(tmp_path, umask):
+    path = str(tmp_path / "export.parquet")
+    write_export(make_waybills(2000), path)
+    windows = daily_windows("2026-03-10", "2026-03-11")
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, results = run_batch([path], [CAINIAO_POLICY], windows, datetime(2026, 4, 12, 11, 50),
+                               str(tmp_path / "reports"), workers=1)
+
+    assert [window for window, *_ in results] == windows
+    for _, report, _, _ in results:
+        assert os.path.dirname(report) == str(tmp_path / "reports")
+        assert stat.S_IMODE(os.stat(report).st_mode) == 0o644
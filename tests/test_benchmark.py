@@ -0,0 +1,38 @@
+"""
+Small run of the benchmark stages (benchmark.py stages) with loose bounds, so
+a large time or memory regression fails the test run. Bigger sizes:
+
+    SLA_BENCH_ROWS=100000 python -m pytest -q tests/test_benchmark.py
+"""
+import os
+
+import pandas as pd
+import pytest
+
+from benchmark import stage_timings
+
+BENCH_ROWS = int(os.environ.get("SLA_BENCH_ROWS", 10000))
+
+# Generous per 10k rows: the analysis takes about 1 s, no stage grows the peak by more than ~50 MB
+SECONDS_PER_10K = 15
+PEAK_MB_PER_10K = 300
+
+WINDOW = (pd.Timestamp("2026-03-10"), pd.Timestamp("2026-03-16 23:59:59"))
+CUT_OFF = pd.Timestamp("2026-04-05 11:50")
+
+
+@pytest.mark.parametrize("sla", ["cainiao", "client", "both"])
+def test_stage_timings(sla):
+    timings, windowed, failed, file_mb, peak_mb = stage_timings(BENCH_ROWS, sla, WINDOW, CUT_OFF)
+    scale = max(BENCH_ROWS / 10000, 1)
+
+    names = [name for name, _, _ in timings]
+    assert names[:3] == ["generate", "read", "normalize"]
+    assert names[-1] == "export"
+    assert 0 < failed <= windowed < BENCH_ROWS
+    assert file_mb > 0
+
+    analysis = sum(seconds for name, seconds, _ in timings if name not in ("generate", "read"))
+    assert analysis < SECONDS_PER_10K * scale, timings
+    for name, seconds, extra_mb in timings:
+        assert extra_mb is None or extra_mb < PEAK_MB_PER_10K * scale, (name, extra_mb)
@@ -0,0 +1,53 @@
+import contextlib
+import io
+
+import pandas as pd
+import pytest
+
+from cainiao_sla_analysis import POLICY as CAINIAO_POLICY
+from client_sla_analysis import POLICY as CLIENT_POLICY
+from ingest import read_uploads
+from sla_chunked import analyze_chunked
+from sla_core import analyze, analyze_combined, normalize_frame
+from synthetic_data import make_waybills, write_export
+
+WINDOW = (pd.Timestamp("2026-03-05"), pd.Timestamp("2026-03-25 23:59:59"))
+CUT_OFF = pd.Timestamp("2026-04-12 11:50")
+
+
+@pytest.fixture(scope="module")
+def overlapping_exports(tmp_path_factory):
+    """Two exports sharing 1,000 面单号: the earlier one stops at 配送站入库 for half of them."""
+    df = make_waybills(3000)
+    first, second = df.iloc[:2000].copy(), df.iloc[1000:].copy()
+    behind = first.index[1000::2]
+    first.loc[behind, ["司机首次领件时间", "首次派送时间", "签收成功时间"]] = pd.NaT
+
+    folder = tmp_path_factory.mktemp("exports")
+    paths = [str(folder / "first.csv"), str(folder / "second.parquet")]
+    write_export(first, paths[0])
+    write_export(second, paths[1])
+    return paths
+
+
+def assert_same_preview(a, b):
+    assert list(a) == list(b)
+    for title in a:
+        pd.testing.assert_frame_equal(a[title], b[title], check_dtype=False, obj=title)
+
+
+@pytest.mark.parametrize("policies", [[CAINIAO_POLICY], [CAINIAO_POLICY, CLIENT_POLICY]], ids=["single", "combined"])
+def test_chunked_matches_whole_frame_across_files(overlapping_exports, policies):
+    norm_df = normalize_frame(read_uploads(overlapping_exports, max_workers=1))
+    assert norm_df.attrs["duplicates"] == 1000
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if len(policies) == 1:
+            whole = analyze(norm_df, policies[0], WINDOW, CUT_OFF, export=False)
+        else:
+            whole = analyze_combined(norm_df, policies, WINDOW, CUT_OFF, export=False)
+        # partitions smaller than a file, so repeats sit in different partitions and files
+        chunked = analyze_chunked(overlapping_exports, policies, WINDOW, CUT_OFF, chunk_rows=700, export=False)
+
+    assert chunked["duplicates"] == 1000
+    assert_same_preview(whole["preview"], chunked["preview"])
@@ -0,0 +1,39 @@
+import contextlib
+import io
+
+import pandas as pd
+
+from cainiao_sla_analysis import POLICY as CAINIAO_POLICY, run_analysis
+from client_sla_analysis import POLICY as CLIENT_POLICY
+from sla_core import analyze, analyze_combined, normalize_frame, run_policy
+from synthetic_data import make_waybills
+
+WINDOW = (pd.Timestamp("2026-03-05"), pd.Timestamp("2026-03-25 23:59:59"))
+CUT_OFF = pd.Timestamp("2026-04-12 11:50")
+
+
+def stdout_of(call):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        result = call()
+    return out.getvalue(), result
+
+
+def test_summary_path_prints_nothing():
+    norm_df = normalize_frame(make_waybills(2000))
+    for call in [
+        lambda: run_policy(norm_df, CAINIAO_POLICY, WINDOW, CUT_OFF),
+        lambda: analyze(norm_df, CAINIAO_POLICY, WINDOW, CUT_OFF, export=False),
+        lambda: analyze_combined(norm_df, [CAINIAO_POLICY, CLIENT_POLICY], WINDOW, CUT_OFF, export=False),
+    ]:
+        assert stdout_of(call)[0] == ""
+
+
+def test_run_analysis_prints_one_line_per_client():
+    df = make_waybills(2000)
+    printed, result = stdout_of(lambda: run_analysis(df, WINDOW, CUT_OFF))
+    _, _, report = run_policy(normalize_frame(df), CAINIAO_POLICY, WINDOW, CUT_OFF)
+
+    lines = printed.splitlines()
+    assert [line.split(":")[0] for line in lines] == list(report["client_sla_summary"])
+    assert result["output_bytes"]
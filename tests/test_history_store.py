@@ -0,0 +1,82 @@
+import contextlib
+import io
+
+import pandas as pd
+import pytest
+
+from cainiao_sla_analysis import POLICY as CAINIAO_POLICY
+from client_sla_analysis import POLICY as CLIENT_POLICY
+from history_store import HistoryStore, analyze_history
+from sla_core import StageCache, evaluate_frame, normalize_frame, run_policy
+from synthetic_data import make_waybills
+
+WINDOW = (pd.Timestamp("2026-03-10"), pd.Timestamp("2026-03-15 23:59:59"))
+CUT_OFF = pd.Timestamp("2026-04-12 11:50")
+
+
+def assert_same(a, b, where="summary"):
+    if isinstance(a, pd.DataFrame):
+        pd.testing.assert_frame_equal(a.reset_index(drop=True), b.reset_index(drop=True), check_dtype=False, obj=where)
+    elif isinstance(a, dict):
+        assert list(a) == list(b), where
+        for key in a:
+            assert_same(a[key], b[key], f"{where}.{key}")
+    elif isinstance(a, list):
+        assert len(a) == len(b), where
+        for x, y in zip(a, b):
+            assert_same(x, y, where)
+    else:
+        assert a == b or (pd.isna(a) and pd.isna(b)), (where, a, b)
+
+
+def run(norm_df, policy, window=None, history=None):
+    with contextlib.redirect_stdout(io.StringIO()):
+        return run_policy(norm_df, policy, window, CUT_OFF, StageCache(), history=history)
+
+
+@pytest.fixture(scope="module")
+def norm_df():
+    return normalize_frame(make_waybills(5000))
+
+
+@pytest.fixture
+def store(tmp_path, norm_df):
+    store = HistoryStore(str(tmp_path / "history.sqlite"))
+    for policy in (CAINIAO_POLICY, CLIENT_POLICY):
+        run(norm_df, policy, history=store)
+    return store
+
+
+@pytest.mark.parametrize("policy", [CAINIAO_POLICY, CLIENT_POLICY], ids=lambda p: p.name)
+def test_window_matches_a_fresh_run(store, norm_df, policy):
+    # a fresh run keeps the orders without due time, the store leaves them out
+    has_due = evaluate_frame(norm_df, policy)["SLA截止时间"].notna()
+    assert not has_due.all()
+    df, fail_df, report = run(norm_df[has_due], policy, WINDOW)
+
+    assert_same(report, store.summary(policy, *WINDOW), policy.name)
+    stored = store.failed_orders(policy.name, *WINDOW)
+    assert sorted(stored["面单号"]) == sorted(fail_df["面单号"])
+
+
+def test_orders_without_due_time_stay_out_of_windows(store, norm_df):
+    before = store.counts(CAINIAO_POLICY.name, *WINDOW).sum()
+
+    # a later upload of other waybills, none with a due time
+    later = norm_df.assign(面单号="NEW" + norm_df["面单号"].astype(str), 关配交接时间=pd.NaT, 首分拨首次入库时间=pd.NaT)
+    assert evaluate_frame(later, CAINIAO_POLICY)["SLA截止时间"].isna().all()
+    run(later, CAINIAO_POLICY, history=store)
+
+    assert store.counts(CAINIAO_POLICY.name, *WINDOW).sum() == before
+
+
+@pytest.mark.filterwarnings("error::FutureWarning")
+def test_combined_history_with_one_policy_without_fails(tmp_path, norm_df):
+    store = HistoryStore(str(tmp_path / "history.sqlite"))
+    run(norm_df, CAINIAO_POLICY, history=store)
+
+    result = analyze_history(store, [CAINIAO_POLICY, CLIENT_POLICY], WINDOW)
+    assert result["filename"].endswith(".xlsx")
+
+    empty = analyze_history(store, [CAINIAO_POLICY, CLIENT_POLICY], (pd.Timestamp("2020-01-01"), pd.Timestamp("2020-01-02")))
+    assert empty["filename"].endswith(".xlsx")
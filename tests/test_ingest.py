@@ -0,0 +1,29 @@
+import pandas as pd
+import pytest
+
+from ingest import read_upload, read_uploads
+from synthetic_data import make_waybills, write_export
+
+
+@pytest.fixture(scope="module")
+def exports(tmp_path_factory):
+    folder = tmp_path_factory.mktemp("exports")
+    paths = []
+    for i, kind in enumerate(["csv", "parquet"]):
+        path = str(folder / f"part{i}.{kind}")
+        write_export(make_waybills(500, seed=i), path)
+        paths.append(path)
+    return paths
+
+
+def test_pool_matches_sequential_read(exports):
+    expected = pd.concat([read_upload(path) for path in exports], ignore_index=True)
+    seen = []
+    df = read_uploads(exports, max_workers=2, progress=lambda done, total, name: seen.append((done, total)))
+    pd.testing.assert_frame_equal(df, expected)
+    assert seen == [(1, 2), (2, 2)]
+
+
+def test_no_files():
+    with pytest.raises(ValueError):
+        read_uploads([])
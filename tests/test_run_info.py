@@ -0,0 +1,49 @@
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from run_info import RunLog, reset_peak_rss
+
+pytestmark = pytest.mark.skipif(not reset_peak_rss(), reason="needs /proc/self/clear_refs (Linux)")
+
+
+def allocate():
+    return np.ones(20 * 1024 * 1024 // 8).sum()
+
+
+def peaks(log):
+    return log.frame()["内存峰值(MB)"]
+
+
+def test_lone_run_measures_every_stage():
+    log = RunLog()
+    with log.stage("outer"):
+        log.track("inner", allocate)
+    assert peaks(log).notna().all()
+
+
+def test_overlapping_runs_report_no_peak():
+    first, second = RunLog(), RunLog()
+    started, done = threading.Event(), threading.Event()
+
+    def other_session():
+        with second.stage("other"):
+            started.set()
+            done.wait()
+        second.track("after", allocate)
+
+    thread = threading.Thread(target=other_session)
+    with first.stage("outer"):
+        thread.start()
+        started.wait()
+        first.track("inner", allocate)
+        done.set()
+        thread.join()
+    first.track("alone again", allocate)
+
+    assert peaks(first)[:2].isna().all()
+    assert pd.isna(peaks(second)[0])
+    # once a run is alone again its stages are measured
+    assert peaks(first).notna()[2]
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+from urllib.parse import quote
+
+import pytest
+
+from sla_service import AnalysisService
+from synthetic_data import make_waybills, write_export
+
+
+async def http(port, method, path, body=b"", content_type="application/json"):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write((
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    ).encode("latin-1") + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, data = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(data)
+
+
+def post_json(port, params):
+    return http(port, "POST", "/jobs", json.dumps(params).encode())
+
+
+def with_service(tmp_path, check):
+    """Run check(service, port) against a service on a free port."""
+    async def main():
+        service = AnalysisService(1, str(tmp_path / "service"), str(tmp_path / "inputs"))
+        await service.start()
+        server = await asyncio.start_server(service.handle, "127.0.0.1", 0)
+        try:
+            async with server:
+                await check(service, server.sockets[0].getsockname()[1])
+        finally:
+            await service.stop()
+    asyncio.run(main())
+
+
+@pytest.fixture
+def export(tmp_path):
+    os.makedirs(tmp_path / "inputs")
+    path = tmp_path / "inputs" / "export.csv"
+    write_export(make_waybills(1000), str(path))
+    return path
+
+
+def test_json_files_stay_inside_the_input_dir(tmp_path, export):
+    outside = tmp_path / "outside.csv"
+    outside.write_bytes(export.read_bytes())
+    (tmp_path / "inputs" / "notes.txt").write_text("x")
+
+    async def check(service, port):
+        for name in ["/etc/passwd", str(outside), "../outside.csv", "sub/../../outside.csv"]:
+            status, payload = await post_json(port, {"files": [name]})
+            assert status == 403, (name, payload)
+        status, payload = await post_json(port, {"files": ["notes.txt"]})
+        assert status == 400, payload
+        assert not service.jobs
+
+        status, job = await post_json(port, {"files": ["export.csv"], "window": "2026-03-10"})
+        assert status == 202, job
+        status, job = await post_json(port, {"files": [str(export)], "window": "2026-03-10"})
+        assert status == 202 and len(service.jobs) == 1, job
+
+    with_service(tmp_path, check)
+
+
+@pytest.mark.parametrize("body", [
+    b"[1]",
+    b'"export.csv"',
+    b'{"files": "export.csv"}',
+    b'{"files": [1]}',
+    b'{"files": ["export.csv"], "cut_off": 5}',
+    '{"files": ["export.csv"], "sla": ["中台"]}'.encode(),
+    b'{"files": ["export.csv"], "detail_mode": 1}',
+    b'{"files": ["export.csv"], "window": [1, 2]}',
+    b'{"files": ["export.csv"], "window": ["2026-03-01"]}',
+    b'{"files": ["export.csv"], "window": "not a date"}',
+])
+def test_bad_json_is_a_400(tmp_path, export, body):
+    async def check(service, port):
+        status, payload = await http(port, "POST", "/jobs", body)
+        assert status == 400, payload
+
+    with_service(tmp_path, check)
+
+
+def test_upload_is_streamed_to_disk(tmp_path, export):
+    body = export.read_bytes()
+
+    async def check(service, port):
+        path = f"/jobs?filename=a.csv&sla={quote('客户')}&window=2026-03-10~2026-03-12&cut_off=2026-04-05"
+        status, job = await http(port, "POST", path, body, "text/csv")
+        assert status == 202, job
+        uploads = os.listdir(service.upload_dir)
+        assert len(uploads) == 1 and uploads[0].endswith(".csv")
+        with open(os.path.join(service.upload_dir, uploads[0]), "rb") as f:
+            assert f.read() == body
+
+        status, payload = await http(port, "POST", "/jobs?filename=a.txt", body, "text/plain")
+        assert status == 400, payload
+        assert os.listdir(service.upload_dir) == uploads
+
+        while job["status"] in ("queued", "running"):
+            await asyncio.sleep(0.2)
+            _, job = await http(port, "GET", f"/jobs/{job['id']}")
+        assert job["status"] == "done", job
+        assert job["rows"] == 1000
+
+    with_service(tmp_path, check)
@@ -0,0 +1,186 @@
+"""
+Parity of the columnar SLA evaluation (sla_core.evaluate_frame -> sla_engine.evaluate_sla)
+with the per-row calc_sla_row of both analyses it replaced.
+"""
+from datetime import time, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cainiao_sla_analysis import POLICY as CAINIAO_POLICY
+from client_sla_analysis import POLICY as CLIENT_POLICY
+from sla_core import evaluate_frame, normalize_frame
+from sla_rules import ZONES
+from synthetic_data import make_waybills
+
+SLA_COLS = ["SLA标准小时", "SLA截止时间", "SLA实际小时", "SLA是否达标"]
+START_COLS = ["关配交接时间", "首分拨首次入库时间"]
+END_COLS = ["首次派送时间", "签收成功时间"]
+
+ZONE_CONFIG = {
+    "Zone1": {"hours": 48}, "Zone2": {"hours": 48}, "Zone3": {"hours": 72}, "Zone4": {"hours": 96},
+}
+CLIENT_CONFIG = {
+    "AE": {"start_col": "SLA关配交接时间", "end_col": "首次派送时间", "hours_CA": 48, "hours_nonCA": 96},
+    "CBO": {"start_col": "首分拨首次入库时间", "end_col": "首次派送时间", "hours_CA": 72, "hours_nonCA": 96},
+    "FBT": {"start_col": "首分拨首次入库时间", "end_col": "签收成功时间", "hours": 48},
+    "CBT": {"start_col": "首分拨首次入库时间", "end_col": "首次派送时间", "hours": 72},
+    "SKA2": {"start_col": "关配交接时间", "end_col": "签收成功时间", "hours": 120},
+    "TE": {"start_col": "首分拨首次入库时间", "end_col": "签收成功时间", "hours_z12": 72, "hours_z34": 120},
+    "YW": {"start_col": "首分拨首次入库时间", "end_col": "签收成功时间", "hours": 84},
+    "HTE": {"start_col": "首分拨首次入库时间", "end_col": "首次派送时间", "hours_CA": 72, "hours_nonCA": 120},
+    "WH": {"start_col": "首分拨首次入库时间", "end_col": "签收成功时间", "hours": 120},
+    "WHUS": {"start_col": "首分拨首次入库时间", "end_col": "签收成功时间", "hours": 120},
+    "WHUS-4PX": {"start_col": "首分拨首次入库时间", "end_col": "签收成功时间", "hours": 120},
+    "CKY": {"start_col": "首分拨首次入库时间", "end_col": "签收成功时间", "hours_z12": 72, "hours_z34": 96},
+    "EZG": {"start_col": "首分拨首次入库时间", "end_col": "签收成功时间", "hours_z12": 120, "hours_z34": 144},
+}
+END_OF_DAY_CLIENTS = ["FBT", "CBT", "AE", "HTE", "WHUS", "WHUS-4PX", "CKY"]
+
+
+def sla_result(sla_hours, start_time, end_time, due_time):
+    if pd.isna(start_time) or pd.isna(end_time):
+        return pd.Series({"SLA标准小时": sla_hours, "SLA截止时间": due_time, "SLA实际小时": np.nan, "SLA是否达标": False})
+    return pd.Series({
+        "SLA标准小时": sla_hours,
+        "SLA截止时间": due_time,
+        "SLA实际小时": (end_time - start_time).total_seconds() / 3600,
+        "SLA是否达标": end_time <= due_time
+    })
+
+
+def reference_cainiao(row):
+    """The previous calc_sla_row of 中台SLA: earliest start col, 16:00 cut rule."""
+    zone = ZONE_CONFIG.get(row["收件人邮编集"])
+    if zone is None:
+        sla_hours, start_time, end_time = np.nan, np.nan, np.nan
+    else:
+        sla_hours = zone["hours"]
+        start_times = [t for t in (row.get(col) for col in START_COLS) if pd.notna(t)]
+        start_time = min(start_times) if start_times else np.nan
+        end_time = row.get("首次派送时间")
+
+    if pd.isna(start_time) or np.isnan(sla_hours):
+        due_time = pd.NaT
+    else:
+        due_time = (start_time + timedelta(hours=float(sla_hours))).normalize() + pd.Timedelta(hours=23, minutes=59, seconds=59)
+        if not time(0, 0, 0) <= start_time.time() <= time(16, 0, 0):
+            due_time += timedelta(days=1)
+    return sla_result(sla_hours, start_time, end_time, due_time)
+
+
+def reference_client(row):
+    """The previous calc_sla_row of 客户SLA: hours by CA / zone, end of day for some clients."""
+    cfg = CLIENT_CONFIG.get(row["客户"])
+    if cfg is None:
+        sla_hours, start_time, end_time = np.nan, np.nan, np.nan
+    else:
+        if "hours_CA" in cfg:
+            not_ca = row["集配站"] in ["HUB_LAX_LAS", "HUB_LAX_PHX"]
+            sla_hours = cfg["hours_nonCA"] if not_ca else cfg["hours_CA"]
+        elif "hours_z12" in cfg:
+            sla_hours = cfg["hours_z12"] if row["收件人邮编集"] in ["Zone1", "Zone2"] else cfg["hours_z34"]
+        else:
+            sla_hours = cfg["hours"]
+        start_time, end_time = row.get(cfg["start_col"]), row.get(cfg["end_col"])
+
+    if pd.isna(start_time) or np.isnan(sla_hours):
+        due_time = pd.NaT
+    elif row["客户"] in END_OF_DAY_CLIENTS:
+        due_time = (start_time + timedelta(hours=float(sla_hours))).normalize() + pd.Timedelta(hours=23, minutes=59, seconds=59)
+    else:
+        due_time = start_time + timedelta(hours=float(sla_hours))
+    return sla_result(sla_hours, start_time, end_time, due_time)
+
+
+def edge_frame(rows, seed):
+    """
+    Normalized synthetic waybills with SLA times around the edges:
+    - starts at 00:00, 15:59:59, exactly 16:00, just after 16:00, 23:59:59 and random, with ns parts
+    - ends at the due day's 23:59:59 / next 00:00, exactly start + SLA hours, or random
+    - missing start / end cols, Zone5 and unknown zones, an unknown client
+    """
+    rng = np.random.default_rng(seed)
+    df = normalize_frame(make_waybills(rows, seed=seed)).reset_index(drop=True)
+
+    zones = rng.choice(ZONES + [None], rows, p=[0.18, 0.18, 0.18, 0.18, 0.13, 0.15])
+    df["收件人邮编集"] = pd.Categorical(zones, categories=ZONES)
+    clients = df["客户"].astype(object)
+    df["客户"] = clients.mask(rng.random(rows) < 0.03, "UNKNOWN").astype("category")
+
+    days = pd.to_datetime("2026-03-01") + pd.to_timedelta(rng.integers(0, 20, rows), unit="D")
+    clock = pd.to_timedelta(rng.choice(
+        ["0s", "15:59:59", "15:59:59.999999", "16:00:00", "16:00:00.000001", "16:00:01", "23:59:59", "random"],
+        rows
+    ).tolist(), errors="coerce")
+    random_clock = pd.to_timedelta(rng.integers(0, 86400, rows), unit="s")
+    clock = clock.where(clock.notna(), random_clock)
+    ns = pd.to_timedelta(rng.choice([0, 0, 999, 1500], rows), unit="ns")
+
+    starts = {}
+    for col in START_COLS:
+        shift = pd.to_timedelta(rng.integers(-2, 3, rows) * 3600, unit="s")
+        start = pd.Series(days + clock + ns, index=df.index) + shift * (col != START_COLS[0])
+        starts[col] = start.mask(rng.random(rows) < 0.1)
+        df[col] = starts[col]
+
+    base = starts[START_COLS[0]].fillna(starts[START_COLS[1]])
+    sla_hours = pd.to_timedelta(rng.choice([48, 72, 84, 96, 120, 144], rows), unit="h")
+    due_day = (base + sla_hours).dt.normalize()
+    for col in END_COLS:
+        kind = rng.integers(0, 5, rows)
+        end = np.select(
+            [kind == 0, kind == 1, kind == 2, kind == 3],
+            [due_day + pd.Timedelta("23:59:59"), due_day + pd.Timedelta(days=1),
+             base + sla_hours, due_day + pd.Timedelta(days=1, hours=23, minutes=59, seconds=59)],
+            base + pd.to_timedelta(rng.integers(0, 200 * 3600, rows), unit="s")
+        )
+        df[col] = pd.Series(end, index=df.index).mask(rng.random(rows) < 0.1)
+    return df
+
+
+def assert_parity(evaluated, reference):
+    expected = evaluated.apply(reference, axis=1)
+    actual = evaluated[SLA_COLS]
+    pd.testing.assert_series_equal(actual["SLA标准小时"].astype(float), expected["SLA标准小时"].astype(float))
+    pd.testing.assert_series_equal(actual["SLA截止时间"], pd.to_datetime(expected["SLA截止时间"]))
+    pd.testing.assert_series_equal(actual["SLA实际小时"], expected["SLA实际小时"].astype(float))
+    pd.testing.assert_series_equal(actual["SLA是否达标"].astype(bool), expected["SLA是否达标"].astype(bool))
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_cainiao_matches_row_wise(seed):
+    evaluated = evaluate_frame(edge_frame(5000, seed), CAINIAO_POLICY)
+    assert evaluated["SLA截止时间"].notna().any() and evaluated["SLA截止时间"].isna().any()
+    assert_parity(evaluated, reference_cainiao)
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_client_matches_row_wise(seed):
+    df = edge_frame(5000, seed)
+    # CKY / EZG Zone5 have their own 192h rule in sla_rules, the old tree used the Zone3/4 hours
+    zone5 = df["客户"].isin(["CKY", "EZG"]) & df["收件人邮编集"].eq("Zone5")
+    evaluated = evaluate_frame(df[~zone5], CLIENT_POLICY)
+    assert_parity(evaluated, reference_client)
+
+
+def test_cut_hour_boundaries():
+    starts = pd.to_datetime([
+        "2026-03-01 15:59:59", "2026-03-01 16:00:00", "2026-03-01 16:00:00.000001",
+        "2026-03-01 16:00:00.000000500", "2026-03-01 00:00:00", None,
+    ], format="ISO8601")
+    df = edge_frame(len(starts), 3)
+    df["收件人邮编集"] = pd.Categorical(["Zone1"] * len(starts), categories=ZONES)
+    df["关配交接时间"] = starts
+    df["首分拨首次入库时间"] = pd.NaT
+    df["首次派送时间"] = pd.Timestamp("2026-03-04 00:00:00")
+
+    evaluated = evaluate_frame(df, CAINIAO_POLICY)
+    assert_parity(evaluated, reference_cainiao)
+    assert evaluated["SLA截止时间"].tolist()[:5] == [
+        pd.Timestamp("2026-03-03 23:59:59"), pd.Timestamp("2026-03-03 23:59:59"),
+        pd.Timestamp("2026-03-04 23:59:59"), pd.Timestamp("2026-03-03 23:59:59"),
+        pd.Timestamp("2026-03-03 23:59:59"),
+    ]
+    assert evaluated["SLA是否达标"].tolist() == [False, False, True, False, False, False]
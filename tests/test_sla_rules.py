@@ -0,0 +1,50 @@
+"""
+Hours / days of every 客户 × Zone × 是否CA combination of the client rule table,
+against the tiers of the previous per-client config.
+"""
+import pytest
+
+from sla_rules import OTHER_ZONE, ZONES, load_client_rules, load_zone_rules
+
+# (hours, days): one tier, CA / non-CA, or Zone1-2 / other zones
+FLAT = {
+    "FBT": (48, 2), "CBT": (72, 3), "SKA2": (120, 5), "YW": (84, 3),
+    "WH": (120, 5), "WHUS": (120, 5), "WHUS-4PX": (120, 5),
+}
+BY_CA = {"AE": ((48, 2), (96, 4)), "CBO": ((72, 3), (96, 4)), "HTE": ((72, 3), (120, 5))}
+BY_ZONE = {"TE": ((72, 3), (120, 5)), "CKY": ((72, 3), (96, 4)), "EZG": ((120, 5), (144, 6))}
+# CKY / EZG Zone5 have their own tier, the previous config fell through to the Zone3/4 one
+ZONE5 = {"CKY": (192, 8), "EZG": (192, 8)}
+
+
+def expected_tier(client, zone, ca):
+    if client in FLAT:
+        return FLAT[client]
+    if client in BY_CA:
+        return BY_CA[client][0 if ca else 1]
+    if zone == "Zone5" and client in ZONE5:
+        return ZONE5[client]
+    return BY_ZONE[client][0 if zone in ("Zone1", "Zone2") else 1]
+
+
+def test_every_client_zone_ca_has_its_tier():
+    rules = load_client_rules()
+    assert set(rules["客户"]) == set(FLAT) | set(BY_CA) | set(BY_ZONE)
+    assert len(rules) == len(set(rules["客户"])) * (len(ZONES) + 1) * 2
+
+    for row in rules.itertuples():
+        assert (row.hours, row.days) == expected_tier(row.客户, row.Zone, row.CA), row
+
+
+@pytest.mark.parametrize("client", ["CKY", "EZG"])
+def test_zone5_tier_only_for_cky_and_ezg(client):
+    rules = load_client_rules().set_index(["客户", "Zone", "CA"])
+    for ca in (True, False):
+        assert tuple(rules.loc[(client, "Zone5", ca), ["hours", "days"]]) == (192, 8)
+        assert tuple(rules.loc[(client, OTHER_ZONE, ca), ["hours", "days"]]) == BY_ZONE[client][1]
+    assert tuple(rules.loc[("TE", "Zone5", True), ["hours", "days"]]) == BY_ZONE["TE"][1]
+
+
+def test_zone_rules_have_no_zone5():
+    # 中台SLA: Zone5 and unknown zones have no SLA
+    assert list(load_zone_rules()["Zone"]) == ["Zone1", "Zone2", "Zone3", "Zone4"]
@@ -0,0 +1,55 @@
+import os
+from functools import lru_cache
+
+import pandas as pd
+import numpy as np
+
+ZONE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sla_zone.xlsx")
+ZONE_SHEET = "邮编映射"
+
+
+def file_signature(path=ZONE_FILE):
+    """(mtime, size) of the mapping file, changes whenever the file is replaced or edited."""
+    stat = os.stat(path)
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def read_zone_index(path=ZONE_FILE):
+    """
+    Parse the 邮编映射 sheet into a compact postcode -> zone index:
+    - zones: zone names
+    - codes: int8 array, codes[postcode] = position in zones (-1 = unknown postcode)
+    """
+    zone_df = pd.read_excel(path, sheet_name=ZONE_SHEET)
+    zone_cat = pd.Categorical(zone_df["收件人邮编集"])
+    postcodes = zone_df["收件人邮编"].to_numpy(dtype=np.int64)
+
+    codes = np.full(postcodes.max() + 1, -1, dtype=np.int8)
+    codes[postcodes] = zone_cat.codes
+    zones = zone_cat.categories.to_numpy(dtype=object)
+
+    return {"zones": zones, "codes": codes}
+
+
+@lru_cache(maxsize=4)
+def _cached_zone_index(path, signature):
+    return read_zone_index(path)
+
+
+def load_zone_index(path=ZONE_FILE):
+    """Process-wide cached zone index, reloaded when the mapping file changes."""
+    return _cached_zone_index(path, file_signature(path))
+
+
+def lookup_zone(postcodes, zone_index):
+    """收件人邮编 -> 收件人邮编集 (category) by array index; unknown / invalid postcodes -> NaN."""
+    postcodes = pd.Series(postcodes)
+    codes = zone_index["codes"]
+
+    values = pd.to_numeric(postcodes, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    valid = (values >= 0) & (values < len(codes)) & (np.floor(values) == values)
+
+    zone_codes = np.full(len(values), -1, dtype=np.int8)
+    zone_codes[valid] = codes[values[valid].astype(np.int64)]
+    zones = pd.Categorical.from_codes(zone_codes, categories=zone_index["zones"])
+    return pd.Series(zones, index=postcodes.index, name="收件人邮编集")